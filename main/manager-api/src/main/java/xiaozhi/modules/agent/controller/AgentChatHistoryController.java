@@ -1,5 +1,7 @@
 package xiaozhi.modules.agent.controller;
 
+import java.util.List;
+
 import org.springframework.web.bind.annotation.PostMapping;
 import org.springframework.web.bind.annotation.RequestBody;
 import org.springframework.web.bind.annotation.RequestMapping;
@@ -10,6 +12,7 @@ import io.swagger.v3.oas.annotations.tags.Tag;
 import jakarta.validation.Valid;
 import lombok.RequiredArgsConstructor;
 import xiaozhi.common.utils.Result;
+import xiaozhi.common.validator.ValidatorUtils;
 import xiaozhi.modules.agent.dto.AgentChatHistoryReportDTO;
 import xiaozhi.modules.agent.service.biz.AgentChatHistoryBizService;
 
@@ -33,4 +36,19 @@ public class AgentChatHistoryController {
         Boolean result = agentChatHistoryBizService.report(request);
         return new Result<Boolean>().ok(result);
     }
+
+    /**
+     * 小智服务聊天批量上报请求
+     * <p>
+     * 小智服务把多个设备的聊天记录合并为一次请求上报，整批在同一事务中保存。
+     *
+     * @param requests 聊天上报请求列表
+     */
+    @Operation(summary = "小智服务聊天批量上报请求")
+    @PostMapping("/report/batch")
+    public Result<Integer> uploadBatch(@RequestBody List<AgentChatHistoryReportDTO> requests) {
+        requests.forEach(ValidatorUtils::validateEntity);
+        Integer result = agentChatHistoryBizService.reportBatch(requests);
+        return new Result<Integer>().ok(result);
+    }
 }
@@ -2,6 +2,7 @@ package xiaozhi.modules.agent.service.biz.impl;
 
 import java.util.Base64;
 import java.util.Date;
+import java.util.List;
 import java.util.Objects;
 
 import org.springframework.stereotype.Service;
@@ -83,6 +84,24 @@ public class AgentChatHistoryBizServiceImpl implements AgentChatHistoryBizServic
         return Boolean.TRUE;
     }
 
+    /**
+     * 批量处理聊天记录上报
+     *
+     * @param reports 聊天上报请求列表
+     * @return 成功保存的条数
+     */
+    @Override
+    @Transactional(rollbackFor = Exception.class)
+    public Integer reportBatch(List<AgentChatHistoryReportDTO> reports) {
+        int saved = 0;
+        for (AgentChatHistoryReportDTO report : reports) {
+            if (Boolean.TRUE.equals(report(report))) {
+                saved++;
+            }
+        }
+        return saved;
+    }
+
     /**
      * base64解码report.getOpusDataBase64(),存入ai_agent_chat_audio表
      */
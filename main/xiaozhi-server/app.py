@@ -8,6 +8,7 @@ from config.logger import setup_logging
 from core.utils.util import get_local_ip, validate_mcp_endpoint
 from core.http_server import SimpleHttpServer
 from core.websocket_server import WebSocketServer
+from core.utils.report_pipeline import report_pipeline
 from core.utils.util import check_ffmpeg_installed
 
 TAG = __name__
@@ -61,7 +62,7 @@ async def main():
     ws_server = WebSocketServer(config)
     ws_task = asyncio.create_task(ws_server.start())
     # 启动 Simple http 服务器
-    ota_server = SimpleHttpServer(config)
+    ota_server = SimpleHttpServer(config, ws_server)
     ota_task = asyncio.create_task(ota_server.start())
 
     read_config_from_api = config.get("read_config_from_api", False)
@@ -128,6 +129,8 @@ async def main():
             timeout=3.0,
             return_when=asyncio.ALL_COMPLETED,
         )
+        # 等待转码中的聊天记录，再把尚未发送的记录落盘，下次启动后补发
+        report_pipeline.close()
         print("服务器已关闭，程序退出。")
 
 
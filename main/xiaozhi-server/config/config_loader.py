@@ -1,7 +1,12 @@
 import os
 import yaml
 from collections.abc import Mapping
-from config.manage_api_client import init_service, get_server_config, get_agent_models
+from config.manage_api_client import (
+    init_service,
+    get_server_config,
+    get_agent_models,
+    get_agent_models_async,
+)
 
 
 def get_project_dir():
@@ -76,6 +81,13 @@ def get_private_config_from_api(config, device_id, client_id):
     return get_agent_models(device_id, client_id, config["selected_module"])
 
 
+async def get_private_config_from_api_async(config, device_id, client_id):
+    """从Java API异步获取私有配置"""
+    return await get_agent_models_async(
+        device_id, client_id, config["selected_module"]
+    )
+
+
 def ensure_directories(config):
     """确保所有配置路径存在"""
     dirs_to_create = set()
@@ -1,7 +1,9 @@
 import os
 import time
 import base64
-from typing import Optional, Dict
+import asyncio
+import weakref
+from typing import Optional, Dict, List
 
 import httpx
 
@@ -22,6 +24,8 @@ class ManageApiClient:
     _instance = None
     _client = None
     _secret = None
+    # 异步客户端与事件循环绑定，每个事件循环一个
+    _async_clients = weakref.WeakKeyDictionary()
 
     def __new__(cls, config):
         """单例模式确保全局唯一实例，并支持传入配置参数"""
@@ -49,21 +53,45 @@ class ManageApiClient:
         cls.retry_delay = cls.config.get("retry_delay", 10)  # 初始重试延迟(秒)
         # NOTE(goody): 2025/4/16 http相关资源统一管理，后续可以增加线程池或者超时
         # 后续也可以统一配置apiToken之类的走通用的Auth
-        cls._client = httpx.Client(
-            base_url=cls.config.get("url"),
-            headers={
+        cls._client = httpx.Client(**cls._client_options())
+
+    @classmethod
+    def _client_options(cls) -> Dict:
+        return {
+            "base_url": cls.config.get("url"),
+            "headers": {
                 "User-Agent": f"PythonClient/2.0 (PID:{os.getpid()})",
                 "Accept": "application/json",
                 "Authorization": "Bearer " + cls._secret,
             },
-            timeout=cls.config.get("timeout", 30),  # 默认超时时间30秒
-        )
+            "timeout": cls.config.get("timeout", 30),  # 默认超时时间30秒
+        }
+
+    @classmethod
+    def _get_async_client(cls) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = cls._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**cls._client_options())
+            cls._async_clients[loop] = client
+        return client
 
     @classmethod
     def _request(cls, method: str, endpoint: str, **kwargs) -> Dict:
         """发送单次HTTP请求并处理响应"""
         endpoint = endpoint.lstrip("/")
         response = cls._client.request(method, endpoint, **kwargs)
+        return cls._parse_response(response)
+
+    @classmethod
+    async def _request_async(cls, method: str, endpoint: str, **kwargs) -> Dict:
+        """异步发送单次HTTP请求并处理响应"""
+        endpoint = endpoint.lstrip("/")
+        response = await cls._get_async_client().request(method, endpoint, **kwargs)
+        return cls._parse_response(response)
+
+    @staticmethod
+    def _parse_response(response: httpx.Response) -> Dict:
         response.raise_for_status()
 
         result = response.json()
@@ -117,12 +145,35 @@ class ManageApiClient:
                     # 不重试，直接抛出异常
                     raise
 
+    @classmethod
+    async def _execute_request_async(cls, method: str, endpoint: str, **kwargs) -> Dict:
+        """带重试机制的异步请求执行器，重试等待不阻塞事件循环"""
+        retry_count = 0
+
+        while retry_count <= cls.max_retries:
+            try:
+                return await cls._request_async(method, endpoint, **kwargs)
+            except Exception as e:
+                if retry_count < cls.max_retries and cls._should_retry(e):
+                    retry_count += 1
+                    print(
+                        f"{method} {endpoint} 请求失败，将在 {cls.retry_delay:.1f} 秒后进行第 {retry_count} 次重试"
+                    )
+                    await asyncio.sleep(cls.retry_delay)
+                    continue
+                else:
+                    raise
+
     @classmethod
     def safe_close(cls):
         """安全关闭连接池"""
         if cls._client:
             cls._client.close()
             cls._instance = None
+        for loop, client in list(cls._async_clients.items()):
+            if not loop.is_closed() and not client.is_closed:
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        cls._async_clients.clear()
 
 
 def get_server_config() -> Optional[Dict]:
@@ -145,6 +196,21 @@ def get_agent_models(
     )
 
 
+async def get_agent_models_async(
+    mac_address: str, client_id: str, selected_module: Dict
+) -> Optional[Dict]:
+    """异步获取代理模型配置"""
+    return await ManageApiClient._instance._execute_request_async(
+        "POST",
+        "/config/agent-models",
+        json={
+            "macAddress": mac_address,
+            "clientId": client_id,
+            "selectedModule": selected_module,
+        },
+    )
+
+
 def save_mem_local_short(mac_address: str, short_momery: str) -> Optional[Dict]:
     try:
         return ManageApiClient._instance._execute_request(
@@ -169,22 +235,43 @@ def report(
         return ManageApiClient._instance._execute_request(
             "POST",
             f"/agent/chat-history/report",
-            json={
-                "macAddress": mac_address,
-                "sessionId": session_id,
-                "chatType": chat_type,
-                "content": content,
-                "reportTime": report_time,
-                "audioBase64": (
-                    base64.b64encode(audio).decode("utf-8") if audio else None
-                ),
-            },
+            json=build_report_record(
+                mac_address, session_id, chat_type, content, audio, report_time
+            ),
         )
     except Exception as e:
         print(f"TTS上报失败: {e}")
         return None
 
 
+def build_report_record(
+    mac_address: str, session_id: str, chat_type: int, content: str, audio, report_time
+) -> Dict:
+    """组装一条聊天记录上报数据"""
+    return {
+        "macAddress": mac_address,
+        "sessionId": session_id,
+        "chatType": chat_type,
+        "content": content,
+        "reportTime": report_time,
+        "audioBase64": base64.b64encode(audio).decode("utf-8") if audio else None,
+    }
+
+
+def report_record(record: Dict) -> Optional[Dict]:
+    """上报一条已组装的聊天记录，只请求一次，失败由调用方处理"""
+    return ManageApiClient._instance._request(
+        "POST", "/agent/chat-history/report", json=record
+    )
+
+
+def report_batch(records: List[Dict]) -> Optional[Dict]:
+    """批量上报聊天记录，整批在同一事务中保存，只请求一次，失败由调用方处理"""
+    return ManageApiClient._instance._request(
+        "POST", "/agent/chat-history/report/batch", json=records
+    )
+
+
 def init_service(config):
     ManageApiClient(config)
 
@@ -0,0 +1,190 @@
+"""
+设备差异化配置缓存
+
+设备每次连接都要向智控台获取差异化配置，网络抖动后大量设备同时重连会集中请求manager-api，
+并且每个设备都要等请求返回才能开始对话。这里按设备缓存获取到的配置：
+- 缓存未过期时直接返回，同一设备同时发起的多次获取合并为一次请求
+- 缓存过期或被 invalidate 标记失效（服务端 update_config 时）后等待重新获取，智控台中对智能体的修改最迟在 ttl 后生效
+- 只有manager-api不可用（请求失败或超过 wait_timeout 未返回）时才退回上次获取的配置
+- 设备未绑定等业务异常不缓存，每次都重新获取
+"""
+
+import copy
+import time
+import asyncio
+import weakref
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config.logger import setup_logging
+from config.config_loader import get_private_config_from_api_async
+from config.manage_api_client import DeviceNotFoundException, DeviceBindException
+
+TAG = __name__
+logger = setup_logging()
+
+CacheKey = Tuple[str, str]
+
+
+class _Entry:
+    __slots__ = ("config", "version", "fetched_at")
+
+    def __init__(self, config: Dict[str, Any], version: int):
+        self.config = config
+        self.version = version
+        self.fetched_at = time.monotonic()
+
+
+class PrivateConfigService:
+    """所有连接共享的差异化配置缓存，由WebSocketServer在启动时配置"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        # 进行中的请求与事件循环绑定，每个事件循环一组
+        self._inflight = weakref.WeakKeyDictionary()
+        # 缓存版本，invalidate 时递增
+        self._generation = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "fetched": 0,
+            "failed": 0,
+            "fallback": 0,
+        }
+        self.configure({})
+
+    def configure(self, config: Optional[dict]) -> None:
+        config = config or {}
+        enabled = config.get("enabled", True)
+        ttl = config.get("ttl")
+        wait_timeout = config.get("wait_timeout")
+        max_devices = config.get("max_devices")
+        self.enabled = enabled not in (False, "false", "False", "0", 0)
+        self.ttl = float(ttl) if ttl else 60
+        self.wait_timeout = float(wait_timeout) if wait_timeout else 10
+        self.max_devices = int(max_devices) if max_devices else 10000
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self) -> None:
+        """使所有设备缓存的配置失效"""
+        with self._lock:
+            self._generation += 1
+
+    async def get(
+        self, config: Dict[str, Any], device_id: str, client_id: str
+    ) -> Dict[str, Any]:
+        """获取设备的差异化配置，返回的配置可以由调用方随意修改"""
+        if not self.enabled:
+            return await get_private_config_from_api_async(config, device_id, client_id)
+        key = (device_id, client_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            fresh = (
+                entry is not None
+                and entry.version == self._generation
+                and time.monotonic() - entry.fetched_at < self.ttl
+            )
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if fresh:
+            self._count("hits")
+            return copy.deepcopy(entry.config)
+
+        self._count("misses")
+        task = self._fetch(config, key)
+        try:
+            if entry is None:
+                private_config = await asyncio.shield(task)
+            else:
+                private_config = await asyncio.wait_for(
+                    asyncio.shield(task), timeout=self.wait_timeout
+                )
+        except (DeviceNotFoundException, DeviceBindException):
+            raise
+        except Exception as e:
+            if entry is None:
+                raise
+            # manager-api暂时不可用，退回上次获取的配置
+            self._count("fallback")
+            logger.bind(tag=TAG).warning(
+                f"获取差异化配置失败，使用上次获取的配置: {device_id}, {repr(e)}"
+            )
+            private_config = entry.config
+        return copy.deepcopy(private_config)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _fetch(self, config: Dict[str, Any], key: CacheKey) -> asyncio.Task:
+        """发起获取请求，同一设备已有同一版本下进行中的请求时复用它"""
+        loop = asyncio.get_running_loop()
+        # key -> (请求, 发起请求时的版本)
+        inflight: Dict[CacheKey, tuple] = self._inflight.setdefault(loop, {})
+        with self._lock:
+            version = self._generation
+        running = inflight.get(key)
+        if running is not None and running[1] == version:
+            self._count("coalesced")
+            return running[0]
+        # 进行中的请求发起于 invalidate 之前，结果可能是旧配置，重新发起
+        # 请求发出前连接可能已修改自己的配置，只保留请求需要的部分
+        request_config = {"selected_module": copy.deepcopy(config["selected_module"])}
+        task = loop.create_task(self._load(request_config, key, version))
+        inflight[key] = (task, version)
+
+        def _done(t: asyncio.Task) -> None:
+            if inflight.get(key, (None,))[0] is t:
+                del inflight[key]
+            # 后台刷新没有调用方等待结果，这里取出异常避免未处理异常的告警
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(_done)
+        return task
+
+    async def _load(
+        self, config: Dict[str, Any], key: CacheKey, version: int
+    ) -> Dict[str, Any]:
+        """获取并缓存配置，version 为发起请求时的版本，请求期间配置被标记失效时按旧版本保存"""
+        device_id, client_id = key
+        try:
+            private_config = await get_private_config_from_api_async(
+                config, device_id, client_id
+            )
+        except (DeviceNotFoundException, DeviceBindException):
+            with self._lock:
+                self._entries.pop(key, None)
+            raise
+        except Exception:
+            self._count("failed")
+            raise
+        with self._lock:
+            self._stats["fetched"] += 1
+            entry = self._entries.get(key)
+            # 不用较早发起、较晚返回的请求覆盖更新版本的配置
+            if entry is None or entry.version <= version:
+                self._entries[key] = _Entry(private_config, version)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_devices:
+                self._entries.popitem(last=False)
+        return private_config
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["devices"] = len(self._entries)
+        stats["inflight"] = sum(
+            len(inflight) for inflight in list(self._inflight.values())
+        )
+        stats["enabled"] = self.enabled
+        return stats
+
+
+# 全局差异化配置缓存实例
+private_config_service = PrivateConfigService()
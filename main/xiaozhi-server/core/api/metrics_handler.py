@@ -0,0 +1,30 @@
+import json
+from aiohttp import web
+from core.api.base_handler import BaseHandler
+
+TAG = __name__
+
+
+class MetricsHandler(BaseHandler):
+    def __init__(self, config: dict, ws_server=None):
+        super().__init__(config)
+        self.ws_server = ws_server
+
+    async def handle_get(self, request):
+        """返回服务运行指标"""
+        try:
+            metrics = self.ws_server.get_metrics() if self.ws_server else {}
+            response = web.Response(
+                text=json.dumps(metrics, ensure_ascii=False),
+                content_type="application/json",
+            )
+        except Exception as e:
+            self.logger.bind(tag=TAG).error(f"获取运行指标失败: {e}")
+            response = web.Response(
+                text=json.dumps({"error": str(e)}, ensure_ascii=False),
+                content_type="application/json",
+                status=500,
+            )
+        finally:
+            self._add_cors_headers(response)
+        return response
@@ -18,31 +18,37 @@ from core.utils.util import (
 )
 from typing import Dict, Any
 from collections import deque
-from core.utils.modules_initialize import (
-    initialize_modules,
-    initialize_tts,
-    initialize_asr,
-)
+from core.utils.modules_initialize import initialize_modules
+from core.utils.provider_engines import provider_engines
 from core.handle.reportHandle import report
 from core.providers.tts.default import DefaultTTS
-from concurrent.futures import ThreadPoolExecutor
+from core.utils.scheduler import TaskScheduler, run_coroutine_sync
+from core.utils.async_queue import LoopQueue
 from core.utils.dialogue import Message, Dialogue
+from core.utils.prefix_stats import prefix_stats
+from core.utils.report_pipeline import report_pipeline
 from core.providers.asr.dto.dto import InterfaceType
 from core.handle.textHandle import handleTextMessage
 from core.providers.tools.unified_tool_handler import UnifiedToolHandler
 from plugins_func.loadplugins import auto_import_modules
 from plugins_func.register import Action, ActionResponse
 from core.auth import AuthMiddleware, AuthenticationError
-from config.config_loader import get_private_config_from_api
+from config.private_config_service import private_config_service
 from core.providers.tts.dto.dto import ContentType, TTSMessageDTO, SentenceType
 from config.logger import setup_logging, build_module_string, create_connection_logger
 from config.manage_api_client import DeviceNotFoundException, DeviceBindException
 from core.utils.prompt_manager import PromptManager
+from core.utils.audio_buffer import PacketRingBuffer
 from core.utils.voiceprint_provider import VoiceprintProvider
 from core.utils import textUtils
 
 TAG = __name__
 
+DIALOGUE_SUMMARY_PROMPT = (
+    "你是对话记录整理助手。请把下面较早的对话总结为一段简洁的摘要，"
+    "保留用户的身份信息、偏好、提出过的请求以及尚未完成的事项，不超过200字，只输出摘要内容。"
+)
+
 auto_import_modules("plugins_func.functions")
 
 
@@ -50,6 +56,151 @@ class TTSException(RuntimeError):
     pass
 
 
+class SpeculativeLLMStream:
+    """意图识别期间提前发起的LLM流式请求
+
+    请求在事件循环中异步读取，产出的内容先缓存在队列中，不送入TTS；
+    意图确定为普通聊天后由chat/chat_async接着消费，确定为工具调用等情况则关闭。
+    """
+
+    _END = object()
+
+    def __init__(self, loop, open_stream, *args):
+        self.error = None
+        self._queue = LoopQueue()
+        self._stream = None
+        self._closed = False
+        asyncio.run_coroutine_threadsafe(self._pump(open_stream, args), loop)
+
+    async def _pump(self, open_stream, args):
+        try:
+            self._stream = await open_stream(*args)
+            if self._closed:
+                self._stream.close()
+            async for response in self._stream:
+                self._queue.put(response)
+        except Exception as e:
+            self.error = e
+        finally:
+            if self._stream is not None:
+                await self._stream.aclose()
+            self._queue.put(self._END)
+
+    def close(self):
+        """停止读取并立即关闭上游LLM请求，可在任意线程调用"""
+        self._closed = True
+        if self._stream is not None:
+            self._stream.close()
+
+    def __iter__(self):
+        try:
+            while True:
+                response = self._queue.get()
+                if response is self._END:
+                    break
+                yield response
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.close()
+
+    async def iterate_async(self):
+        try:
+            while True:
+                response = await self._queue.get_async()
+                if response is self._END:
+                    break
+                yield response
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.close()
+
+
+class LLMResponseCollector:
+    """累积一轮LLM流式响应中的文本与工具调用信息，同步与异步对话共用"""
+
+    def __init__(self, with_functions: bool):
+        self.with_functions = with_functions
+        self.tool_call_flag = False
+        self.function_name = None
+        self.function_id = None
+        self.function_arguments = ""
+        self.content_arguments = ""
+        self.response_message = []
+
+    def feed(self, response):
+        """处理一个响应块，返回其中的文本内容"""
+        if not self.with_functions:
+            return response
+
+        content, tools_call = response
+        if "content" in response:
+            content = response["content"]
+            tools_call = None
+        if content is not None and len(content) > 0:
+            self.content_arguments += content
+
+        if not self.tool_call_flag and self.content_arguments.startswith(
+            "<tool_call>"
+        ):
+            self.tool_call_flag = True
+
+        if tools_call is not None and len(tools_call) > 0:
+            self.tool_call_flag = True
+            if tools_call[0].id is not None:
+                self.function_id = tools_call[0].id
+            if tools_call[0].function.name is not None:
+                self.function_name = tools_call[0].function.name
+            if tools_call[0].function.arguments is not None:
+                self.function_arguments += tools_call[0].function.arguments
+        return content
+
+    def function_call_data(self, conn):
+        """解析工具调用，无工具调用或解析失败时返回None"""
+        if not self.tool_call_flag:
+            return None
+
+        bHasError = False
+        if self.function_id is None:
+            a = extract_json_from_string(self.content_arguments)
+            if a is not None:
+                try:
+                    content_arguments_json = json.loads(a)
+                    self.function_name = content_arguments_json["name"]
+                    self.function_arguments = json.dumps(
+                        content_arguments_json["arguments"], ensure_ascii=False
+                    )
+                    self.function_id = str(uuid.uuid4().hex)
+                except Exception as e:
+                    bHasError = True
+                    self.response_message.append(a)
+            else:
+                bHasError = True
+                self.response_message.append(self.content_arguments)
+            if bHasError:
+                conn.logger.bind(tag=TAG).error(
+                    f"function call error: {self.content_arguments}"
+                )
+        if bHasError:
+            return None
+
+        # 如需要大模型先处理一轮，添加相关处理后的日志情况
+        if len(self.response_message) > 0:
+            text_buff = "".join(self.response_message)
+            conn.tts_MessageText = text_buff
+            conn.dialogue.put(Message(role="assistant", content=text_buff))
+        self.response_message.clear()
+        conn.logger.bind(tag=TAG).debug(
+            f"function_name={self.function_name}, function_id={self.function_id}, function_arguments={self.function_arguments}"
+        )
+        return {
+            "name": self.function_name,
+            "id": self.function_id,
+            "arguments": self.function_arguments,
+        }
+
+
 class ConnectionHandler:
     def __init__(
         self,
@@ -86,15 +237,18 @@ class ConnectionHandler:
         self.client_abort = False
         self.client_is_speaking = False
         self.client_listen_mode = "auto"
+        # 当前这一轮的LLM流式请求，打断时关闭
+        self.llm_stream = None
 
         # 线程任务相关
         self.loop = asyncio.get_event_loop()
         self.stop_event = threading.Event()
-        self.executor = ThreadPoolExecutor(max_workers=5)
+        # 阻塞任务提交到服务器共享的线程池，不再为每个连接创建线程池
+        scheduler = server.scheduler if server is not None else TaskScheduler()
+        self.executor = scheduler.executor_for(self.session_id)
 
-        # 添加上报线程池
-        self.report_queue = queue.Queue()
-        self.report_thread = None
+        # 聊天记录上报在共享的report线程池中执行
+        self.report_enabled = False
         # 未来可以通过修改此处，调节asr的上报和tts的上报，目前默认都开启
         self.report_asr_enable = self.read_config_from_api
         self.report_tts_enable = self.read_config_from_api
@@ -113,7 +267,9 @@ class ConnectionHandler:
         self.voiceprint_provider = None
 
         # vad相关变量
-        self.client_audio_buffer = bytearray()
+        self.vad_session = None  # 连接独享的VAD解码器与模型状态
+        # VAD的PCM缓冲区由VAD工作线程持有，重置时只递增该序号，由工作线程清空缓冲区
+        self.vad_reset_seq = 0
         self.client_have_voice = False
         self.last_activity_time = 0.0  # 统一的活动时间戳（毫秒）
         self.client_voice_stop = False
@@ -123,12 +279,33 @@ class ConnectionHandler:
         # asr相关变量
         # 因为实际部署时可能会用到公共的本地ASR，不能把变量暴露给公共ASR
         # 所以涉及到ASR的变量，需要在这里定义，属于connection的私有变量
-        self.asr_audio = []
-        self.asr_audio_queue = queue.Queue()
+        self.asr_audio = PacketRingBuffer(
+            capacity=int(self.config.get("asr_max_frames", 1000)),
+            preroll=int(self.config.get("asr_preroll_frames", 10)),
+        )
+        self.asr_audio_queue = asyncio.Queue()
+
+        # 异步模式：对话、TTS文本处理与音频发送以协程方式在事件循环中执行
+        self.async_pipeline = bool(self.config.get("async_pipeline", False))
+        # intent_llm模式下，意图识别的同时提前发起聊天LLM请求
+        self.speculative_chat = bool(self.config.get("speculative_chat", False))
 
         # llm相关变量
         self.llm_finish_task = True
-        self.dialogue = Dialogue()
+        # 发送给LLM的历史按token预算裁剪，可选地把移出窗口的对话总结为摘要
+        dialogue_window = self.config.get("dialogue_window", {}) or {}
+        # prompt_layout为prefix_cache时，易变的上下文放在消息末尾，便于上游复用前缀缓存
+        self.dialogue = Dialogue.from_config(
+            dialogue_window, self.config.get("prompt_layout", {})
+        )
+        self.dialogue_summarize = dialogue_window.get("summarize", False) not in (
+            False,
+            "false",
+            "False",
+            "0",
+            0,
+        )
+        self._summary_future = None
 
         # tts相关变量
         self.sentence_id = None
@@ -212,9 +389,11 @@ class ConnectionHandler:
             self.welcome_msg["session_id"] = self.session_id
 
             # 获取差异化配置
-            self._initialize_private_config()
+            if self.read_config_from_api:
+                private_config = await self._fetch_private_config()
+                self._initialize_private_config(private_config)
             # 异步初始化
-            self.executor.submit(self._initialize_components)
+            self.executor.submit_to("session", self._initialize_components)
 
             try:
                 async for message in self.websocket:
@@ -249,22 +428,15 @@ class ConnectionHandler:
                 # 使用线程池异步保存记忆
                 def save_memory_task():
                     try:
-                        # 创建新事件循环（避免与主循环冲突）
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        loop.run_until_complete(
+                        # 复用工作线程的事件循环（避免与主循环冲突）
+                        run_coroutine_sync(
                             self.memory.save_memory(self.dialogue.dialogue)
                         )
                     except Exception as e:
                         self.logger.bind(tag=TAG).error(f"保存记忆失败: {e}")
-                    finally:
-                        try:
-                            loop.close()
-                        except Exception:
-                            pass
-
-                # 启动线程保存记忆，不等待完成
-                threading.Thread(target=save_memory_task, daemon=True).start()
+
+                # 在共享线程池中保存记忆，不等待完成
+                self.executor.submit_to("session", save_memory_task)
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"保存记忆失败: {e}")
         finally:
@@ -286,7 +458,7 @@ class ConnectionHandler:
                 return
             if self.asr is None:
                 return
-            self.asr_audio_queue.put(message)
+            self.asr_audio_queue.put_nowait(message)
 
     async def handle_restart(self, message):
         """处理服务器重启请求"""
@@ -377,8 +549,8 @@ class ConnectionHandler:
             self._initialize_memory()
             """加载意图识别"""
             self._initialize_intent()
-            """初始化上报线程"""
-            self._init_report_threads()
+            """初始化上报"""
+            self._init_report()
             """更新系统提示词"""
             self._init_prompt_enhancement()
 
@@ -395,24 +567,21 @@ class ConnectionHandler:
             self.change_system_prompt(enhanced_prompt)
             self.logger.bind(tag=TAG).info("系统提示词已增强更新")
 
-    def _init_report_threads(self):
-        """初始化ASR和TTS上报线程"""
+    def _init_report(self):
+        """初始化ASR和TTS上报"""
         if not self.read_config_from_api or self.need_bind:
             return
         if self.chat_history_conf == 0:
             return
-        if self.report_thread is None or not self.report_thread.is_alive():
-            self.report_thread = threading.Thread(
-                target=self._report_worker, daemon=True
-            )
-            self.report_thread.start()
-            self.logger.bind(tag=TAG).info("TTS上报线程已启动")
+        self.report_enabled = True
+        self.logger.bind(tag=TAG).info("聊天记录上报已启用")
 
     def _initialize_tts(self):
         """初始化TTS"""
         tts = None
         if not self.need_bind:
-            tts = initialize_tts(self.config)
+            # 同一配置的TTS只实例化一次，每个连接只创建自己的会话对象
+            tts = provider_engines.tts(self.config)
 
         if tts is None:
             tts = DefaultTTS(self.config, delete_audio_file=True)
@@ -426,9 +595,9 @@ class ConnectionHandler:
             # 因为本地一个实例ASR，可以被多个连接共享
             asr = self._asr
         else:
-            # 如果公共ASR是远程服务，则初始化一个新实例
-            # 因为远程ASR，涉及到websocket连接和接收线程，需要每个连接一个实例
-            asr = initialize_asr(self.config)
+            # 如果公共ASR是远程服务，则每个连接使用独立的会话对象
+            # 因为远程ASR，涉及到websocket连接和接收线程，识别状态需要每个连接一份
+            asr = provider_engines.asr(self.config)
 
         return asr
 
@@ -444,14 +613,11 @@ class ConnectionHandler:
         except Exception as e:
             self.logger.bind(tag=TAG).warning(f"声纹识别初始化失败: {str(e)}")
 
-    def _initialize_private_config(self):
-        """如果是从配置文件获取，则进行二次实例化"""
-        if not self.read_config_from_api:
-            return
-        """从接口获取差异化的配置进行二次实例化，非全量重新实例化"""
+    async def _fetch_private_config(self) -> Dict[str, Any]:
+        """从接口获取差异化的配置，同一设备的配置有缓存，并发的获取合并为一次请求"""
         try:
             begin_time = time.time()
-            private_config = get_private_config_from_api(
+            private_config = await private_config_service.get(
                 self.config,
                 self.headers.get("device-id"),
                 self.headers.get("client-id", self.headers.get("device-id")),
@@ -471,7 +637,10 @@ class ConnectionHandler:
             self.need_bind = True
             self.logger.bind(tag=TAG).error(f"获取差异化配置失败: {e}")
             private_config = {}
+        return private_config
 
+    def _initialize_private_config(self, private_config: Dict[str, Any]):
+        """从接口获取差异化的配置进行二次实例化，非全量重新实例化"""
         init_llm, init_tts, init_memory, init_intent = (
             False,
             False,
@@ -547,12 +716,17 @@ class ConnectionHandler:
                 self.logger,
                 private_config,
                 init_vad,
-                init_asr,
+                False,
                 init_llm,
-                init_tts,
+                False,
                 init_memory,
                 init_intent,
             )
+            # ASR与TTS按配置复用已实例化的提供者
+            if init_tts:
+                modules["tts"] = provider_engines.tts(private_config)
+            if init_asr:
+                modules["asr"] = provider_engines.asr(private_config)
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"初始化组件失败: {e}")
             modules = {}
@@ -665,7 +839,8 @@ class ConnectionHandler:
         # 更新系统prompt至上下文
         self.dialogue.update_system_message(self.prompt)
 
-    def chat(self, query, tool_call=False, depth=0):
+    def _start_chat(self, query, tool_call, depth):
+        """记录用户消息，最顶层时新建会话ID并发送FIRST请求，返回本轮可用的functions"""
         self.logger.bind(tag=TAG).info(f"大模型收到用户消息: {query}")
         self.llm_finish_task = False
 
@@ -687,141 +862,78 @@ class ConnectionHandler:
         functions = None
         if self.intent_type == "function_call" and hasattr(self, "func_handler"):
             functions = self.func_handler.get_functions()
-        response_message = []
-
-        try:
-            # 使用带记忆的对话
-            memory_str = None
-            if self.memory is not None:
-                future = asyncio.run_coroutine_threadsafe(
-                    self.memory.query_memory(query), self.loop
-                )
-                memory_str = future.result()
-
-            if self.intent_type == "function_call" and functions is not None:
-                # 使用支持functions的streaming接口
-                llm_responses = self.llm.response_with_functions(
-                    self.session_id,
-                    self.dialogue.get_llm_dialogue_with_memory(
-                        memory_str, self.config.get("voiceprint", {})
-                    ),
-                    functions=functions,
-                )
-            else:
-                llm_responses = self.llm.response(
-                    self.session_id,
-                    self.dialogue.get_llm_dialogue_with_memory(
-                        memory_str, self.config.get("voiceprint", {})
-                    ),
-                )
-        except Exception as e:
-            self.logger.bind(tag=TAG).error(f"LLM 处理出错 {query}: {e}")
-            return None
-
-        # 处理流式响应
-        tool_call_flag = False
-        function_name = None
-        function_id = None
-        function_arguments = ""
-        content_arguments = ""
-        self.client_abort = False
-        emotion_flag = True
-        for response in llm_responses:
-            if self.client_abort:
-                break
-            if self.intent_type == "function_call" and functions is not None:
-                content, tools_call = response
-                if "content" in response:
-                    content = response["content"]
-                    tools_call = None
-                if content is not None and len(content) > 0:
-                    content_arguments += content
-
-                if not tool_call_flag and content_arguments.startswith("<tool_call>"):
-                    # print("content_arguments", content_arguments)
-                    tool_call_flag = True
-
-                if tools_call is not None and len(tools_call) > 0:
-                    tool_call_flag = True
-                    if tools_call[0].id is not None:
-                        function_id = tools_call[0].id
-                    if tools_call[0].function.name is not None:
-                        function_name = tools_call[0].function.name
-                    if tools_call[0].function.arguments is not None:
-                        function_arguments += tools_call[0].function.arguments
-            else:
-                content = response
+        return functions
+
+    def _open_llm_stream(self, memory_str, functions):
+        """打开LLM流式请求，打断时由abort_llm_stream关闭"""
+        if not (self.intent_type == "function_call" and functions is not None):
+            functions = None
+        dialogue = self.dialogue.get_llm_dialogue_with_memory(
+            memory_str, self.config.get("voiceprint", {})
+        )
+        prefix_stats.record(self.device_id, dialogue, functions)
+        # functions不为None时使用支持functions的streaming接口
+        stream = self.llm.open_stream(
+            self.session_id,
+            dialogue,
+            functions=functions,
+            executor=self.executor,
+        )
+        self.llm_stream = stream
+        return stream
+
+    def abort_llm_stream(self):
+        """立即关闭正在进行的LLM流式请求，不再继续读取上游响应"""
+        stream = self.llm_stream
+        if stream is not None:
+            stream.close()
+
+    def start_speculative_chat(self, query):
+        """在意图识别结果出来之前，以本轮用户输入提前发起聊天LLM流式请求
+
+        请求基于当前对话的副本，不修改self.dialogue；与意图识别判定为继续聊天时一样，
+        副本中不包含工具调用结果消息。
+        """
+        snapshot = self.dialogue.fork(
+            [
+                msg
+                for msg in self.dialogue.dialogue
+                if msg.role not in ["tool", "function"]
+            ]
+        )
+        snapshot.put(Message(role="user", content=query))
+        return SpeculativeLLMStream(
+            self.loop, self._open_speculative_stream, query, snapshot
+        )
 
-            # 在llm回复中获取情绪表情，一轮对话只在开头获取一次
-            if emotion_flag and content is not None and content.strip():
-                asyncio.run_coroutine_threadsafe(
-                    textUtils.get_emotion(self, content),
-                    self.loop,
-                )
-                emotion_flag = False
-
-            if content is not None and len(content) > 0:
-                if not tool_call_flag:
-                    response_message.append(content)
-                    self.tts.tts_text_queue.put(
-                        TTSMessageDTO(
-                            sentence_id=self.sentence_id,
-                            sentence_type=SentenceType.MIDDLE,
-                            content_type=ContentType.TEXT,
-                            content_detail=content,
-                        )
-                    )
-        # 处理function call
-        if tool_call_flag:
-            bHasError = False
-            if function_id is None:
-                a = extract_json_from_string(content_arguments)
-                if a is not None:
-                    try:
-                        content_arguments_json = json.loads(a)
-                        function_name = content_arguments_json["name"]
-                        function_arguments = json.dumps(
-                            content_arguments_json["arguments"], ensure_ascii=False
-                        )
-                        function_id = str(uuid.uuid4().hex)
-                    except Exception as e:
-                        bHasError = True
-                        response_message.append(a)
-                else:
-                    bHasError = True
-                    response_message.append(content_arguments)
-                if bHasError:
-                    self.logger.bind(tag=TAG).error(
-                        f"function call error: {content_arguments}"
+    async def _open_speculative_stream(self, query, snapshot):
+        memory_str = None
+        if self.memory is not None:
+            memory_str = await self.memory.query_memory(query)
+        dialogue = snapshot.get_llm_dialogue_with_memory(
+            memory_str, self.config.get("voiceprint", {})
+        )
+        prefix_stats.record(self.device_id, dialogue)
+        return self.llm.open_stream(self.session_id, dialogue, executor=self.executor)
+
+    def _put_llm_content(self, collector, content):
+        """非工具调用的文本送入TTS"""
+        if content is not None and len(content) > 0:
+            if not collector.tool_call_flag:
+                collector.response_message.append(content)
+                self.tts.tts_text_queue.put(
+                    TTSMessageDTO(
+                        sentence_id=self.sentence_id,
+                        sentence_type=SentenceType.MIDDLE,
+                        content_type=ContentType.TEXT,
+                        content_detail=content,
                     )
-            if not bHasError:
-                # 如需要大模型先处理一轮，添加相关处理后的日志情况
-                if len(response_message) > 0:
-                    text_buff = "".join(response_message)
-                    self.tts_MessageText = text_buff
-                    self.dialogue.put(Message(role="assistant", content=text_buff))
-                response_message.clear()
-                self.logger.bind(tag=TAG).debug(
-                    f"function_name={function_name}, function_id={function_id}, function_arguments={function_arguments}"
                 )
-                function_call_data = {
-                    "name": function_name,
-                    "id": function_id,
-                    "arguments": function_arguments,
-                }
-
-                # 使用统一工具处理器处理所有工具调用
-                result = asyncio.run_coroutine_threadsafe(
-                    self.func_handler.handle_llm_function_call(
-                        self, function_call_data
-                    ),
-                    self.loop,
-                ).result()
-                self._handle_function_result(result, function_call_data, depth=depth)
 
+    def _finish_chat(self, collector, depth):
         # 存储对话内容
-        if len(response_message) > 0:
-            text_buff = "".join(response_message)
+        if len(collector.response_message) > 0:
+            text_buff = "".join(collector.response_message)
             self.tts_MessageText = text_buff
             self.dialogue.put(Message(role="assistant", content=text_buff))
         if depth == 0:
@@ -832,6 +944,7 @@ class ConnectionHandler:
                     content_type=ContentType.ACTION,
                 )
             )
+            self._schedule_dialogue_summary()
         self.llm_finish_task = True
         # 使用lambda延迟计算，只有在DEBUG级别时才执行get_llm_dialogue()
         self.logger.bind(tag=TAG).debug(
@@ -840,9 +953,160 @@ class ConnectionHandler:
             )
         )
 
+    def _schedule_dialogue_summary(self):
+        """对话历史被裁剪后，在后台把移出窗口的对话总结为摘要"""
+        if not self.dialogue_summarize or self.llm is None:
+            return
+        if self._summary_future is not None and not self._summary_future.done():
+            return
+        pending = self.dialogue.pending_summary()
+        if pending is None:
+            return
+        messages, upto_id = pending
+        # 摘要只是尽力而为的后台任务，放在低优先级的session线程池，不占用进行中对话的llm线程
+        self._summary_future = self.executor.submit_to(
+            "session", self._summarize_dialogue, messages, upto_id
+        )
+
+    def _summarize_dialogue(self, messages, upto_id):
+        transcript = "\n".join(
+            f"{'用户' if m.role == 'user' else '助手'}：{m.content}" for m in messages
+        )
+        if self.dialogue.summary:
+            transcript = f"此前的摘要：\n{self.dialogue.summary}\n\n后续对话：\n{transcript}"
+        try:
+            summary = self.llm.response_no_stream(
+                system_prompt=DIALOGUE_SUMMARY_PROMPT, user_prompt=transcript
+            )
+        except Exception as e:
+            self.logger.bind(tag=TAG).warning(f"总结对话历史失败: {e}")
+            return
+        if summary and not summary.startswith("【"):
+            self.dialogue.set_summary(summary.strip(), upto_id)
+            self.logger.bind(tag=TAG).debug(f"对话历史摘要已更新: {summary}")
+
+    def chat(self, query, tool_call=False, depth=0, prefetched=None):
+        functions = self._start_chat(query, tool_call, depth)
+
+        try:
+            if prefetched is not None:
+                # 意图识别期间已提前发起的请求，直接消费其缓存的响应
+                self.llm_stream = prefetched
+                llm_responses = iter(prefetched)
+            else:
+                # 使用带记忆的对话
+                memory_str = None
+                if self.memory is not None:
+                    future = asyncio.run_coroutine_threadsafe(
+                        self.memory.query_memory(query), self.loop
+                    )
+                    memory_str = future.result()
+
+                # 请求在事件循环中异步执行，本线程逐块取回响应
+                llm_responses = self._open_llm_stream(
+                    memory_str, functions
+                ).iterate_sync(self.loop)
+        except Exception as e:
+            self.logger.bind(tag=TAG).error(f"LLM 处理出错 {query}: {e}")
+            return None
+
+        # 处理流式响应
+        collector = LLMResponseCollector(
+            self.intent_type == "function_call" and functions is not None
+        )
+        self.client_abort = False
+        emotion_flag = True
+        try:
+            for response in llm_responses:
+                if self.client_abort:
+                    break
+                content = collector.feed(response)
+
+                # 在llm回复中获取情绪表情，一轮对话只在开头获取一次
+                if emotion_flag and content is not None and content.strip():
+                    asyncio.run_coroutine_threadsafe(
+                        textUtils.get_emotion(self, content),
+                        self.loop,
+                    )
+                    emotion_flag = False
+
+                self._put_llm_content(collector, content)
+        finally:
+            # 提前退出（如被打断）时关闭上游请求
+            llm_responses.close()
+        # 处理function call
+        function_call_data = collector.function_call_data(self)
+        if function_call_data is not None:
+            # 使用统一工具处理器处理所有工具调用
+            result = asyncio.run_coroutine_threadsafe(
+                self.func_handler.handle_llm_function_call(self, function_call_data),
+                self.loop,
+            ).result()
+            if self._handle_function_result(result, function_call_data):
+                self.chat(result.result, tool_call=True, depth=depth + 1)
+
+        self._finish_chat(collector, depth)
         return True
 
-    def _handle_function_result(self, result, function_call_data, depth):
+    async def chat_async(self, query, tool_call=False, depth=0, prefetched=None):
+        """异步模式下的对话，在事件循环中执行，只有阻塞的LLM流式请求交给llm线程池"""
+        functions = self._start_chat(query, tool_call, depth)
+
+        try:
+            if prefetched is not None:
+                # 意图识别期间已提前发起的请求，直接消费其缓存的响应
+                self.llm_stream = prefetched
+                llm_responses = prefetched.iterate_async()
+            else:
+                # 使用带记忆的对话
+                memory_str = None
+                if self.memory is not None:
+                    memory_str = await self.memory.query_memory(query)
+
+                # 请求直接在事件循环中异步执行，打断时立即关闭上游连接
+                llm_responses = self._open_llm_stream(memory_str, functions)
+        except Exception as e:
+            self.logger.bind(tag=TAG).error(f"LLM 处理出错 {query}: {e}")
+            return None
+
+        # 处理流式响应
+        collector = LLMResponseCollector(
+            self.intent_type == "function_call" and functions is not None
+        )
+        self.client_abort = False
+        emotion_flag = True
+        try:
+            async for response in llm_responses:
+                if self.client_abort:
+                    break
+                content = collector.feed(response)
+
+                # 在llm回复中获取情绪表情，一轮对话只在开头获取一次
+                if emotion_flag and content is not None and content.strip():
+                    asyncio.create_task(textUtils.get_emotion(self, content))
+                    emotion_flag = False
+
+                self._put_llm_content(collector, content)
+        except Exception as e:
+            self.logger.bind(tag=TAG).error(f"LLM 处理出错 {query}: {e}")
+        finally:
+            await llm_responses.aclose()
+
+        # 处理function call
+        function_call_data = collector.function_call_data(self)
+        if function_call_data is not None:
+            # 使用统一工具处理器处理所有工具调用
+            result = await self.func_handler.handle_llm_function_call(
+                self, function_call_data
+            )
+            if self._handle_function_result(result, function_call_data):
+                await self.chat_async(result.result, tool_call=True, depth=depth + 1)
+
+        self._finish_chat(collector, depth)
+        return True
+
+    def _handle_function_result(self, result, function_call_data):
+        """处理工具调用结果，返回True表示需要携带工具结果再次请求LLM"""
         if result.action == Action.RESPONSE:  # 直接回复前端
             text = result.response
             self.tts.tts_one_sentence(self, ContentType.TEXT, content_detail=text)
@@ -879,36 +1143,25 @@ class ConnectionHandler:
                         content=text,
                     )
                 )
-                self.chat(text, tool_call=True, depth=depth + 1)
+                return True
         elif result.action == Action.NOTFOUND or result.action == Action.ERROR:
             text = result.response if result.response else result.result
             self.tts.tts_one_sentence(self, ContentType.TEXT, content_detail=text)
             self.dialogue.put(Message(role="assistant", content=text))
         else:
             pass
+        return False
 
-    def _report_worker(self):
-        """聊天记录上报工作线程"""
-        while not self.stop_event.is_set():
-            try:
-                # 从队列获取数据，设置超时以便定期检查停止事件
-                item = self.report_queue.get(timeout=1)
-                if item is None:  # 检测毒丸对象
-                    break
-                try:
-                    # 检查线程池状态
-                    if self.executor is None:
-                        continue
-                    # 提交任务到线程池
-                    self.executor.submit(self._process_report, *item)
-                except Exception as e:
-                    self.logger.bind(tag=TAG).error(f"聊天记录上报线程异常: {e}")
-            except queue.Empty:
-                continue
-            except Exception as e:
-                self.logger.bind(tag=TAG).error(f"聊天记录上报工作线程异常: {e}")
-
-        self.logger.bind(tag=TAG).info("聊天记录上报线程已退出")
+    def enqueue_report(self, type, text, audio_data, report_time):
+        """提交聊天记录上报任务，由全服务共享的上报管道转码并批量发送"""
+        if not self.report_enabled or self.executor is None:
+            return
+        if report_pipeline.enabled:
+            report_pipeline.submit(self, type, text, audio_data, report_time)
+            return
+        self.executor.submit_to(
+            "report", self._process_report, type, text, audio_data, report_time
+        )
 
     def _process_report(self, type, text, audio_data, report_time):
         """处理上报任务"""
@@ -917,9 +1170,6 @@ class ConnectionHandler:
             report(self, type, text, audio_data, report_time)
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"上报处理异常: {e}")
-        finally:
-            # 标记任务完成
-            self.report_queue.task_done()
 
     def clearSpeakStatus(self):
         self.client_is_speaking = False
@@ -946,6 +1196,9 @@ class ConnectionHandler:
                         f"清理工具处理器时出错: {cleanup_error}"
                     )
 
+            # 关闭进行中的LLM请求
+            self.abort_llm_stream()
+
             # 触发停止事件
             if self.stop_event:
                 self.stop_event.set()
@@ -990,15 +1243,19 @@ class ConnectionHandler:
                 self.logger.bind(tag=TAG).error(f"关闭WebSocket连接时出错: {ws_error}")
 
             if self.tts:
+                self.tts.cancel_tasks()
                 await self.tts.close()
 
-            # 最后关闭线程池（避免阻塞）
+            if self.vad:
+                self.vad.release(self)
+
+            # 最后取消本连接在共享线程池中排队的任务（避免阻塞）
             if self.executor:
                 try:
                     self.executor.shutdown(wait=False)
                 except Exception as executor_error:
                     self.logger.bind(tag=TAG).error(
-                        f"关闭线程池时出错: {executor_error}"
+                        f"取消线程池任务时出错: {executor_error}"
                     )
                 self.executor = None
 
@@ -1021,7 +1278,6 @@ class ConnectionHandler:
             for q in [
                 self.tts.tts_text_queue,
                 self.tts.tts_audio_queue,
-                self.report_queue,
             ]:
                 if not q:
                     continue
@@ -1036,7 +1292,7 @@ class ConnectionHandler:
             )
 
     def reset_vad_states(self):
-        self.client_audio_buffer = bytearray()
+        self.vad_reset_seq += 1
         self.client_have_voice = False
         self.client_voice_stop = False
         self.logger.bind(tag=TAG).debug("VAD states reset.")
@@ -108,18 +108,15 @@ async def process_intent_result(conn, intent_result, original_text):
             await send_stt_message(conn, original_text)
             conn.client_abort = False
 
-            # 使用executor执行函数调用和结果处理
-            def process_function_call():
+            # 在事件循环中执行函数调用和结果处理，阻塞的LLM回复交给线程池
+            async def process_function_call():
                 conn.dialogue.put(Message(role="user", content=original_text))
 
                 # 使用统一工具处理器处理所有工具调用
                 try:
-                    result = asyncio.run_coroutine_threadsafe(
-                        conn.func_handler.handle_llm_function_call(
-                            conn, function_call_data
-                        ),
-                        conn.loop,
-                    ).result()
+                    result = await conn.func_handler.handle_llm_function_call(
+                        conn, function_call_data
+                    )
                 except Exception as e:
                     conn.logger.bind(tag=TAG).error(f"工具调用失败: {e}")
                     result = ActionResponse(
@@ -134,7 +131,9 @@ async def process_intent_result(conn, intent_result, original_text):
                     elif result.action == Action.REQLLM:  # 调用函数后再请求llm生成回复
                         text = result.result
                         conn.dialogue.put(Message(role="tool", content=text))
-                        llm_result = conn.intent.replyResult(text, original_text)
+                        llm_result = await conn.executor.run(
+                            "tools", conn.intent.replyResult, text, original_text
+                        )
                         if llm_result is None:
                             llm_result = text
                         speak_txt(conn, llm_result)
@@ -154,8 +153,7 @@ async def process_intent_result(conn, intent_result, original_text):
                         if text is not None:
                             speak_txt(conn, text)
 
-            # 将函数执行放在线程池中
-            conn.executor.submit(process_function_call)
+            asyncio.create_task(process_function_call())
             return True
         return False
     except json.JSONDecodeError as e:
@@ -13,7 +13,7 @@ TAG = __name__
 
 async def handleAudioMessage(conn, audio):
     # 当前片段是否有人说话
-    have_voice = conn.vad.is_vad(conn, audio)
+    have_voice = await conn.vad.is_vad_async(conn, audio)
     # 如果设备刚刚被唤醒，短暂忽略VAD检测
     if have_voice and hasattr(conn, "just_woken_up") and conn.just_woken_up:
         have_voice = False
@@ -78,16 +78,32 @@ async def startToChat(conn, text):
     if conn.client_is_speaking:
         await handleAbortMessage(conn)
 
+    # 投机执行：意图识别的同时提前发起聊天请求，识别为普通聊天时省去一次意图LLM的等待
+    speculation = None
+    if conn.speculative_chat and conn.intent_type == "intent_llm":
+        speculation = conn.start_speculative_chat(actual_text)
+
     # 首先进行意图分析，使用实际文本内容
-    intent_handled = await handle_user_intent(conn, actual_text)
+    try:
+        intent_handled = await handle_user_intent(conn, actual_text)
+    except BaseException:
+        if speculation is not None:
+            speculation.close()
+        raise
 
     if intent_handled:
-        # 如果意图已被处理，不再进行聊天
+        # 如果意图已被处理，不再进行聊天，关闭提前发起的请求
+        if speculation is not None:
+            speculation.close()
+            conn.logger.bind(tag=TAG).debug("意图已处理，关闭提前发起的聊天请求")
         return
 
     # 意图未被处理，继续常规聊天流程，使用实际文本内容
     await send_stt_message(conn, actual_text)
-    conn.executor.submit(conn.chat, actual_text)
+    if conn.async_pipeline:
+        asyncio.create_task(conn.chat_async(actual_text, prefetched=speculation))
+    else:
+        conn.executor.submit_to("llm", conn.chat, actual_text, prefetched=speculation)
 
 
 async def no_voice_close_connect(conn, have_voice):
@@ -2,16 +2,17 @@
 TTS上报功能已集成到ConnectionHandler类中。
 
 上报功能包括：
-1. 每个连接对象拥有自己的上报队列和处理线程
-2. 上报线程的生命周期与连接对象绑定
-3. 使用ConnectionHandler.enqueue_tts_report方法进行上报
+1. 上报任务提交到服务器共享的上报管道，在report线程池中转码后合并多个设备的记录批量发送
+2. 上报管道关闭时（report_pipeline.enabled为false），每条记录在report线程池中单独上报，
+   连接关闭时取消该连接尚未执行的上报任务
+3. 使用ConnectionHandler.enqueue_report方法进行上报
 
 具体实现请参考core/connection.py中的相关代码。
 """
 
 import time
 
-import opuslib_next
+from core.utils.opus_codec import decode_opus
 
 from config.manage_api_client import report as manage_report
 
@@ -56,15 +57,11 @@ def opus_to_wav(conn, opus_data):
     Returns:
         bytes: WAV格式的音频数据
     """
-    decoder = opuslib_next.Decoder(16000, 1)  # 16kHz, 单声道
-    pcm_data = []
-
-    for opus_packet in opus_data:
-        try:
-            pcm_frame = decoder.decode(opus_packet, 960)  # 960 samples = 60ms
-            pcm_data.append(pcm_frame)
-        except opuslib_next.OpusError as e:
-            conn.logger.bind(tag=TAG).error(f"Opus解码错误: {e}", exc_info=True)
+    # 16kHz, 单声道, 60ms一帧；使用线程缓存的解码器
+    pcm_data = decode_opus(
+        opus_data,
+        on_error=lambda i, e: conn.logger.bind(tag=TAG).error(f"Opus解码错误: {e}"),
+    )
 
     if not pcm_data:
         raise ValueError("没有有效的PCM数据")
@@ -108,12 +105,12 @@ def enqueue_tts_report(conn, text, opus_data):
     try:
         # 使用连接对象的队列，传入文本和二进制数据而非文件路径
         if conn.chat_history_conf == 2:
-            conn.report_queue.put((2, text, opus_data, int(time.time())))
+            conn.enqueue_report(2, text, opus_data, int(time.time()))
             conn.logger.bind(tag=TAG).debug(
                 f"TTS数据已加入上报队列: {conn.device_id}, 音频大小: {len(opus_data)} "
             )
         else:
-            conn.report_queue.put((2, text, None, int(time.time())))
+            conn.enqueue_report(2, text, None, int(time.time()))
             conn.logger.bind(tag=TAG).debug(
                 f"TTS数据已加入上报队列: {conn.device_id}, 不上报音频"
             )
@@ -136,12 +133,12 @@ def enqueue_asr_report(conn, text, opus_data):
     try:
         # 使用连接对象的队列，传入文本和二进制数据而非文件路径
         if conn.chat_history_conf == 2:
-            conn.report_queue.put((1, text, opus_data, int(time.time())))
+            conn.enqueue_report(1, text, opus_data, int(time.time()))
             conn.logger.bind(tag=TAG).debug(
                 f"ASR数据已加入上报队列: {conn.device_id}, 音频大小: {len(opus_data)} "
             )
         else:
-            conn.report_queue.put((1, text, None, int(time.time())))
+            conn.enqueue_report(1, text, None, int(time.time()))
             conn.logger.bind(tag=TAG).debug(
                 f"ASR数据已加入上报队列: {conn.device_id}, 不上报音频"
             )
@@ -31,42 +31,61 @@ async def sendAudioMessage(conn, sentenceType, audios, text):
             await conn.close()
 
 
+async def _iter_frames(audios):
+    for frame in audios:
+        yield frame
+
+
 # 播放音频
 async def sendAudio(conn, audios, pre_buffer=True):
-    if audios is None or len(audios) == 0:
+    """按播放节奏发送音频帧
+
+    audios 可以是完整的帧列表，也可以是边合成边产出帧的异步可迭代对象（如AudioFrameStream、AudioFileStream）；
+    后者收到第一帧即开始发送，无需等整句合成完毕。打断或发送结束时关闭迭代器，释放其占用的文件与编码器。
+    """
+    if audios is None:
         return
+    if not hasattr(audios, "__aiter__"):
+        if len(audios) == 0:
+            return
+        audios = _iter_frames(audios)
     # 流控参数优化
     frame_duration = 60  # 帧时长（毫秒），匹配 Opus 编码
-    start_time = time.perf_counter()
+    start_time = None
     play_position = 0
 
     # 仅当第一句话时执行预缓冲
-    if pre_buffer:
-        pre_buffer_frames = min(3, len(audios))
-        for i in range(pre_buffer_frames):
-            await conn.websocket.send(audios[i])
-        remaining_audios = audios[pre_buffer_frames:]
-    else:
-        remaining_audios = audios
-
-    # 播放剩余音频帧
-    for opus_packet in remaining_audios:
-        if conn.client_abort:
-            break
-
-        # 重置没有声音的状态
-        conn.last_activity_time = time.time() * 1000
-
-        # 计算预期发送时间
-        expected_time = start_time + (play_position / 1000)
-        current_time = time.perf_counter()
-        delay = expected_time - current_time
-        if delay > 0:
-            await asyncio.sleep(delay)
-
-        await conn.websocket.send(opus_packet)
-
-        play_position += frame_duration
+    pre_buffer_frames = 3 if pre_buffer else 0
+
+    frames = audios.__aiter__()
+    try:
+        async for opus_packet in frames:
+            if pre_buffer_frames > 0:
+                await conn.websocket.send(opus_packet)
+                pre_buffer_frames -= 1
+                continue
+
+            if conn.client_abort:
+                break
+
+            # 重置没有声音的状态
+            conn.last_activity_time = time.time() * 1000
+
+            # 以第一帧到达的时间为播放起点，计算预期发送时间
+            if start_time is None:
+                start_time = time.perf_counter()
+            expected_time = start_time + (play_position / 1000)
+            current_time = time.perf_counter()
+            delay = expected_time - current_time
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            await conn.websocket.send(opus_packet)
+
+            play_position += frame_duration
+    finally:
+        if hasattr(frames, "aclose"):
+            await frames.aclose()
 
 
 async def send_tts_message(conn, state, text=None):
@@ -4,17 +4,19 @@ from config.logger import setup_logging
 from core.api.ota_handler import OTAHandler
 from core.api.vision_handler import VisionHandler
 from core.api.image_handler import ImageUploadHandler
+from core.api.metrics_handler import MetricsHandler
 
 TAG = __name__
 
 
 class SimpleHttpServer:
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, ws_server=None):
         self.config = config
         self.logger = setup_logging()
         self.ota_handler = OTAHandler(config)
         self.vision_handler = VisionHandler(config)
         self.image_upload_handler = ImageUploadHandler(config)
+        self.metrics_handler = MetricsHandler(config, ws_server)
 
     def _get_websocket_url(self, local_ip: str, port: int) -> str:
         """获取websocket地址"""
@@ -74,6 +76,9 @@ class SimpleHttpServer:
                     web.options("/api/upload/image", self.image_upload_handler.handle_options),
                 ])
 
+                # 运行指标路由
+                routes.append(web.get("/xiaozhi/metrics", self.metrics_handler.handle_get))
+
                 if not read_config_from_api:
                     # OTA路由
                     routes.extend([
@@ -14,6 +14,7 @@ from urllib import parse
 from datetime import datetime
 from config.logger import setup_logging
 from core.providers.asr.base import ASRProviderBase
+from core.providers.asr.ws_pool import asr_ws_pool
 from core.providers.asr.dto.dto import InterfaceType
 
 TAG = __name__
@@ -66,37 +67,20 @@ class AccessToken:
         return None, None
 
 
-class ASRProvider(ASRProviderBase):
-    def __init__(self, config, delete_audio_file):
-        super().__init__()
-        self.interface_type = InterfaceType.STREAM
-        self.config = config
-        self.text = ""
-        self.decoder = opuslib_next.Decoder(16000, 1)
-        self.asr_ws = None
-        self.forward_task = None
-        self.is_processing = False
-        self.server_ready = False  # 服务器准备状态
+class NlsToken:
+    """NLS访问Token，原型与fork出的所有会话共用，过期前建立连接时自动刷新"""
 
-        # 基础配置
-        self.access_key_id = config.get("access_key_id")
-        self.access_key_secret = config.get("access_key_secret")
-        self.appkey = config.get("appkey")
-        self.token = config.get("token")
-        self.host = config.get("host", "nls-gateway-cn-shanghai.aliyuncs.com")
-        self.ws_url = f"wss://{self.host}/ws/v1"
-        self.max_sentence_silence = config.get("max_sentence_silence")
-        self.output_dir = config.get("output_dir", "./audio_output")
-        self.delete_audio_file = delete_audio_file
+    def __init__(self, access_key_id, access_key_secret, token=None):
+        self.access_key_id = access_key_id
+        self.access_key_secret = access_key_secret
+        self.token = token
         self.expire_time = None
-
-        # Token管理
         if self.access_key_id and self.access_key_secret:
-            self._refresh_token()
+            self.refresh()
         elif not self.token:
             raise ValueError("必须提供access_key_id+access_key_secret或者直接提供token")
 
-    def _refresh_token(self):
+    def refresh(self):
         """刷新Token"""
         self.token, expire_time_str = AccessToken.create_token(self.access_key_id, self.access_key_secret)
         if not self.token:
@@ -112,10 +96,47 @@ class ASRProvider(ASRProviderBase):
         except:
             self.expire_time = None
 
-    def _is_token_expired(self):
+    def is_expired(self):
         """检查Token是否过期"""
         return self.expire_time and time.time() > self.expire_time
 
+    def headers(self):
+        """建立连接用的请求头"""
+        if self.is_expired():
+            self.refresh()
+        return {"X-NLS-Token": self.token}
+
+
+class ASRProvider(ASRProviderBase):
+    def __init__(self, config, delete_audio_file):
+        super().__init__()
+        self.interface_type = InterfaceType.STREAM
+        self.config = config
+
+        # 基础配置
+        self.access_key_id = config.get("access_key_id")
+        self.access_key_secret = config.get("access_key_secret")
+        self.appkey = config.get("appkey")
+        self.host = config.get("host", "nls-gateway-cn-shanghai.aliyuncs.com")
+        self.ws_url = f"wss://{self.host}/ws/v1"
+        self.max_sentence_silence = config.get("max_sentence_silence")
+        self.output_dir = config.get("output_dir", "./audio_output")
+        self.delete_audio_file = delete_audio_file
+
+        # Token管理，连接池在后台补充连接时也通过它获取Token
+        self.nls_token = NlsToken(
+            self.access_key_id, self.access_key_secret, config.get("token")
+        )
+
+    def _init_session_state(self):
+        super()._init_session_state()
+        self.text = ""
+        self.decoder = opuslib_next.Decoder(16000, 1)
+        self.asr_ws = None
+        self.forward_task = None
+        self.is_processing = False
+        self.server_ready = False  # 服务器准备状态
+
     async def open_audio_channels(self, conn):
         await super().open_audio_channels(conn)
 
@@ -128,8 +149,11 @@ class ASRProvider(ASRProviderBase):
         if audio:
             conn.asr_audio_for_voiceprint.append(audio)
         
-        conn.asr_audio.append(audio)
-        conn.asr_audio = conn.asr_audio[-10:]
+        # 服务器准备好之前的音频都先缓存，准备好后一次性补发
+        if not self.server_ready:
+            conn.asr_audio.append(audio)
+            if not self.is_processing:
+                conn.asr_audio.keep_last()
 
         # 只在有声音且没有连接时建立连接
         if audio_have_voice and not self.is_processing:
@@ -150,14 +174,12 @@ class ASRProvider(ASRProviderBase):
 
     async def _start_recognition(self, conn):
         """开始识别会话"""
-        if self._is_token_expired():
-            self._refresh_token()
-        
-        # 建立连接
-        headers = {"X-NLS-Token": self.token}
-        self.asr_ws = await websockets.connect(
+        # 优先取用连接池中预先建立的连接
+        self.asr_ws = await asr_ws_pool.acquire(
+            (self.ws_url, self.appkey, self.access_key_id),
+            f"aliyun_stream:{self.appkey}",
             self.ws_url,
-            additional_headers=headers,
+            self.nls_token.headers,
             max_size=1000000000,
             ping_interval=None,
             ping_timeout=None,
@@ -221,15 +243,17 @@ class ASRProvider(ASRProviderBase):
                         self.server_ready = True
                         logger.bind(tag=TAG).info("服务器已准备，开始发送缓存音频...")
                         
-                        # 发送缓存音频
-                        if conn.asr_audio:
-                            for cached_audio in conn.asr_audio[-10:]:
-                                try:
-                                    pcm_frame = self.decoder.decode(cached_audio, 960)
-                                    await self.asr_ws.send(pcm_frame)
-                                except Exception as e:
-                                    logger.bind(tag=TAG).warning(f"发送缓存音频失败: {e}")
-                                    break
+                        # 补发等待期间缓存的全部音频，合并为一次发送，保证先于后续音频到达
+                        cached_audio = conn.asr_audio.copy()
+                        conn.asr_audio.clear()
+                        try:
+                            pcm_data = b"".join(
+                                self.decoder.decode(audio, 960) for audio in cached_audio
+                            )
+                            if pcm_data:
+                                await self.asr_ws.send(pcm_data)
+                        except Exception as e:
+                            logger.bind(tag=TAG).warning(f"发送缓存音频失败: {e}")
                         continue
                     
                     if message_name == "TranscriptionResultChanged":
@@ -334,4 +358,4 @@ class ASRProvider(ASRProviderBase):
 
     async def close(self):
         """关闭资源"""
-        await self._cleanup()
+        await self._cleanup(None)
@@ -1,21 +1,20 @@
 import os
+import copy
 import wave
 import uuid
-import queue
 import asyncio
 import traceback
-import threading
-import opuslib_next
 import json
 import io
 import time
-import concurrent.futures
 from abc import ABC, abstractmethod
 from config.logger import setup_logging
 from typing import Optional, Tuple, List, Dict, Any
 from core.handle.receiveAudioHandle import startToChat
 from core.handle.reportHandle import enqueue_asr_report
 from core.utils.util import remove_punctuation_and_length
+from core.utils.scheduler import run_coroutine_sync
+from core.utils import opus_codec
 from core.handle.receiveAudioHandle import handleAudioMessage
 
 TAG = __name__
@@ -24,27 +23,37 @@ logger = setup_logging()
 
 class ASRProviderBase(ABC):
     def __init__(self):
+        self._init_session_state()
+
+    def _init_session_state(self):
+        """连接独有的识别状态，子类有自己的会话状态时重写并调用父类方法"""
         pass
 
+    def fork(self):
+        """为新连接创建会话对象
+
+        构造时解析的配置、鉴权信息与客户端等与原实例共用，只重新创建连接独有的状态，
+        省去每个连接重新实例化提供者的开销。
+        """
+        session = copy.copy(self)
+        session._init_session_state()
+        return session
+
     # 打开音频通道
     async def open_audio_channels(self, conn):
-        conn.asr_priority_thread = threading.Thread(
-            target=self.asr_text_priority_thread, args=(conn,), daemon=True
-        )
-        conn.asr_priority_thread.start()
+        # 在事件循环中按序消费音频，不再为每个连接创建线程
+        conn.asr_priority_task = asyncio.create_task(self.asr_text_priority_task(conn))
 
     # 有序处理ASR音频
-    def asr_text_priority_thread(self, conn):
+    async def asr_text_priority_task(self, conn):
         while not conn.stop_event.is_set():
             try:
-                message = conn.asr_audio_queue.get(timeout=1)
-                future = asyncio.run_coroutine_threadsafe(
-                    handleAudioMessage(conn, message),
-                    conn.loop,
-                )
-                future.result()
-            except queue.Empty:
+                message = await asyncio.wait_for(conn.asr_audio_queue.get(), timeout=1)
+                await handleAudioMessage(conn, message)
+            except asyncio.TimeoutError:
                 continue
+            except asyncio.CancelledError:
+                break
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"处理ASR文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
@@ -60,7 +69,8 @@ class ASRProviderBase(ABC):
         
         conn.asr_audio.append(audio)
         if not have_voice and not conn.client_have_voice:
-            conn.asr_audio = conn.asr_audio[-10:]
+            # 静音期间只保留预录音窗口
+            conn.asr_audio.keep_last()
             return
 
         if conn.client_voice_stop:
@@ -96,17 +106,13 @@ class ASRProviderBase(ABC):
             def run_asr():
                 start_time = time.monotonic()
                 try:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        result = loop.run_until_complete(
-                            self.speech_to_text(asr_audio_task, conn.session_id, conn.audio_format)
-                        )
-                        end_time = time.monotonic()
-                        logger.bind(tag=TAG).info(f"ASR耗时: {end_time - start_time:.3f}s")
-                        return result
-                    finally:
-                        loop.close()
+                    # 复用工作线程的事件循环，不再每次新建
+                    result = run_coroutine_sync(
+                        self.speech_to_text(asr_audio_task, conn.session_id, conn.audio_format)
+                    )
+                    end_time = time.monotonic()
+                    logger.bind(tag=TAG).info(f"ASR耗时: {end_time - start_time:.3f}s")
+                    return result
                 except Exception as e:
                     end_time = time.monotonic()
                     logger.bind(tag=TAG).error(f"ASR失败: {e}")
@@ -117,37 +123,33 @@ class ASRProviderBase(ABC):
                 if not wav_data:
                     return None
                 try:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        # 使用连接的声纹识别提供者
-                        result = loop.run_until_complete(
-                            conn.voiceprint_provider.identify_speaker(wav_data, conn.session_id)
-                        )
-                        return result
-                    finally:
-                        loop.close()
+                    # 使用连接的声纹识别提供者
+                    return run_coroutine_sync(
+                        conn.voiceprint_provider.identify_speaker(wav_data, conn.session_id)
+                    )
                 except Exception as e:
                     logger.bind(tag=TAG).error(f"声纹识别失败: {e}")
                     return None
             
-            # 使用线程池执行器并行运行
+            # 在服务器共享的asr线程池中并行运行，事件循环只等待结果
             parallel_start_time = time.monotonic()
-            
-            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as thread_executor:
-                asr_future = thread_executor.submit(run_asr)
-                
-                if conn.voiceprint_provider and wav_data:
-                    voiceprint_future = thread_executor.submit(run_voiceprint)
-                    
-                    # 等待两个线程都完成
-                    asr_result = asr_future.result(timeout=15)
-                    voiceprint_result = voiceprint_future.result(timeout=15)
-                    
-                    results = {"asr": asr_result, "voiceprint": voiceprint_result}
-                else:
-                    asr_result = asr_future.result(timeout=15)
-                    results = {"asr": asr_result, "voiceprint": None}
+
+            asr_future = asyncio.wrap_future(conn.executor.submit_to("asr", run_asr))
+
+            if conn.voiceprint_provider and wav_data:
+                voiceprint_future = asyncio.wrap_future(
+                    conn.executor.submit_to("asr", run_voiceprint)
+                )
+
+                # 等待两个任务都完成
+                asr_result, voiceprint_result = await asyncio.wait_for(
+                    asyncio.gather(asr_future, voiceprint_future), timeout=15
+                )
+
+                results = {"asr": asr_result, "voiceprint": voiceprint_result}
+            else:
+                asr_result = await asyncio.wait_for(asr_future, timeout=15)
+                results = {"asr": asr_result, "voiceprint": None}
             
             
             # 处理结果
@@ -245,27 +247,13 @@ class ASRProviderBase(ABC):
     @staticmethod
     def decode_opus(opus_data: List[bytes]) -> List[bytes]:
         """将Opus音频数据解码为PCM数据"""
+
+        def on_error(i, e):
+            logger.bind(tag=TAG).warning(f"Opus解码错误，跳过数据包 {i}: {e}")
+
         try:
-            decoder = opuslib_next.Decoder(16000, 1)
-            pcm_data = []
-            buffer_size = 960  # 每次处理960个采样点 (60ms at 16kHz)
-            
-            for i, opus_packet in enumerate(opus_data):
-                try:
-                    if not opus_packet or len(opus_packet) == 0:
-                        continue
-                    
-                    pcm_frame = decoder.decode(opus_packet, buffer_size)
-                    if pcm_frame and len(pcm_frame) > 0:
-                        pcm_data.append(pcm_frame)
-                        
-                except opuslib_next.OpusError as e:
-                    logger.bind(tag=TAG).warning(f"Opus解码错误，跳过数据包 {i}: {e}")
-                except Exception as e:
-                    logger.bind(tag=TAG).error(f"音频处理错误，数据包 {i}: {e}")
-            
-            return pcm_data
-            
+            # 使用线程缓存的解码器，每次解码前已重置状态
+            return opus_codec.decode_opus(opus_data, on_error=on_error)
         except Exception as e:
             logger.bind(tag=TAG).error(f"音频解码过程发生错误: {e}")
             return []
@@ -2,9 +2,11 @@ import json
 import gzip
 import uuid
 import asyncio
+import functools
 import websockets
 import opuslib_next
 from core.providers.asr.base import ASRProviderBase
+from core.providers.asr.ws_pool import asr_ws_pool
 from config.logger import setup_logging
 from core.providers.asr.dto.dto import InterfaceType
 
@@ -12,18 +14,23 @@ TAG = __name__
 logger = setup_logging()
 
 
+def token_headers(appid, access_token):
+    """Token鉴权请求头，每条连接使用新的连接ID"""
+    return {
+        "X-Api-App-Key": appid,
+        "X-Api-Access-Key": access_token,
+        "X-Api-Resource-Id": "volc.bigasr.sauc.duration",
+        "X-Api-Connect-Id": str(uuid.uuid4()),
+    }
+
+
 class ASRProvider(ASRProviderBase):
     def __init__(self, config, delete_audio_file):
         super().__init__()
         self.interface_type = InterfaceType.STREAM
         self.config = config
-        self.text = ""
         self.max_retries = 3
         self.retry_delay = 2
-        self.decoder = opuslib_next.Decoder(16000, 1)
-        self.asr_ws = None
-        self.forward_task = None
-        self.is_processing = False  # 添加处理状态标志
 
         # 配置参数
         self.appid = str(config.get("appid"))
@@ -50,12 +57,20 @@ class ASRProvider(ASRProviderBase):
         self.auth_method = config.get("auth_method", "token")
         self.secret = config.get("secret", "access_secret")
 
+    def _init_session_state(self):
+        super()._init_session_state()
+        self.text = ""
+        self.decoder = opuslib_next.Decoder(16000, 1)
+        self.asr_ws = None
+        self.forward_task = None
+        self.is_processing = False  # 添加处理状态标志
+
     async def open_audio_channels(self, conn):
         await super().open_audio_channels(conn)
 
     async def receive_audio(self, conn, audio, audio_have_voice):
         conn.asr_audio.append(audio)
-        conn.asr_audio = conn.asr_audio[-10:]
+        conn.asr_audio.keep_last()
         
         # 存储音频数据
         if not hasattr(conn, 'asr_audio_for_voiceprint'):
@@ -71,13 +86,17 @@ class ASRProvider(ASRProviderBase):
         if audio_have_voice and self.asr_ws is None and not self.is_processing:
             try:
                 self.is_processing = True
-                # 建立新的WebSocket连接
-                headers = self.token_auth() if self.auth_method == "token" else None
-                logger.bind(tag=TAG).info(f"正在连接ASR服务，headers: {headers}")
-
-                self.asr_ws = await websockets.connect(
+                # 优先取用连接池中预先建立的连接
+                headers = (
+                    functools.partial(token_headers, self.appid, self.access_token)
+                    if self.auth_method == "token"
+                    else None
+                )
+                self.asr_ws = await asr_ws_pool.acquire(
+                    (self.ws_url, self.auth_method, self.appid, self.access_token),
+                    f"doubao_stream:{self.appid}",
                     self.ws_url,
-                    additional_headers=headers,
+                    headers,
                     max_size=1000000000,
                     ping_interval=None,
                     ping_timeout=None,
@@ -118,7 +137,7 @@ class ASRProvider(ASRProviderBase):
 
                 # 发送缓存的音频数据
                 if conn.asr_audio and len(conn.asr_audio) > 0:
-                    for cached_audio in conn.asr_audio[-10:]:
+                    for cached_audio in conn.asr_audio.copy():
                         try:
                             pcm_frame = self.decoder.decode(cached_audio, 960)
                             payload = gzip.compress(pcm_frame)
@@ -132,6 +151,8 @@ class ASRProvider(ASRProviderBase):
                             logger.bind(tag=TAG).info(
                                 f"发送缓存音频数据时发生错误: {e}"
                             )
+                # 缓存的音频已包含当前音频
+                return
 
             except Exception as e:
                 logger.bind(tag=TAG).error(f"建立ASR连接失败: {str(e)}")
@@ -226,7 +247,7 @@ class ASRProvider(ASRProviderBase):
                 if hasattr(conn, 'asr_audio_for_voiceprint'):
                     conn.asr_audio_for_voiceprint = []
                 if hasattr(conn, 'asr_audio'):
-                    conn.asr_audio = []
+                    conn.asr_audio.clear()
                 if hasattr(conn, 'has_valid_voice'):
                     conn.has_valid_voice = False
 
@@ -270,12 +291,7 @@ class ASRProvider(ASRProviderBase):
         return req
 
     def token_auth(self):
-        return {
-            "X-Api-App-Key": self.appid,
-            "X-Api-Access-Key": self.access_token,
-            "X-Api-Resource-Id": "volc.bigasr.sauc.duration",
-            "X-Api-Connect-Id": str(uuid.uuid4()),
-        }
+        return token_headers(self.appid, self.access_token)
 
     def generate_header(
         self,
@@ -376,6 +392,6 @@ class ASRProvider(ASRProviderBase):
                 if hasattr(conn, 'asr_audio_for_voiceprint'):
                     conn.asr_audio_for_voiceprint = []
                 if hasattr(conn, 'asr_audio'):
-                    conn.asr_audio = []
+                    conn.asr_audio.clear()
                 if hasattr(conn, 'has_valid_voice'):
                     conn.has_valid_voice = False
@@ -0,0 +1,209 @@
+"""
+流式ASR上游WebSocket连接池
+
+流式ASR原先在检测到说话后才新建到云端的WebSocket连接，TLS握手与鉴权的耗时直接叠加在识别延迟上。
+连接池按上游服务（地址+鉴权信息）在后台预先建立已鉴权的空闲连接，检测到说话时直接取用：
+- 每条连接只用于一次识别会话，取走后立即在后台补充
+- 空闲连接定期ping检查，超过最长空闲时间的连接主动关闭替换，避免取到已被服务端断开的连接
+- 一段时间内没有取用的连接池停止预热，关闭空闲连接，下次取用时重新预热
+
+连接池只保存建立连接所需的参数（地址、请求头或返回请求头的函数），不引用取用连接的ASR实例，
+避免连接池在后台长期持有已断开设备的会话对象。
+"""
+
+import time
+import asyncio
+import weakref
+from collections import deque
+from typing import Callable, Dict, Hashable, Optional, Union
+
+import websockets
+from websockets.protocol import State
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# 健康检查时等待pong的超时时间(秒)
+PING_TIMEOUT = 3
+
+# 请求头，或每次建立连接时调用、返回请求头的函数（如需要刷新的Token、每条连接不同的连接ID）
+Headers = Union[None, dict, Callable[[], Optional[dict]]]
+
+
+async def _open(url: str, headers: Headers, options: dict):
+    if callable(headers):
+        headers = headers()
+    return await websockets.connect(url, additional_headers=headers, **options)
+
+
+class WebSocketPool:
+    """单个上游服务的空闲连接池，只在创建它的事件循环中使用"""
+
+    def __init__(self, registry: "WebSocketPoolRegistry", name: str):
+        self.name = name
+        self._registry = registry
+        # 最近一次取用时传入的 (地址, 请求头, 连接选项)
+        self._target: Optional[tuple] = None
+        # (连接, 进入空闲的时间)
+        self._idle = deque()
+        self._maintain_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._last_acquire = time.monotonic()
+        self._stats = {"hits": 0, "misses": 0, "connected": 0, "evicted": 0, "failed": 0}
+
+    async def acquire(self, url: str, headers: Headers, options: dict):
+        """取出一条可用的空闲连接，没有时直接新建"""
+        # 补充连接时使用最近一次传入的参数
+        self._target = (url, headers, options)
+        self._last_acquire = time.monotonic()
+        try:
+            while self._idle:
+                ws, since = self._idle.popleft()
+                if self._usable(ws, since):
+                    self._stats["hits"] += 1
+                    return ws
+                self._discard(ws)
+            self._stats["misses"] += 1
+            return await _open(url, headers, options)
+        finally:
+            self._ensure_warm()
+
+    def _usable(self, ws, since: float) -> bool:
+        return (
+            ws.state is State.OPEN
+            and time.monotonic() - since < self._registry.max_idle_time
+        )
+
+    def _discard(self, ws) -> None:
+        self._stats["evicted"] += 1
+        asyncio.ensure_future(self._close(ws))
+
+    @staticmethod
+    async def _close(ws) -> None:
+        try:
+            await asyncio.wait_for(ws.close(), timeout=2)
+        except Exception:
+            pass
+
+    def _ensure_warm(self) -> None:
+        if self._maintain_task is None or self._maintain_task.done():
+            self._maintain_task = asyncio.create_task(self._maintain())
+        else:
+            self._wakeup.set()
+
+    async def _maintain(self) -> None:
+        """后台补充空闲连接并做健康检查，长时间没有取用时退出"""
+        registry = self._registry
+        try:
+            while time.monotonic() - self._last_acquire < registry.idle_shutdown:
+                self._wakeup.clear()
+                await self._check_health()
+                await self._refill()
+                # 不用wait_for：唤醒与取消同时发生时wait_for会吞掉取消，服务退出时任务无法结束
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait((waiter,), timeout=registry.health_interval)
+                finally:
+                    waiter.cancel()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            while self._idle:
+                ws, _ = self._idle.popleft()
+                await self._close(ws)
+
+    async def _check_health(self) -> None:
+        if not self._idle:
+            return
+        # ping期间连接仍留在池中，可以照常被取用
+        idle = list(self._idle)
+        results = await asyncio.gather(
+            *(self._ping(ws, since) for ws, since in idle), return_exceptions=True
+        )
+        for entry, healthy in zip(idle, results):
+            if healthy is not True and entry in self._idle:
+                self._idle.remove(entry)
+                self._discard(entry[0])
+
+    async def _ping(self, ws, since: float) -> bool:
+        if not self._usable(ws, since):
+            return False
+        pong_waiter = await ws.ping()
+        await asyncio.wait_for(pong_waiter, timeout=PING_TIMEOUT)
+        return True
+
+    async def _refill(self) -> None:
+        missing = self._registry.min_idle - len(self._idle)
+        if missing <= 0 or self._target is None:
+            return
+        results = await asyncio.gather(
+            *(_open(*self._target) for _ in range(missing)), return_exceptions=True
+        )
+        for ws in results:
+            if isinstance(ws, BaseException):
+                self._stats["failed"] += 1
+                logger.bind(tag=TAG).warning(f"预建ASR连接失败: {self.name}, {ws}")
+            else:
+                self._stats["connected"] += 1
+                self._idle.append((ws, time.monotonic()))
+
+    def get_stats(self) -> dict:
+        return dict(self._stats, upstream=self.name, idle=len(self._idle))
+
+
+class WebSocketPoolRegistry:
+    """所有流式ASR实例共享的连接池集合，由WebSocketServer在启动时配置"""
+
+    def __init__(self):
+        self.configure({})
+        # 连接与事件循环绑定，每个事件循环一组连接池
+        self._pools = weakref.WeakKeyDictionary()
+
+    def configure(self, config: Optional[dict]) -> None:
+        config = config or {}
+        enabled = config.get("enabled", True)
+        min_idle = config.get("min_idle", 1)
+        max_idle_time = config.get("max_idle_time")
+        health_interval = config.get("health_interval")
+        idle_shutdown = config.get("idle_shutdown")
+        self.enabled = enabled not in (False, "false", "False", "0", 0)
+        # 显式配置为0时不预建连接
+        self.min_idle = int(min_idle) if min_idle not in (None, "") else 1
+        self.max_idle_time = float(max_idle_time) if max_idle_time else 8
+        self.health_interval = float(health_interval) if health_interval else 3
+        self.idle_shutdown = float(idle_shutdown) if idle_shutdown else 300
+
+    async def acquire(
+        self, key: Hashable, name: str, url: str, headers: Headers = None, **options
+    ):
+        """取出一条到上游服务的连接
+
+        key 区分上游服务，应包含地址与鉴权信息；name 仅用于日志与运行指标，不要包含密钥。
+        headers 为请求头或返回请求头的函数，options 为 websockets.connect 的其他参数。
+        两者都不应引用ASR实例本身，连接池会保留它们用于在后台补充连接。
+        """
+        if not self.enabled or self.min_idle <= 0:
+            return await _open(url, headers, options)
+        loop = asyncio.get_running_loop()
+        pools: Dict[Hashable, WebSocketPool] = self._pools.setdefault(loop, {})
+        pool = pools.get(key)
+        if pool is None:
+            pool = WebSocketPool(self, name)
+            pools[key] = pool
+        return await pool.acquire(url, headers, options)
+
+    def get_stats(self) -> dict:
+        pools = [
+            pool
+            for loop_pools in list(self._pools.values())
+            for pool in list(loop_pools.values())
+        ]
+        return {
+            "enabled": self.enabled,
+            "upstreams": [pool.get_stats() for pool in pools],
+        }
+
+
+# 全局流式ASR连接池实例
+asr_ws_pool = WebSocketPoolRegistry()
@@ -1,10 +1,13 @@
-from typing import List, Dict
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Tuple
 from ..base import IntentProviderBase
+from ..local_classifier import LocalIntentClassifier
+from core.utils.intent_cache import prompt_signature
 from plugins_func.functions.play_music import initialize_music_handler
 from config.logger import setup_logging
 import re
 import json
-import hashlib
 import time
 
 TAG = __name__
@@ -15,13 +18,13 @@ class IntentProvider(IntentProviderBase):
     def __init__(self, config):
         super().__init__(config)
         self.llm = None
-        self.promot = ""
-        # 导入全局缓存管理器
-        from core.utils.cache.manager import cache_manager, CacheType
-
-        self.cache_manager = cache_manager
-        self.CacheType = CacheType
         self.history_count = 4  # 默认使用最近4条对话记录
+        # 意图提供者在所有连接间共享，提示词按 (工具集, 音乐库版本, 家居设备列表) 分别编译缓存
+        self._prompt_cache: "OrderedDict[tuple, Tuple[str, str]]" = OrderedDict()
+        self._prompt_cache_size = 32
+        self._prompt_lock = threading.Lock()
+        # 明确的简单指令在本地直接判定，不再调用LLM
+        self.local_classifier = LocalIntentClassifier(config.get("local_classifier"))
 
     def get_intent_system_prompt(self, functions_list: str) -> str:
         """
@@ -103,6 +106,53 @@ class IntentProvider(IntentProviderBase):
         )
         return prompt
 
+    def _compile_prompt(self, conn) -> Tuple[str, str]:
+        """返回本连接的意图识别系统提示词及其签名
+
+        函数说明、家居设备、音乐列表依次拼接，越容易变化的部分越靠后，
+        同一工具集下的提示词前缀保持不变，便于上游LLM的前缀缓存命中。
+        """
+        functions = list(conn.func_handler.get_functions() or [])
+        if hasattr(conn, "mcp_client") and conn.mcp_client:
+            # 设备MCP工具通常已由统一工具处理器提供，这里只补充缺少的
+            names = {f.get("function", {}).get("name") for f in functions}
+            for tool in conn.mcp_client.get_available_tools() or []:
+                if tool.get("function", {}).get("name") not in names:
+                    functions.append(tool)
+
+        home_assistant_cfg = conn.config["plugins"].get("home_assistant")
+        devices = ()
+        if home_assistant_cfg:
+            devices = tuple(home_assistant_cfg.get("devices", []))
+        music_config = initialize_music_handler(conn)
+
+        tools_hash = prompt_signature(
+            json.dumps(functions, sort_keys=True, ensure_ascii=False)
+        )
+        key = (tools_hash, music_config.get("version", 0), devices)
+        with self._prompt_lock:
+            compiled = self._prompt_cache.get(key)
+            if compiled is not None:
+                self._prompt_cache.move_to_end(key)
+                return compiled
+
+        prompt = self.get_intent_system_prompt(functions)
+        if devices:
+            prompt += "\n下面是我家智能设备列表（位置，设备名，entity_id），可以通过homeassistant控制\n"
+            prompt += "".join(device + "\n" for device in devices)
+        music_file_names = sorted(music_config.get("music_file_names", []))
+        prompt += f"\n<musicNames>{music_file_names}\n</musicNames>"
+        compiled = (prompt, prompt_signature(prompt))
+
+        with self._prompt_lock:
+            self._prompt_cache[key] = compiled
+            while len(self._prompt_cache) > self._prompt_cache_size:
+                self._prompt_cache.popitem(last=False)
+        logger.bind(tag=TAG).debug(
+            f"编译意图识别提示词: 工具集 {tools_hash}, 音乐库版本 {key[1]}, 长度 {len(prompt)}"
+        )
+        return compiled
+
     def replyResult(self, text: str, original_text: str):
         llm_result = self.llm.response_no_stream(
             system_prompt=text,
@@ -124,56 +174,37 @@ class IntentProvider(IntentProviderBase):
         model_info = getattr(self.llm, "model_name", str(self.llm.__class__.__name__))
         logger.bind(tag=TAG).debug(f"使用意图识别模型: {model_info}")
 
-        # 计算缓存键
-        cache_key = hashlib.md5((conn.device_id + text).encode()).hexdigest()
-
-        # 检查缓存
-        cached_intent = self.cache_manager.get(self.CacheType.INTENT, cache_key)
-        if cached_intent is not None:
-            cache_time = time.time() - total_start_time
-            logger.bind(tag=TAG).debug(
-                f"使用缓存的意图: {cache_key} -> {cached_intent}, 耗时: {cache_time:.4f}秒"
+        local_call = self.local_classifier.classify(
+            text, conn.func_handler.get_functions()
+        )
+        if local_call is not None:
+            intent = json.dumps({"function_call": local_call}, ensure_ascii=False)
+            logger.bind(tag=TAG).info(
+                f"本地识别到意图: {local_call['name']}, 耗时: {time.time() - total_start_time:.4f}秒"
             )
-            return cached_intent
-
-        if self.promot == "":
-            functions = conn.func_handler.get_functions()
-            if hasattr(conn, "mcp_client"):
-                mcp_tools = conn.mcp_client.get_available_tools()
-                if mcp_tools is not None and len(mcp_tools) > 0:
-                    if functions is None:
-                        functions = []
-                    functions.extend(mcp_tools)
-
-            self.promot = self.get_intent_system_prompt(functions)
-
-        music_config = initialize_music_handler(conn)
-        music_file_names = music_config["music_file_names"]
-        prompt_music = f"{self.promot}\n<musicNames>{music_file_names}\n</musicNames>"
-
-        home_assistant_cfg = conn.config["plugins"].get("home_assistant")
-        if home_assistant_cfg:
-            devices = home_assistant_cfg.get("devices", [])
-        else:
-            devices = []
-        if len(devices) > 0:
-            hass_prompt = "\n下面是我家智能设备列表（位置，设备名，entity_id），可以通过homeassistant控制\n"
-            for device in devices:
-                hass_prompt += device + "\n"
-            prompt_music += hass_prompt
+            return intent
 
+        prompt_music, signature = self._compile_prompt(conn)
         logger.bind(tag=TAG).debug(f"User prompt: {prompt_music}")
 
-        # 构建用户对话历史的提示
-        msgStr = ""
-
-        # 获取最近的对话历史
-        start_idx = max(0, len(dialogue_history) - self.history_count)
-        for i in range(start_idx, len(dialogue_history)):
-            msgStr += f"{dialogue_history[i].role}: {dialogue_history[i].content}\n"
+        # 检查全服务共享的意图缓存，提示词签名包含可用函数与设备列表
+        intent_cache = getattr(conn.server, "intent_cache", None)
+        if intent_cache is not None:
+            cached_intent = intent_cache.get(signature, text)
+            if cached_intent is not None:
+                cache_time = time.time() - total_start_time
+                logger.bind(tag=TAG).debug(
+                    f"使用缓存的意图: {text} -> {cached_intent}, 耗时: {cache_time:.4f}秒"
+                )
+                return cached_intent
 
-        msgStr += f"User: {text}\n"
-        user_prompt = f"current dialogue:\n{msgStr}"
+        # 构建用户对话历史的提示，只取最近的对话历史
+        lines = [
+            f"{msg.role}: {msg.content}\n"
+            for msg in dialogue_history[-self.history_count :]
+        ]
+        lines.append(f"User: {text}\n")
+        user_prompt = "current dialogue:\n" + "".join(lines)
 
         # 记录预处理完成时间
         preprocess_time = time.time() - total_start_time
@@ -183,8 +214,13 @@ class IntentProvider(IntentProviderBase):
         llm_start_time = time.time()
         logger.bind(tag=TAG).debug(f"开始LLM意图识别调用, 模型: {model_info}")
 
-        intent = self.llm.response_no_stream(
-            system_prompt=prompt_music, user_prompt=user_prompt
+        # 阻塞的LLM调用交给线程池，避免卡住事件循环及所有设备的音频发送
+        # 使用单独的intent线程池，llm线程池被进行中的对话占满时意图识别也不必排队
+        intent = await conn.executor.run(
+            "intent",
+            self.llm.response_no_stream,
+            system_prompt=prompt_music,
+            user_prompt=user_prompt,
         )
 
         # 记录LLM调用完成时间
@@ -234,7 +270,8 @@ class IntentProvider(IntentProviderBase):
                     conn.dialogue.dialogue = clean_history
 
                 # 添加到缓存
-                self.cache_manager.set(self.CacheType.INTENT, cache_key, intent)
+                if intent_cache is not None:
+                    intent_cache.put(signature, text, intent)
 
                 # 后处理时间
                 postprocess_time = time.time() - postprocess_start_time
@@ -244,7 +281,8 @@ class IntentProvider(IntentProviderBase):
                 return intent
             else:
                 # 添加到缓存
-                self.cache_manager.set(self.CacheType.INTENT, cache_key, intent)
+                if intent_cache is not None:
+                    intent_cache.put(signature, text, intent)
 
                 # 后处理时间
                 postprocess_time = time.time() - postprocess_start_time
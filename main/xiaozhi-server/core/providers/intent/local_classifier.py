@@ -0,0 +1,186 @@
+"""
+本地意图预分类器
+
+在调用意图识别LLM之前，用关键词规则和函数描述中的短语对用户输入做一次本地匹配。
+只有"去掉命中短语和语气填充词后什么都不剩"的明确指令（如"播放音乐"、"退出"）才在本地直接给出
+function_call；疑问句、带额外内容或同时命中多个函数的输入一律交给LLM判断。
+"""
+
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# 出现这些词时说明用户在提问（如"怎么退出了？"），不在本地判定
+QUESTION_MARKERS = ("怎么", "为什么", "如何", "什么", "哪", "吗", "呢", "么", "?")
+
+# 指令前后常见的语气与填充词，匹配时忽略
+FILLER_WORDS = (
+    "可以",
+    "麻烦",
+    "帮我",
+    "给我",
+    "为我",
+    "我要",
+    "我想",
+    "一下",
+    "一首",
+    "一个",
+    "好的",
+    "现在",
+    "那就",
+    "请",
+    "吧",
+    "啊",
+    "呀",
+    "啦",
+    "哦",
+    "嗯",
+    "了",
+    "你",
+)
+
+# 从函数描述中拆出的短语，长度在此范围内才作为关键词
+_DESC_PHRASE_LEN = (2, 6)
+_DESC_SPLIT = re.compile(r"[，。、；：,.;:\s（）()\"'“”]+")
+_PUNCTUATION = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """全角转半角、转小写，并去掉标点和空白"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _PUNCTUATION.sub("", text)
+
+
+class LocalIntentClassifier:
+    """基于关键词的本地意图分类器
+
+    rules的格式为 {函数名: {"keywords": [...], "arguments": {...}}}。
+    只有在本连接可用、且required参数都能由规则中的arguments补齐的函数才会参与本地匹配，
+    这类函数的描述中较短的子句（如"唱歌"、"听歌"）也会自动作为关键词。
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        config = config or {}
+        enabled = config.get("enabled", True)
+        max_length = config.get("max_length", "12")
+        cache_size = config.get("cache_size")
+
+        self.enabled = enabled not in (False, "false", "False", "0", 0)
+        self.max_length = int(max_length) if max_length else 12
+        self.rules: Dict[str, dict] = config.get("rules") or {}
+        self.cache_size = int(cache_size) if cache_size else 16
+        # 分类器由所有连接共用，各设备的MCP/IoT函数不同，按函数列表缓存构建好的关键词表
+        # 函数列表签名 -> 按关键词长度降序排列的 (关键词, 函数名)，优先匹配更长的短语
+        self._tables: "OrderedDict[tuple, List[Tuple[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _signature(functions: List[Dict[str, Any]]) -> tuple:
+        """关键词表只取决于函数名、描述和必填参数"""
+        items = []
+        for func in functions or []:
+            func_info = func.get("function", {})
+            required = func_info.get("parameters", {}).get("required", [])
+            items.append(
+                (
+                    func_info.get("name", ""),
+                    func_info.get("description", ""),
+                    tuple(required),
+                )
+            )
+        return tuple(sorted(items))
+
+    def _keywords(self, functions: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        signature = self._signature(functions)
+        with self._lock:
+            keywords = self._tables.get(signature)
+            if keywords is not None:
+                self._tables.move_to_end(signature)
+                return keywords
+        keywords = self._build(functions)
+        with self._lock:
+            self._tables[signature] = keywords
+            self._tables.move_to_end(signature)
+            while len(self._tables) > self.cache_size:
+                self._tables.popitem(last=False)
+        return keywords
+
+    def _build(self, functions: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        keywords = {}
+        for func in functions or []:
+            func_info = func.get("function", {})
+            name = func_info.get("name", "")
+            rule = self.rules.get(name)
+            if not rule:
+                continue
+
+            arguments = rule.get("arguments") or {}
+            required = func_info.get("parameters", {}).get("required", [])
+            missing = [param for param in required if param not in arguments]
+            if missing:
+                logger.bind(tag=TAG).warning(
+                    f"本地意图规则 {name} 缺少必填参数 {missing}，已忽略"
+                )
+                continue
+
+            phrases = list(rule.get("keywords") or [])
+            for clause in _DESC_SPLIT.split(func_info.get("description", "")):
+                if _DESC_PHRASE_LEN[0] <= len(clause) <= _DESC_PHRASE_LEN[1]:
+                    phrases.append(clause)
+
+            for phrase in phrases:
+                phrase = normalize(phrase)
+                if not phrase:
+                    continue
+                # 同一短语对应多个函数时无法区分，不做本地判定
+                if keywords.get(phrase, name) != name:
+                    keywords[phrase] = None
+                else:
+                    keywords[phrase] = name
+
+        return sorted(
+            ((phrase, name) for phrase, name in keywords.items() if name),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+
+    def _strip_fillers(self, text: str) -> str:
+        for word in FILLER_WORDS:
+            text = text.replace(word, "")
+        return text
+
+    def classify(
+        self, text: str, functions: List[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """返回本地判定出的function_call，无法确定时返回None"""
+        if not self.enabled or not self.rules or not text:
+            return None
+
+        if any(
+            marker in unicodedata.normalize("NFKC", text) for marker in QUESTION_MARKERS
+        ):
+            return None
+        text = normalize(text)
+        if not text or len(text) > self.max_length:
+            return None
+
+        matched = None
+        for phrase, name in self._keywords(functions):
+            # 去掉命中短语与填充词后还有剩余内容（如歌名），交给LLM
+            if phrase in text and not self._strip_fillers(text.replace(phrase, "")):
+                matched = name
+                break
+        if matched is None:
+            return None
+
+        function_call = {"name": matched}
+        arguments = self.rules[matched].get("arguments")
+        if arguments:
+            function_call["arguments"] = dict(arguments)
+        return function_call
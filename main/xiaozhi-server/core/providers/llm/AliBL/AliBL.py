@@ -15,6 +15,7 @@ class LLMProvider(LLMProviderBase):
         self.base_url = config.get("base_url")
         self.is_No_prompt = config.get("is_no_prompt")
         self.memory_id = config.get("ali_memory_id")
+        self.max_concurrency = config.get("max_concurrency")
         check_model_key("AliBLLLM", self.api_key)
 
     def response(self, session_id, dialogue):
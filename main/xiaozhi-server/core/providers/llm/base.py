@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from config.logger import setup_logging
+from core.providers.llm.transport import LLMStream, iterate_in_thread, llm_transport
 
 TAG = __name__
 logger = setup_logging()
@@ -37,3 +38,67 @@ class LLMProviderBase(ABC):
         for token in self.response(session_id, dialogue):
             yield token, None
 
+    @staticmethod
+    def _chunk_content(chunk):
+        """取出OpenAI兼容接口流式chunk中的文本，没有有效的choice时返回空字符串"""
+        try:
+            delta = chunk.choices[0].delta if getattr(chunk, "choices", None) else None
+            return delta.content if hasattr(delta, "content") else ""
+        except IndexError:
+            return ""
+
+    @staticmethod
+    def _filter_think(content, is_active):
+        """去掉<think>标签内的内容，返回(可输出的内容, 是否处于标签外)"""
+        # 处理标签跨多个chunk的情况
+        if "<think>" in content:
+            is_active = False
+            content = content.split("<think>")[0]
+        if "</think>" in content:
+            is_active = True
+            content = content.split("</think>")[-1]
+        return (content if is_active else ""), is_active
+
+    async def response_async(self, session_id, dialogue, executor=None, **kwargs):
+        """异步流式响应
+
+        默认在线程池中迭代同步的response；原生支持异步请求的服务覆盖此方法，
+        使用共享连接池发起请求，被取消时立即关闭上游连接。
+        """
+        async for token in iterate_in_thread(
+            executor, self.response, session_id, dialogue, **kwargs
+        ):
+            yield token
+
+    async def response_with_functions_async(
+        self, session_id, dialogue, functions=None, executor=None
+    ):
+        """异步流式响应（支持function call），默认在线程池中迭代同步的response_with_functions"""
+        async for item in iterate_in_thread(
+            executor,
+            self.response_with_functions,
+            session_id,
+            dialogue,
+            functions=functions,
+        ):
+            yield item
+
+    def open_stream(self, session_id, dialogue, functions=None, executor=None):
+        """打开一轮流式请求，返回LLMStream
+
+        functions为None时产出文本，否则产出(文本, 工具调用)；
+        同一上游服务的并发请求数受llm_transport.max_concurrency或该LLM配置中的max_concurrency限制。
+        """
+        if functions is None:
+            factory = lambda: self.response_async(
+                session_id, dialogue, executor=executor
+            )
+        else:
+            factory = lambda: self.response_with_functions_async(
+                session_id, dialogue, functions=functions, executor=executor
+            )
+        limiter = llm_transport.limiter(
+            getattr(self, "base_url", None) or type(self).__module__,
+            getattr(self, "max_concurrency", None),
+        )
+        return LLMStream(factory, limiter)
@@ -22,6 +22,7 @@ class LLMProvider(LLMProviderBase):
         self.personal_access_token = config.get("personal_access_token")
         self.bot_id = str(config.get("bot_id"))
         self.user_id = str(config.get("user_id"))
+        self.max_concurrency = config.get("max_concurrency")
         self.session_conversation_map = {}  # 存储session_id和conversation_id的映射
         model_key_msg = check_model_key("CozeLLM", self.personal_access_token)
         if model_key_msg:
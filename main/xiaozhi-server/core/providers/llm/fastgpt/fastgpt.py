@@ -1,7 +1,7 @@
 import json
 from config.logger import setup_logging
-import requests
 from core.providers.llm.base import LLMProviderBase
+from core.providers.llm.transport import llm_transport
 from core.utils.util import check_model_key
 
 TAG = __name__
@@ -9,59 +9,88 @@ logger = setup_logging()
 
 
 class LLMProvider(LLMProviderBase):
+    _DONE = object()
+
     def __init__(self, config):
         self.api_key = config["api_key"]
         self.base_url = config.get("base_url")
         self.detail = config.get("detail", False)
         self.variables = config.get("variables", {})
+        self.max_concurrency = config.get("max_concurrency")
         model_key_msg = check_model_key("FastGPTLLM", self.api_key)
         if model_key_msg:
             logger.bind(tag=TAG).error(model_key_msg)
 
-    def response(self, session_id, dialogue, **kwargs):
+    def _request_kwargs(self, session_id, dialogue):
+        # 取最后一条用户消息
+        last_msg = next(m for m in reversed(dialogue) if m["role"] == "user")
+        return dict(
+            method="POST",
+            url=f"{self.base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={
+                "stream": True,
+                "chatId": session_id,
+                "detail": self.detail,
+                "variables": self.variables,
+                "messages": [{"role": "user", "content": last_msg["content"]}],
+            },
+        )
+
+    def _parse_line(self, line):
+        """解析一行流式响应，返回需要输出的文本，流结束时返回_DONE"""
+        if not line or not line.startswith("data: "):
+            return None
+        if line[6:] == "[DONE]":
+            return self._DONE
         try:
-            # 取最后一条用户消息
-            last_msg = next(m for m in reversed(dialogue) if m["role"] == "user")
+            data = json.loads(line[6:])
+        except json.JSONDecodeError:
+            return None
+        if "choices" in data and len(data["choices"]) > 0:
+            delta = data["choices"][0].get("delta", {})
+            if delta and "content" in delta and delta["content"] is not None:
+                content = delta["content"]
+                if "<think>" in content or "</think>" in content:
+                    return None
+                return content
+        return None
 
-            # 发起流式请求
-            with requests.post(
-                f"{self.base_url}/chat/completions",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json={
-                    "stream": True,
-                    "chatId": session_id,
-                    "detail": self.detail,
-                    "variables": self.variables,
-                    "messages": [{"role": "user", "content": last_msg["content"]}],
-                },
-                stream=True,
+    def response(self, session_id, dialogue, **kwargs):
+        try:
+            # 发起流式请求，连接取自共享的长连接池
+            with llm_transport.sync_client().stream(
+                **self._request_kwargs(session_id, dialogue)
             ) as r:
                 for line in r.iter_lines():
-                    if line:
-                        try:
-                            if line.startswith(b"data: "):
-                                if line[6:].decode("utf-8") == "[DONE]":
-                                    break
+                    try:
+                        content = self._parse_line(line)
+                    except Exception:
+                        continue
+                    if content is self._DONE:
+                        break
+                    if content:
+                        yield content
 
-                                data = json.loads(line[6:])
-                                if "choices" in data and len(data["choices"]) > 0:
-                                    delta = data["choices"][0].get("delta", {})
-                                    if (
-                                        delta
-                                        and "content" in delta
-                                        and delta["content"] is not None
-                                    ):
-                                        content = delta["content"]
-                                        if "<think>" in content:
-                                            continue
-                                        if "</think>" in content:
-                                            continue
-                                        yield content
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in response generation: {e}")
+            yield "【服务响应异常】"
 
-                        except json.JSONDecodeError as e:
-                            continue
-                        except Exception as e:
-                            continue
+    async def response_async(self, session_id, dialogue, **kwargs):
+        try:
+            # 退出时（包括被打断取消）关闭上游连接
+            async with llm_transport.async_client().stream(
+                **self._request_kwargs(session_id, dialogue)
+            ) as r:
+                async for line in r.aiter_lines():
+                    try:
+                        content = self._parse_line(line)
+                    except Exception:
+                        continue
+                    if content is self._DONE:
+                        break
+                    if content:
+                        yield content
 
         except Exception as e:
             logger.bind(tag=TAG).error(f"Error in response generation: {e}")
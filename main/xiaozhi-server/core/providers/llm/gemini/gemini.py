@@ -70,6 +70,7 @@ class LLMProvider(LLMProviderBase):
     def __init__(self, cfg: Dict[str, Any]):
         self.model_name = cfg.get("model_name", "gemini-2.0-flash")
         self.api_key = cfg["api_key"]
+        self.max_concurrency = cfg.get("max_concurrency")
         http_proxy = cfg.get("http_proxy")
         https_proxy = cfg.get("https_proxy")
 
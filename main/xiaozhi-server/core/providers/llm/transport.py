@@ -0,0 +1,362 @@
+"""
+LLM请求的共享传输层
+
+- 所有LLM服务共用保持长连接的HTTP连接池（安装了h2时启用HTTP/2），不再每个客户端各建一套连接
+- 每个上游服务（按base_url区分）可以限制同时进行的流式请求数，超出的请求排队等待
+- LLMStream 以 async for 逐块产出响应；打断时 close() 立即取消正在等待的读取并关闭上游连接，
+  不会再把剩余的token读完
+"""
+
+import asyncio
+import weakref
+import threading
+import importlib.util
+from collections import deque
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+DEFAULT_TIMEOUT = 300
+
+
+class UpstreamLimiter:
+    """单个上游服务的并发上限，同步线程与事件循环共用
+
+    名额用完时请求按先后排队，归还的名额直接交给队首的等待者：
+    线程中的请求阻塞在自己的Event上，事件循环中的请求等待自己的Future，不占用任何线程。
+    """
+
+    def __init__(self, name: str, max_concurrency: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._available = max_concurrency
+        # 每项为 threading.Event（线程中等待）或 (事件循环, Future)
+        self._waiters = deque()
+        self.active = 0
+        self.waiting = 0
+
+    def _try_acquire(self, waiter) -> bool:
+        """有空闲名额时直接占用，否则登记为等待者"""
+        with self._lock:
+            if self._available > 0 and not self._waiters:
+                self._available -= 1
+                self.active += 1
+                return True
+            self._waiters.append(waiter)
+            self.waiting += 1
+            return False
+
+    def acquire(self) -> None:
+        event = threading.Event()
+        if not self._try_acquire(event):
+            event.wait()
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        if self._try_acquire(waiter):
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self.waiting -= 1
+                    raise
+            # 名额已转交给本次等待：已拿到时归还；Future已取消时由_grant归还
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                self.active -= 1
+                self._available += 1
+                return
+            # 名额直接转交给队首的等待者，active不变
+            waiter = self._waiters.popleft()
+            self.waiting -= 1
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+            return
+        loop, future = waiter
+        try:
+            loop.call_soon_threadsafe(self._grant, future)
+        except RuntimeError:
+            # 等待者所在的事件循环已关闭
+            self.release()
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.done():
+            # 等待已被取消，名额交给下一个等待者
+            self.release()
+        else:
+            future.set_result(None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self.active,
+                "waiting": self.waiting,
+            }
+
+
+class LLMTransport:
+    """LLM共享连接池与并发控制，由WebSocketServer在创建LLM实例之前配置"""
+
+    def __init__(self):
+        self.configure({})
+        self._lock = threading.Lock()
+        self._sync_client: Optional[httpx.Client] = None
+        # 异步客户端与事件循环绑定，每个事件循环一份
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._limiters: Dict[str, UpstreamLimiter] = {}
+
+    def configure(self, config: Optional[dict]) -> None:
+        config = config or {}
+        max_connections = config.get("max_connections")
+        max_keepalive = config.get("max_keepalive_connections")
+        keepalive_expiry = config.get("keepalive_expiry")
+        timeout = config.get("timeout")
+        max_concurrency = config.get("max_concurrency")
+        self.limits = httpx.Limits(
+            max_connections=int(max_connections) if max_connections else 100,
+            max_keepalive_connections=int(max_keepalive) if max_keepalive else 20,
+            keepalive_expiry=float(keepalive_expiry) if keepalive_expiry else 60,
+        )
+        self.timeout = float(timeout) if timeout else DEFAULT_TIMEOUT
+        self.max_concurrency = int(max_concurrency) if max_concurrency else 0
+        http2 = config.get("http2", True) not in (False, "false", "False", "0", 0)
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            logger.bind(tag=TAG).debug("未安装h2，LLM请求使用HTTP/1.1长连接")
+
+    def sync_client(self) -> httpx.Client:
+        """线程池中同步请求共用的HTTP客户端"""
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(
+                    http2=self.http2, limits=self.limits, timeout=self.timeout
+                )
+            return self._sync_client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """当前事件循环共用的异步HTTP客户端"""
+        return self._loop_clients()["http"]
+
+    def async_openai(self, base_url: str, api_key: str, timeout: Optional[float] = None):
+        """当前事件循环中使用共享连接池的AsyncOpenAI客户端"""
+        clients = self._loop_clients()
+        key = (base_url, api_key, timeout)
+        client = clients["openai"].get(key)
+        if client is None:
+            import openai
+
+            client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=timeout if timeout else self.timeout,
+                http_client=clients["http"],
+            )
+            clients["openai"][key] = client
+        return client
+
+    def _loop_clients(self) -> dict:
+        loop = asyncio.get_running_loop()
+        clients = self._async_clients.get(loop)
+        if clients is None:
+            clients = {
+                "http": httpx.AsyncClient(
+                    http2=self.http2, limits=self.limits, timeout=self.timeout
+                ),
+                "openai": {},
+            }
+            self._async_clients[loop] = clients
+        return clients
+
+    def limiter(
+        self, base_url: Optional[str], max_concurrency=None
+    ) -> Optional[UpstreamLimiter]:
+        """返回上游服务的并发限制，未设置上限时返回None"""
+        limit = int(max_concurrency) if max_concurrency else self.max_concurrency
+        if limit <= 0:
+            return None
+        name = (urlsplit(base_url).netloc or base_url) if base_url else "default"
+        key = f"{name}#{limit}"
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = UpstreamLimiter(name, limit)
+                self._limiters[key] = limiter
+            return limiter
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {
+            "http2": self.http2,
+            "upstreams": [
+                dict(limiter.get_stats(), upstream=limiter.name) for limiter in limiters
+            ],
+        }
+
+
+class LLMStream:
+    """一轮LLM流式请求，async for 逐块产出响应
+
+    首次读取时才占用上游的并发名额并发起请求，流结束或关闭时归还。
+    close() 可在任意线程、任意时刻调用：正在等待上游下一块响应的读取立即取消，
+    上游连接随之关闭，迭代正常结束。
+    """
+
+    def __init__(self, factory: Callable, limiter: Optional[UpstreamLimiter] = None):
+        # factory 无参数，返回异步生成器
+        self._factory = factory
+        self._limiter = limiter
+        self._source = None
+        self._pending = None
+        self._loop = None
+        self._acquired = False
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed:
+            raise StopAsyncIteration
+        if self._source is None:
+            self._loop = asyncio.get_running_loop()
+            if self._limiter is not None:
+                await self._limiter.acquire_async()
+                self._acquired = True
+            if self.closed:
+                # 排队等待名额期间已被打断，不再发起请求
+                self._release()
+                raise StopAsyncIteration
+            self._source = self._factory()
+        self._pending = asyncio.ensure_future(self._source.__anext__())
+        try:
+            return await self._pending
+        except asyncio.CancelledError:
+            if self.closed and not self._current_task_cancelling():
+                raise StopAsyncIteration
+            raise
+        except StopAsyncIteration:
+            self._release()
+            raise
+
+    def close(self) -> None:
+        """打断当前请求"""
+        if self.closed:
+            return
+        self.closed = True
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._cancel_pending()
+        else:
+            loop.call_soon_threadsafe(self._cancel_pending)
+
+    async def aclose(self) -> None:
+        """关闭请求并等待上游连接释放"""
+        self.closed = True
+        try:
+            if self._pending is not None and not self._pending.done():
+                self._pending.cancel()
+                try:
+                    await self._pending
+                except (asyncio.CancelledError, Exception):
+                    pass
+            if self._source is not None:
+                await self._source.aclose()
+        finally:
+            self._release()
+
+    def iterate_sync(self, loop: asyncio.AbstractEventLoop):
+        """在线程中迭代，请求本身仍在loop中异步执行"""
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(
+                        self.__anext__(), loop
+                    ).result()
+                except StopAsyncIteration:
+                    break
+        finally:
+            if not loop.is_closed():
+                asyncio.run_coroutine_threadsafe(self.aclose(), loop).result()
+
+    def _cancel_pending(self) -> None:
+        if self._pending is not None and not self._pending.done():
+            self._pending.cancel()
+
+    def _release(self) -> None:
+        if self._acquired:
+            self._acquired = False
+            self._limiter.release()
+
+    @staticmethod
+    def _current_task_cancelling() -> bool:
+        task = asyncio.current_task()
+        return task is not None and getattr(task, "cancelling", lambda: 0)() > 0
+
+
+async def iterate_in_thread(executor, factory: Callable, *args, **kwargs):
+    """在线程池中逐项迭代阻塞的生成器，供尚无异步接口的服务使用
+
+    executor 为连接的 ConnectionExecutor，为None时使用事件循环默认的线程池。
+    读取在llm_io线程池中执行：对话线程在llm线程池中同步等待这些读取，共用同一线程池会在对话数
+    达到线程数时互相等待而死锁。
+    迭代被取消或提前关闭时，等正在进行的那一次读取返回后再在线程池中关闭生成器。
+    """
+    loop = asyncio.get_running_loop()
+    items = factory(*args, **kwargs)
+    if items is None:
+        return
+    items = iter(items)
+    done = object()
+    # 读取与关闭可能落在不同线程，用锁保证生成器不会被同时操作
+    lock = threading.Lock()
+
+    def step():
+        with lock:
+            return next(items, done)
+
+    def close():
+        with lock:
+            if hasattr(items, "close"):
+                items.close()
+
+    def submit(fn):
+        if executor is not None:
+            return asyncio.wrap_future(executor.submit_to("llm_io", fn))
+        return loop.run_in_executor(None, fn)
+
+    try:
+        while True:
+            item = await submit(step)
+            if item is done:
+                break
+            yield item
+    finally:
+        submit(close)
+
+
+# 全局LLM传输层实例
+llm_transport = LLMTransport()
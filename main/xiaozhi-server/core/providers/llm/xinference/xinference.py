@@ -2,6 +2,7 @@ from config.logger import setup_logging
 from openai import OpenAI
 import json
 from core.providers.llm.base import LLMProviderBase
+from core.providers.llm.transport import llm_transport
 
 TAG = __name__
 logger = setup_logging()
@@ -15,6 +16,7 @@ class LLMProvider(LLMProviderBase):
         # 如果没有v1，增加v1
         if not self.base_url.endswith("/v1"):
             self.base_url = f"{self.base_url}/v1"
+        self.max_concurrency = config.get("max_concurrency")
 
         logger.bind(tag=TAG).info(
             f"Initializing Xinference LLM provider with model: {self.model_name}, base_url: {self.base_url}"
@@ -24,6 +26,7 @@ class LLMProvider(LLMProviderBase):
             self.client = OpenAI(
                 base_url=self.base_url,
                 api_key="xinference",  # Xinference has a similar setup to Ollama where it doesn't need an actual key
+                http_client=llm_transport.sync_client(),
             )
             logger.bind(tag=TAG).info("Xinference client initialized successfully")
         except Exception as e:
@@ -41,20 +44,10 @@ class LLMProvider(LLMProviderBase):
             is_active = True
             for chunk in responses:
                 try:
-                    delta = (
-                        chunk.choices[0].delta
-                        if getattr(chunk, "choices", None)
-                        else None
-                    )
-                    content = delta.content if hasattr(delta, "content") else ""
+                    content = self._chunk_content(chunk)
                     if content:
-                        if "<think>" in content:
-                            is_active = False
-                            content = content.split("<think>")[0]
-                        if "</think>" in content:
-                            is_active = True
-                            content = content.split("</think>")[-1]
-                        if is_active:
+                        content, is_active = self._filter_think(content, is_active)
+                        if content:
                             yield content
                 except Exception as e:
                     logger.bind(tag=TAG).error(f"Error processing chunk: {e}")
@@ -63,6 +56,29 @@ class LLMProvider(LLMProviderBase):
             logger.bind(tag=TAG).error(f"Error in Xinference response generation: {e}")
             yield "【Xinference服务响应异常】"
 
+    async def response_async(self, session_id, dialogue, **kwargs):
+        client = llm_transport.async_openai(self.base_url, "xinference")
+        try:
+            responses = await client.chat.completions.create(
+                model=self.model_name, messages=dialogue, stream=True
+            )
+            # 退出时（包括被打断取消）关闭上游连接
+            async with responses:
+                is_active = True
+                async for chunk in responses:
+                    try:
+                        content = self._chunk_content(chunk)
+                        if content:
+                            content, is_active = self._filter_think(content, is_active)
+                            if content:
+                                yield content
+                    except Exception as e:
+                        logger.bind(tag=TAG).error(f"Error processing chunk: {e}")
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in Xinference response generation: {e}")
+            yield "【Xinference服务响应异常】"
+
     def response_with_functions(self, session_id, dialogue, functions=None):
         try:
             logger.bind(tag=TAG).debug(
@@ -96,3 +112,29 @@ class LLMProvider(LLMProviderBase):
                 "type": "content",
                 "content": f"【Xinference服务响应异常: {str(e)}】",
             }
+
+    async def response_with_functions_async(
+        self, session_id, dialogue, functions=None, **kwargs
+    ):
+        client = llm_transport.async_openai(self.base_url, "xinference")
+        try:
+            stream = await client.chat.completions.create(
+                model=self.model_name,
+                messages=dialogue,
+                stream=True,
+                tools=functions,
+            )
+            async with stream:
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        yield delta.content, delta.tool_calls
+                    elif delta.tool_calls:
+                        yield None, delta.tool_calls
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in Xinference function call: {e}")
+            yield {
+                "type": "content",
+                "content": f"【Xinference服务响应异常: {str(e)}】",
+            }
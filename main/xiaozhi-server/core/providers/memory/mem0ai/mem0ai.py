@@ -1,3 +1,4 @@
+import asyncio
 import traceback
 
 from ..base import MemoryProviderBase, logger
@@ -41,8 +42,12 @@ class MemoryProvider(MemoryProviderBase):
                 for message in msgs
                 if message.role != "system"
             ]
-            result = self.client.add(
-                messages, user_id=self.role_id, output_format=self.api_version
+            # mem0客户端为同步接口，放到线程中执行避免阻塞事件循环
+            result = await asyncio.to_thread(
+                self.client.add,
+                messages,
+                user_id=self.role_id,
+                output_format=self.api_version,
             )
             logger.bind(tag=TAG).debug(f"Save memory result: {result}")
         except Exception as e:
@@ -53,8 +58,11 @@ class MemoryProvider(MemoryProviderBase):
         if not self.use_mem0:
             return ""
         try:
-            results = self.client.search(
-                query, user_id=self.role_id, output_format=self.api_version
+            results = await asyncio.to_thread(
+                self.client.search,
+                query,
+                user_id=self.role_id,
+                output_format=self.api_version,
             )
             if not results or "results" not in results:
                 return ""
@@ -13,6 +13,7 @@ import os
 from datetime import datetime
 from urllib import parse
 from core.providers.tts.base import TTSProviderBase
+from core.providers.tts.ws_mux import tts_ws_mux
 from core.providers.tts.dto.dto import SentenceType, ContentType, InterfaceType
 from core.utils.tts import MarkdownCleaner
 from core.utils import opus_encoder_utils, textUtils
@@ -121,9 +122,19 @@ class TTSProvider(TTSProviderBase):
         # WebSocket配置
         self.host = config.get("host", "nls-gateway-cn-beijing.aliyuncs.com")
         self.ws_url = f"wss://{self.host}/ws/v1"
-        self.ws = None
+
+        # Token管理
+        if self.access_key_id and self.access_key_secret:
+            self._refresh_token()
+        else:
+            self.token = config.get("token")
+            self.expire_time = None
+
+    def _init_session_state(self):
+        super()._init_session_state()
+        # 当前TTS会话占用的共享上游连接
+        self.session = None
         self._monitor_task = None
-        self.last_active_time = None
 
         # 专属tts设置
         self.message_id = ""
@@ -133,13 +144,6 @@ class TTSProvider(TTSProviderBase):
             sample_rate=16000, channels=1, frame_size_ms=60
         )
 
-        # Token管理
-        if self.access_key_id and self.access_key_secret:
-            self._refresh_token()
-        else:
-            self.token = config.get("token")
-            self.expire_time = None
-
     def _refresh_token(self):
         """刷新Token并记录过期时间"""
         if self.access_key_id and self.access_key_secret:
@@ -171,35 +175,50 @@ class TTSProvider(TTSProviderBase):
             return False
         return time.time() > self.expire_time
 
-    async def _ensure_connection(self):
-        """确保WebSocket连接可用"""
+    async def _connect(self):
+        """建立新的WebSocket连接"""
+        if self._is_token_expired():
+            logger.bind(tag=TAG).warning("Token已过期，正在自动刷新...")
+            self._refresh_token()
+        logger.bind(tag=TAG).info("开始建立新连接...")
+        return await websockets.connect(
+            self.ws_url,
+            additional_headers={"X-NLS-Token": self.token},
+            ping_interval=30,
+            ping_timeout=10,
+            close_timeout=10,
+        )
+
+    async def _open_session(self, session_id):
+        """从所有设备共享的上游连接中为本次会话分配一条"""
         try:
-            if self._is_token_expired():
-                logger.bind(tag=TAG).warning("Token已过期，正在自动刷新...")
-                self._refresh_token()
-            current_time = time.time()
-            if self.ws and current_time - self.last_active_time < 10:
-                # 10秒内才可以复用链接进行连续对话
-                logger.bind(tag=TAG).info(f"使用已有链接...")
-                return self.ws
-            logger.bind(tag=TAG).info("开始建立新连接...")
-
-            self.ws = await websockets.connect(
-                self.ws_url,
-                additional_headers={"X-NLS-Token": self.token},
-                ping_interval=30,
-                ping_timeout=10,
-                close_timeout=10,
+            # 音频帧不带task_id，无法区分会话，一条连接同时只能进行一个会话；
+            # 空闲10秒后服务端会断开连接，只在10秒内复用
+            self.session = await tts_ws_mux.open_session(
+                (self.ws_url, self.appkey, self.access_key_id),
+                f"aliyun_stream:{self.appkey}",
+                session_id,
+                self._connect,
+                self._route_message,
+                max_sessions=1,
+                idle_timeout=9,
             )
-            logger.bind(tag=TAG).info("WebSocket连接建立成功")
-            self.last_active_time = time.time()
-            return self.ws
+            return self.session
         except Exception as e:
             logger.bind(tag=TAG).error(f"建立连接失败: {str(e)}")
-            self.ws = None
-            self.last_active_time = None
+            self.session = None
             raise
 
+    @staticmethod
+    def _route_message(msg):
+        """取出控制消息中的task_id，音频帧返回None"""
+        if not isinstance(msg, str):
+            return None
+        try:
+            return json.loads(msg).get("header", {}).get("task_id")
+        except (ValueError, AttributeError):
+            return None
+
     def tts_text_priority_thread(self):
         """流式文本处理线程"""
         while not self.conn.stop_event.is_set():
@@ -262,8 +281,8 @@ class TTSProvider(TTSProviderBase):
                         f"添加音频文件到待播放列表: {message.content_file}"
                     )
                     if message.content_file and os.path.exists(message.content_file):
-                        # 先处理文件音频数据
-                        file_audio = self._process_audio_file(message.content_file)
+                        # 播放时再按进度分批读取文件音频
+                        file_audio = self._open_audio_file(message.content_file)
                         self.before_stop_play_files.append(
                             (file_audio, message.content_detail)
                         )
@@ -289,7 +308,7 @@ class TTSProvider(TTSProviderBase):
 
     async def text_to_speak(self, text, _):
         try:
-            if self.ws is None:
+            if self.session is None:
                 logger.bind(tag=TAG).warning(f"WebSocket连接不存在，终止发送文本")
                 return
             filtered_text = MarkdownCleaner.clean_markdown(text)
@@ -303,18 +322,14 @@ class TTSProvider(TTSProviderBase):
                 },
                 "payload": {"text": filtered_text},
             }
-            await self.ws.send(json.dumps(run_request))
-            self.last_active_time = time.time()
+            await self.session.send(json.dumps(run_request))
             return
 
         except Exception as e:
             logger.bind(tag=TAG).error(f"发送TTS文本失败: {str(e)}")
-            if self.ws:
-                try:
-                    await self.ws.close()
-                except:
-                    pass
-                self.ws = None
+            if self.session:
+                self.session.release(reusable=False)
+                self.session = None
             raise
 
     async def start_session(self, session_id):
@@ -331,8 +346,8 @@ class TTSProvider(TTSProviderBase):
                 )
                 await self.close()
 
-            # 建立新连接
-            await self._ensure_connection()
+            # 分配上游连接
+            await self._open_session(session_id)
 
             # 启动监听任务
             self._monitor_task = asyncio.create_task(self._start_monitor_tts_response())
@@ -355,8 +370,7 @@ class TTSProvider(TTSProviderBase):
                     "enable_subtitle": True,
                 },
             }
-            await self.ws.send(json.dumps(start_request))
-            self.last_active_time = time.time()
+            await self.session.send(json.dumps(start_request))
             logger.bind(tag=TAG).info("会话启动请求已发送")
         except Exception as e:
             logger.bind(tag=TAG).error(f"启动会话失败: {str(e)}")
@@ -367,7 +381,7 @@ class TTSProvider(TTSProviderBase):
     async def finish_session(self, session_id):
         logger.bind(tag=TAG).info(f"关闭会话～～{session_id}")
         try:
-            if self.ws:
+            if self.session:
                 stop_request = {
                     "header": {
                         "message_id": self.message_id,
@@ -377,9 +391,8 @@ class TTSProvider(TTSProviderBase):
                         "appkey": self.appkey,
                     }
                 }
-                await self.ws.send(json.dumps(stop_request))
+                await self.session.send(json.dumps(stop_request))
                 logger.bind(tag=TAG).info("会话结束请求已发送")
-                self.last_active_time = time.time()
                 if self._monitor_task:
                     try:
                         await self._monitor_task
@@ -407,25 +420,23 @@ class TTSProvider(TTSProviderBase):
                 logger.bind(tag=TAG).warning(f"关闭时取消监听任务错误: {e}")
             self._monitor_task = None
 
-        if self.ws:
-            try:
-                await self.ws.close()
-            except:
-                pass
-            self.ws = None
-            self.last_active_time = None
+        if self.session:
+            # 会话未正常结束，连接上可能还有残余消息，不再复用
+            self.session.release(reusable=False)
+            self.session = None
 
     async def _start_monitor_tts_response(self):
         """监听TTS响应"""
         opus_datas_cache = []
         is_first_sentence = True
         first_sentence_segment_count = 0  # 添加计数器
+        session = self.session
+        session_finished = False  # 标记会话是否正常结束
         try:
-            session_finished = False  # 标记会话是否正常结束
             while not self.conn.stop_event.is_set():
                 try:
-                    msg = await self.ws.recv()
-                    self.last_active_time = time.time()
+                    # 只收到属于本会话的消息
+                    msg = await session.recv()
                     # 检查客户端是否中止
                     if self.conn.client_abort:
                         logger.bind(tag=TAG).info("收到打断信息，终止监听TTS响应")
@@ -496,15 +507,11 @@ class TTSProvider(TTSProviderBase):
                         f"处理TTS响应时出错: {e}\n{traceback.format_exc()}"
                     )
                     break
-            # 仅在连接异常时才关闭
-            if not session_finished and self.ws:
-                try:
-                    await self.ws.close()
-                except:
-                    pass
-                self.ws = None
-        # 监听任务退出时清理引用
+        # 监听任务退出时归还连接并清理引用，仅在会话异常结束时才关闭连接
         finally:
+            session.release(reusable=session_finished)
+            if self.session is session:
+                self.session = None
             self._monitor_task = None
 
     def to_tts(self, text: str) -> list:
@@ -1,15 +1,22 @@
 import os
 import re
+import copy
 import queue
 import uuid
 import asyncio
 import threading
+import concurrent.futures
 from core.utils import p3
 from datetime import datetime
 from core.utils import textUtils
 from abc import ABC, abstractmethod
 from config.logger import setup_logging
 from core.utils.util import audio_to_data, audio_bytes_to_data
+from core.utils.async_queue import AudioFrameStream, LoopQueue
+from core.utils.audio_file_stream import AudioFileStream
+from core.utils.audio_codec import StreamTranscoder
+from core.utils.scheduler import run_coroutine_sync
+from core.utils.tts_cache import provider_namespace
 from core.utils.tts import MarkdownCleaner
 from core.utils.output_counter import add_device_output
 from core.handle.reportHandle import enqueue_tts_report
@@ -28,19 +35,24 @@ logger = setup_logging()
 
 
 class TTSProviderBase(ABC):
+    # text_to_speak 是否为真正的异步实现（不包含阻塞调用），可直接在事件循环中执行
+    async_native = False
+
     def __init__(self, config, delete_audio_file):
         self.interface_type = InterfaceType.NON_STREAM
-        self.conn = None
         self.tts_timeout = 10
+        # 非流式接口同时合成的最大分段数，1表示逐句串行合成
+        self.tts_concurrency = 1
+        # 支持流式合成的接口是否边合成边发送
+        self.tts_frame_streaming = True
+        # 服务器共享的TTS音频缓存，命名空间随提供者配置（音色、模型等）变化
+        self.tts_cache = None
+        self.cache_namespace = provider_namespace(self, config)
         self.delete_audio_file = delete_audio_file
         self.audio_file_type = "wav"
         self.output_file = config.get("output_dir", "tmp/")
-        self.tts_text_queue = queue.Queue()
-        self.tts_audio_queue = queue.Queue()
-        self.tts_audio_first_sentence = True
-        self.before_stop_play_files = []
+        self._init_session_state()
 
-        self.tts_text_buff = []
         self.punctuations = (
             "。",
             "？",
@@ -67,10 +79,30 @@ class TTSProviderBase(ABC):
             ";",
             "：",
         )
+
+    def _init_session_state(self):
+        """连接独有的队列与会话状态，子类有自己的会话状态时重写并调用父类方法"""
+        self.conn = None
+        self._synthesis_slots = None
+        self.tts_text_queue = LoopQueue()
+        self.tts_audio_queue = LoopQueue()
+        self.tts_audio_first_sentence = True
+        self.before_stop_play_files = []
+        self.tts_text_buff = []
         self.tts_stop_request = False
         self.processed_chars = 0
         self.is_first_sentence = True
 
+    def fork(self):
+        """为新连接创建会话对象
+
+        构造时解析的配置、鉴权信息与HTTP客户端等与原实例共用，只重新创建连接独有的状态，
+        省去每个连接重新实例化提供者的开销。
+        """
+        session = copy.copy(self)
+        session._init_session_state()
+        return session
+
     def generate_filename(self, extension=".wav"):
         return os.path.join(
             self.output_file,
@@ -81,14 +113,20 @@ class TTSProviderBase(ABC):
         text = MarkdownCleaner.clean_markdown(text)
         max_repeat_time = 5
         if self.delete_audio_file:
-            # 需要删除文件的直接转为音频数据
+            # 需要删除文件的直接转为音频数据，优先使用缓存
+            cache_key = self._cache_key(text, "opus")
+            audio_datas = self.tts_cache.get(cache_key) if cache_key else None
+            if audio_datas:
+                return audio_datas
             while max_repeat_time > 0:
                 try:
-                    audio_bytes = asyncio.run(self.text_to_speak(text, None))
+                    audio_bytes = run_coroutine_sync(self.text_to_speak(text, None))
                     if audio_bytes:
                         audio_datas, _ = audio_bytes_to_data(
                             audio_bytes, file_type=self.audio_file_type, is_opus=True
                         )
+                        if cache_key:
+                            self.tts_cache.put(cache_key, audio_datas)
                         return audio_datas
                     else:
                         max_repeat_time -= 1
@@ -111,7 +149,7 @@ class TTSProviderBase(ABC):
             try:
                 while not os.path.exists(tmp_file) and max_repeat_time > 0:
                     try:
-                        asyncio.run(self.text_to_speak(text, tmp_file))
+                        run_coroutine_sync(self.text_to_speak(text, tmp_file))
                     except Exception as e:
                         logger.bind(tag=TAG).warning(
                             f"语音生成失败{5 - max_repeat_time + 1}次: {text}，错误: {e}"
@@ -135,10 +173,135 @@ class TTSProviderBase(ABC):
                 logger.bind(tag=TAG).error(f"Failed to generate TTS file: {e}")
                 return None
 
+    async def to_tts_async(self, text):
+        """在事件循环中合成语音
+
+        原生异步的接口直接在事件循环中请求，只把音频转码交给线程池；
+        其他接口整体交给共享的tts线程池执行。
+        """
+        if not (self.async_native and self.delete_audio_file):
+            return await self.conn.executor.run("tts", self.to_tts, text)
+
+        text = MarkdownCleaner.clean_markdown(text)
+        cache_key = self._cache_key(text, "opus")
+        audio_datas = self.tts_cache.get(cache_key) if cache_key else None
+        if audio_datas:
+            return audio_datas
+        max_repeat_time = 5
+        for attempt in range(1, max_repeat_time + 1):
+            try:
+                audio_bytes = await self.text_to_speak(text, None)
+                if audio_bytes:
+                    audio_datas, _ = await self.conn.executor.run(
+                        "tts",
+                        audio_bytes_to_data,
+                        audio_bytes,
+                        file_type=self.audio_file_type,
+                        is_opus=True,
+                    )
+                    logger.bind(tag=TAG).info(
+                        f"语音生成成功: {text}，重试{attempt - 1}次"
+                    )
+                    if cache_key:
+                        self.tts_cache.put(cache_key, audio_datas)
+                    return audio_datas
+            except Exception as e:
+                logger.bind(tag=TAG).warning(
+                    f"语音生成失败{attempt}次: {text}，错误: {e}"
+                )
+        logger.bind(tag=TAG).error(f"语音生成失败: {text}，请检查网络或服务是否正常")
+        return None
+
+    def _cache_key(self, text, audio_format):
+        """生成TTS缓存键，未启用缓存或文本不适合缓存时返回None"""
+        if self.tts_cache is None:
+            return None
+        return self.tts_cache.make_key(self.cache_namespace, text, audio_format)
+
     @abstractmethod
     async def text_to_speak(self, text, output_file):
         pass
 
+    async def text_to_speak_stream(self, text):
+        """流式合成，逐块产出 audio_file_type 格式的音频数据
+
+        支持分块返回的接口可重写此方法，首块音频到达即可开始转码和发送；
+        默认一次性产出完整音频。
+        """
+        audio_bytes = await self.text_to_speak(text, None)
+        if audio_bytes:
+            yield audio_bytes
+
+    @property
+    def frame_streaming(self):
+        """是否边合成边发送：接口重写了流式合成且不需要生成音频文件"""
+        return (
+            self.tts_frame_streaming
+            and self.delete_audio_file
+            and type(self).text_to_speak_stream
+            is not TTSProviderBase.text_to_speak_stream
+        )
+
+    async def _fill_stream(self, text, stream):
+        """流式合成并逐块转码，音频帧一产出就写入stream"""
+        text = MarkdownCleaner.clean_markdown(text)
+        cache_key = self._cache_key(text, "opus")
+        audio_datas = self.tts_cache.get(cache_key) if cache_key else None
+        if audio_datas:
+            stream.put(audio_datas)
+            return
+
+        max_repeat_time = 5
+        for attempt in range(1, max_repeat_time + 1):
+            transcoder = StreamTranscoder(
+                self.audio_file_type, getattr(self, "pcm_sample_rate", 16000)
+            )
+            try:
+                async for chunk in self.text_to_speak_stream(text):
+                    if self.conn.client_abort:
+                        return
+                    stream.put(transcoder.feed(chunk))
+                stream.put(transcoder.flush())
+                logger.bind(tag=TAG).info(f"语音生成成功: {text}，重试{attempt - 1}次")
+                if cache_key:
+                    self.tts_cache.put(cache_key, stream.frames)
+                return
+            except Exception as e:
+                logger.bind(tag=TAG).warning(
+                    f"语音生成失败{attempt}次: {text}，错误: {e}"
+                )
+                # 已经发出部分音频时不再重试，避免重复播放
+                if stream.frames:
+                    raise
+            finally:
+                transcoder.close()
+        logger.bind(tag=TAG).error(f"语音生成失败: {text}，请检查网络或服务是否正常")
+
+    def _submit_stream(self, segment_text):
+        """提交流式合成任务，返回音频帧流及任务Future"""
+        stream = AudioFrameStream()
+
+        def on_done(future):
+            # 任务在执行前被取消（如连接关闭）时也要结束音频流，避免发送方一直等待
+            if future.cancelled():
+                stream.finish()
+
+        future = self.conn.executor.submit_to(
+            "tts", self._fill_stream_sync, segment_text, stream
+        )
+        future.add_done_callback(on_done)
+        return stream, future
+
+    def _fill_stream_sync(self, text, stream):
+        """在tts线程池中执行流式合成，结束时关闭stream"""
+        error = None
+        try:
+            run_coroutine_sync(self._fill_stream(text, stream))
+        except Exception as e:
+            error = e
+        finally:
+            stream.finish(error)
+
     def audio_to_pcm_data(self, audio_file_path):
         """音频文件转换为PCM编码"""
         return audio_to_data(audio_file_path, is_opus=False)
@@ -178,17 +341,38 @@ class TTSProviderBase(ABC):
     async def open_audio_channels(self, conn):
         self.conn = conn
         self.tts_timeout = conn.config.get("tts_timeout", 10)
-        # tts 消化线程
-        self.tts_priority_thread = threading.Thread(
-            target=self.tts_text_priority_thread, daemon=True
-        )
-        self.tts_priority_thread.start()
+        self.tts_cache = getattr(getattr(conn, "server", None), "tts_cache", None)
+        tts_concurrency = conn.config.get("tts_concurrency", "1")
+        self.tts_concurrency = max(int(tts_concurrency) if tts_concurrency else 1, 1)
+        self.tts_frame_streaming = bool(conn.config.get("tts_frame_streaming", True))
+        async_pipeline = getattr(conn, "async_pipeline", False)
 
-        # 音频播放 消化线程
-        self.audio_play_priority_thread = threading.Thread(
-            target=self._audio_play_priority_thread, daemon=True
-        )
-        self.audio_play_priority_thread.start()
+        # 重写了文本处理线程的流式接口仍使用独立线程
+        if (
+            async_pipeline
+            and type(self).tts_text_priority_thread
+            is TTSProviderBase.tts_text_priority_thread
+        ):
+            self._synthesis_slots = asyncio.Semaphore(self.tts_concurrency)
+            self.tts_priority_task = asyncio.create_task(self.tts_text_priority_task())
+        else:
+            self._synthesis_slots = threading.BoundedSemaphore(self.tts_concurrency)
+            # tts 消化线程
+            self.tts_priority_thread = threading.Thread(
+                target=self.tts_text_priority_thread, daemon=True
+            )
+            self.tts_priority_thread.start()
+
+        if async_pipeline:
+            self.audio_play_priority_task = asyncio.create_task(
+                self._audio_play_priority_task()
+            )
+        else:
+            # 音频播放 消化线程
+            self.audio_play_priority_thread = threading.Thread(
+                target=self._audio_play_priority_thread, daemon=True
+            )
+            self.audio_play_priority_thread.start()
 
     # 这里默认是非流式的处理方式
     # 流式处理方式请在子类中重写
@@ -212,26 +396,17 @@ class TTSProviderBase(ABC):
                     self.tts_text_buff.append(message.content_detail)
                     segment_text = self._get_segment_text()
                     if segment_text:
-                        if self.delete_audio_file:
-                            audio_datas = self.to_tts(segment_text)
-                            if audio_datas:
-                                self.tts_audio_queue.put(
-                                    (message.sentence_type, audio_datas, segment_text)
-                                )
-                        else:
-                            tts_file = self.to_tts(segment_text)
-                            if tts_file:
-                                audio_datas = self._process_audio_file(tts_file)
-                                self.tts_audio_queue.put(
-                                    (message.sentence_type, audio_datas, segment_text)
-                                )
+                        self._dispatch_segment(message.sentence_type, segment_text)
                 elif ContentType.FILE == message.content_type:
                     self._process_remaining_text()
                     tts_file = message.content_file
                     if tts_file and os.path.exists(tts_file):
-                        audio_datas = self._process_audio_file(tts_file)
                         self.tts_audio_queue.put(
-                            (message.sentence_type, audio_datas, message.content_detail)
+                            (
+                                message.sentence_type,
+                                self._open_audio_file(tts_file),
+                                message.content_detail,
+                            )
                         )
 
                 if message.sentence_type == SentenceType.LAST:
@@ -260,11 +435,21 @@ class TTSProviderBase(ABC):
                     if self.conn.stop_event.is_set():
                         break
                     continue
+                if isinstance(audio_datas, concurrent.futures.Future):
+                    # 并发合成时按入队顺序等待结果，保证播放顺序
+                    audio_datas = audio_datas.result()
+                    if not audio_datas:
+                        continue
                 future = asyncio.run_coroutine_threadsafe(
                     sendAudioMessage(self.conn, sentence_type, audio_datas, text),
                     self.conn.loop,
                 )
                 future.result()
+                if isinstance(audio_datas, AudioFrameStream):
+                    audio_datas = audio_datas.frames
+                elif isinstance(audio_datas, AudioFileStream):
+                    # 本地文件（音乐等）不随上报携带音频
+                    audio_datas = []
                 if self.conn.max_output_size > 0 and text:
                     add_device_output(self.conn.headers.get("device-id"), len(text))
                 enqueue_tts_report(self.conn, text, audio_datas)
@@ -273,12 +458,137 @@ class TTSProviderBase(ABC):
                     f"audio_play_priority priority_thread: {text} {e}"
                 )
 
+    async def tts_text_priority_task(self):
+        """异步模式下的非流式文本处理协程，与 tts_text_priority_thread 逻辑一致"""
+        while not self.conn.stop_event.is_set():
+            try:
+                message = await self.tts_text_queue.get_async()
+                if message.sentence_type == SentenceType.FIRST:
+                    self.conn.client_abort = False
+                if self.conn.client_abort:
+                    logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理协程")
+                    continue
+                if message.sentence_type == SentenceType.FIRST:
+                    # 初始化参数
+                    self.tts_stop_request = False
+                    self.processed_chars = 0
+                    self.tts_text_buff = []
+                    self.is_first_sentence = True
+                    self.tts_audio_first_sentence = True
+                elif ContentType.TEXT == message.content_type:
+                    self.tts_text_buff.append(message.content_detail)
+                    segment_text = self._get_segment_text()
+                    if segment_text:
+                        await self._synthesize_segment(
+                            message.sentence_type, segment_text
+                        )
+                elif ContentType.FILE == message.content_type:
+                    await self._process_remaining_text_async()
+                    tts_file = message.content_file
+                    if tts_file and os.path.exists(tts_file):
+                        self.tts_audio_queue.put(
+                            (
+                                message.sentence_type,
+                                self._open_audio_file(tts_file),
+                                message.content_detail,
+                            )
+                        )
+
+                if message.sentence_type == SentenceType.LAST:
+                    await self._process_remaining_text_async()
+                    self.tts_audio_queue.put(
+                        (message.sentence_type, [], message.content_detail)
+                    )
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.bind(tag=TAG).error(
+                    f"处理TTS文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
+                )
+
+    async def _synthesize_async(self, segment_text):
+        """异步模式下合成一个分段，返回音频数据"""
+        if self.delete_audio_file:
+            return await self.to_tts_async(segment_text)
+        return await self.conn.executor.run("tts", self._synthesize, segment_text)
+
+    async def _synthesize_segment(self, sentence_type, segment_text):
+        if self.frame_streaming:
+            # 合成与转码在tts线程池中进行，音频帧流立即入队，首帧产出即可开始发送
+            await self._synthesis_slots.acquire()
+            stream, future = self._submit_stream(segment_text)
+            asyncio.wrap_future(future).add_done_callback(
+                lambda _: self._synthesis_slots.release()
+            )
+            self.tts_audio_queue.put((sentence_type, stream, segment_text))
+            return
+
+        if self.tts_concurrency <= 1:
+            audio_datas = await self._synthesize_async(segment_text)
+            if audio_datas:
+                self.tts_audio_queue.put((sentence_type, audio_datas, segment_text))
+            return
+
+        # 占用一个合成名额后立即返回，结果以Task形式按顺序入队
+        await self._synthesis_slots.acquire()
+        task = asyncio.create_task(self._synthesize_async(segment_text))
+        task.add_done_callback(lambda _: self._synthesis_slots.release())
+        self.tts_audio_queue.put((sentence_type, task, segment_text))
+
+    async def _process_remaining_text_async(self):
+        """异步模式下处理剩余的文本并生成语音"""
+        full_text = "".join(self.tts_text_buff)
+        remaining_text = full_text[self.processed_chars :]
+        if remaining_text:
+            segment_text = textUtils.get_string_no_punctuation_or_emoji(remaining_text)
+            if segment_text:
+                await self._synthesize_segment(SentenceType.MIDDLE, segment_text)
+                self.processed_chars += len(full_text)
+                return True
+        return False
+
+    async def _audio_play_priority_task(self):
+        """异步模式下的音频发送协程，直接在事件循环中发送，无需线程切换"""
+        while not self.conn.stop_event.is_set():
+            text = None
+            try:
+                sentence_type, audio_datas, text = (
+                    await self.tts_audio_queue.get_async()
+                )
+                if isinstance(audio_datas, asyncio.Future):
+                    # 并发合成时按入队顺序等待结果，保证播放顺序
+                    task = audio_datas
+                    await asyncio.wait((task,))
+                    if task.cancelled() or task.exception() or not task.result():
+                        continue
+                    audio_datas = task.result()
+                await sendAudioMessage(self.conn, sentence_type, audio_datas, text)
+                if isinstance(audio_datas, AudioFrameStream):
+                    audio_datas = audio_datas.frames
+                elif isinstance(audio_datas, AudioFileStream):
+                    # 本地文件（音乐等）不随上报携带音频
+                    audio_datas = []
+                if self.conn.max_output_size > 0 and text:
+                    add_device_output(self.conn.headers.get("device-id"), len(text))
+                enqueue_tts_report(self.conn, text, audio_datas)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"audio_play_priority task: {text} {e}")
+
     async def start_session(self, session_id):
         pass
 
     async def finish_session(self, session_id):
         pass
 
+    def cancel_tasks(self):
+        """连接关闭时取消异步模式下的消费协程"""
+        for name in ("tts_priority_task", "audio_play_priority_task"):
+            task = getattr(self, name, None)
+            if task and not task.done():
+                task.cancel()
+
     async def close(self):
         """资源清理方法"""
         if hasattr(self, "ws") and self.ws:
@@ -323,6 +633,12 @@ class TTSProviderBase(ABC):
         else:
             return None
 
+    def _open_audio_file(self, tts_file):
+        """打开本地音频文件的帧流，播放时按进度分批读取转码，不整体载入内存"""
+        return AudioFileStream(
+            self.conn.executor, tts_file, is_opus=self.conn.audio_format != "pcm"
+        )
+
     def _process_audio_file(self, tts_file):
         """处理音频文件并转换为指定格式
 
@@ -349,6 +665,50 @@ class TTSProviderBase(ABC):
             os.remove(tts_file)
         return audio_datas
 
+    def _synthesize(self, segment_text):
+        """合成一个分段并返回音频数据，失败时返回None"""
+        if self.delete_audio_file:
+            return self.to_tts(segment_text)
+        # 生成文件的接口在转换为连接所需格式后再缓存
+        cache_key = self._cache_key(
+            MarkdownCleaner.clean_markdown(segment_text), self.conn.audio_format
+        )
+        audio_datas = self.tts_cache.get(cache_key) if cache_key else None
+        if audio_datas:
+            return audio_datas
+        tts_file = self.to_tts(segment_text)
+        if not tts_file:
+            return None
+        audio_datas = self._process_audio_file(tts_file)
+        if cache_key:
+            self.tts_cache.put(cache_key, audio_datas)
+        return audio_datas
+
+    def _dispatch_segment(self, sentence_type, segment_text):
+        """合成分段并放入音频队列
+
+        tts_concurrency大于1时，分段提交到共享的tts线程池并发合成，
+        音频队列中按文本顺序放入Future，由播放线程依次等待结果。
+        接口支持流式合成时，音频队列中放入AudioFrameStream，边合成边发送。
+        """
+        if self.frame_streaming:
+            self._synthesis_slots.acquire()
+            stream, future = self._submit_stream(segment_text)
+            future.add_done_callback(lambda _: self._synthesis_slots.release())
+            self.tts_audio_queue.put((sentence_type, stream, segment_text))
+            return
+
+        if self.tts_concurrency <= 1:
+            audio_datas = self._synthesize(segment_text)
+            if audio_datas:
+                self.tts_audio_queue.put((sentence_type, audio_datas, segment_text))
+            return
+
+        self._synthesis_slots.acquire()
+        future = self.conn.executor.submit_to("tts", self._synthesize, segment_text)
+        future.add_done_callback(lambda _: self._synthesis_slots.release())
+        self.tts_audio_queue.put((sentence_type, future, segment_text))
+
     def _process_before_stop_play_files(self):
         for audio_datas, text in self.before_stop_play_files:
             self.tts_audio_queue.put((SentenceType.MIDDLE, audio_datas, text))
@@ -366,18 +726,7 @@ class TTSProviderBase(ABC):
         if remaining_text:
             segment_text = textUtils.get_string_no_punctuation_or_emoji(remaining_text)
             if segment_text:
-                if self.delete_audio_file:
-                    audio_datas = self.to_tts(segment_text)
-                    if audio_datas:
-                        self.tts_audio_queue.put(
-                            (SentenceType.MIDDLE, audio_datas, segment_text)
-                        )
-                else:
-                    tts_file = self.to_tts(segment_text)
-                    audio_datas = self._process_audio_file(tts_file)
-                    self.tts_audio_queue.put(
-                        (SentenceType.MIDDLE, audio_datas, segment_text)
-                    )
+                self._dispatch_segment(SentenceType.MIDDLE, segment_text)
                 self.processed_chars += len(full_text)
                 return True
         return False
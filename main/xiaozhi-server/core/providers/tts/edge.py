@@ -6,6 +6,9 @@ from core.providers.tts.base import TTSProviderBase
 
 
 class TTSProvider(TTSProviderBase):
+    # edge_tts 为纯异步实现，可直接在事件循环中执行
+    async_native = True
+
     def __init__(self, config, delete_audio_file):
         super().__init__(config, delete_audio_file)
         if config.get("private_voice"):
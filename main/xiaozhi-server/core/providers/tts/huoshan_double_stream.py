@@ -10,6 +10,7 @@ from config.logger import setup_logging
 from core.utils import opus_encoder_utils
 from core.utils.util import check_model_key
 from core.providers.tts.base import TTSProviderBase
+from core.providers.tts.ws_mux import tts_ws_mux
 from core.providers.tts.dto.dto import SentenceType, ContentType, InterfaceType
 from asyncio import Task
 
@@ -141,9 +142,7 @@ class Response:
 class TTSProvider(TTSProviderBase):
     def __init__(self, config, delete_audio_file):
         super().__init__(config, delete_audio_file)
-        self.ws = None
         self.interface_type = InterfaceType.DUAL_STREAM
-        self._monitor_task = None  # 监听任务引用
         self.appId = config.get("appid")
         self.access_token = config.get("access_token")
         self.cluster = config.get("cluster")
@@ -155,46 +154,80 @@ class TTSProvider(TTSProviderBase):
         self.ws_url = config.get("ws_url")
         self.authorization = config.get("authorization")
         self.header = {"Authorization": f"{self.authorization}{self.access_token}"}
+        # 一条上游连接上同时进行的会话数上限
+        max_sessions = config.get("max_sessions_per_connection")
+        self.max_sessions_per_connection = int(max_sessions) if max_sessions else 1
         self.enable_two_way = True
+        model_key_msg = check_model_key("TTS", self.access_token)
+        if model_key_msg:
+            logger.bind(tag=TAG).error(model_key_msg)
+
+    def _init_session_state(self):
+        super()._init_session_state()
+        # 当前TTS会话占用的共享上游连接
+        self.session = None
+        self._monitor_task = None  # 监听任务引用
         self.tts_text = ""
         self.opus_encoder = opus_encoder_utils.OpusEncoderUtils(
             sample_rate=16000, channels=1, frame_size_ms=60
         )
-        model_key_msg = check_model_key("TTS", self.access_token)
-        if model_key_msg:
-            logger.bind(tag=TAG).error(model_key_msg)
 
     async def open_audio_channels(self, conn):
         try:
             await super().open_audio_channels(conn)
         except Exception as e:
             logger.bind(tag=TAG).error(f"Failed to open audio channels: {str(e)}")
-            self.ws = None
+            self.session = None
             raise
 
-    async def _ensure_connection(self):
+    async def _connect(self):
         """建立新的WebSocket连接"""
+        logger.bind(tag=TAG).info("开始建立新连接...")
+        ws_header = {
+            "X-Api-App-Key": self.appId,
+            "X-Api-Access-Key": self.access_token,
+            "X-Api-Resource-Id": self.resource_id,
+            "X-Api-Connect-Id": uuid.uuid4(),
+        }
+        return await websockets.connect(
+            self.ws_url, additional_headers=ws_header, max_size=1000000000
+        )
+
+    async def _open_session(self, session_id):
+        """从所有设备共享的上游连接中为本次会话分配一条"""
         try:
-            if self.ws:
-                logger.bind(tag=TAG).info(f"使用已有链接...")
-                return self.ws
-            logger.bind(tag=TAG).info("开始建立新连接...")
-            ws_header = {
-                "X-Api-App-Key": self.appId,
-                "X-Api-Access-Key": self.access_token,
-                "X-Api-Resource-Id": self.resource_id,
-                "X-Api-Connect-Id": uuid.uuid4(),
-            }
-            self.ws = await websockets.connect(
-                self.ws_url, additional_headers=ws_header, max_size=1000000000
+            self.session = await tts_ws_mux.open_session(
+                (self.ws_url, self.appId, self.access_token, self.resource_id),
+                f"huoshan_double_stream:{self.appId}",
+                session_id,
+                self._connect,
+                self._route_message,
+                max_sessions=self.max_sessions_per_connection,
             )
-            logger.bind(tag=TAG).info("WebSocket连接建立成功")
-            return self.ws
+            return self.session
         except Exception as e:
             logger.bind(tag=TAG).error(f"建立连接失败: {str(e)}")
-            self.ws = None
+            self.session = None
             raise
 
+    @staticmethod
+    def _route_message(msg):
+        """取出服务端消息中的会话ID，连接级事件返回None"""
+        if isinstance(msg, str) or len(msg) < 12:
+            return None
+        message_type = (msg[1] >> 4) & 0x0F
+        flags = msg[1] & 0x0F
+        if (
+            message_type not in (FULL_SERVER_RESPONSE, AUDIO_ONLY_RESPONSE)
+            or flags != MsgTypeFlagWithEvent
+        ):
+            return None
+        event = int.from_bytes(msg[4:8], "big", signed=True)
+        if event in (EVENT_NONE, EVENT_ConnectionStarted, EVENT_ConnectionFailed):
+            return None
+        size = int.from_bytes(msg[8:12], "big", signed=True)
+        return msg[12 : 12 + size].decode("utf-8", errors="ignore")
+
     def tts_text_priority_thread(self):
         """火山引擎双流式TTS的文本处理线程"""
         while not self.conn.stop_event.is_set():
@@ -259,8 +292,8 @@ class TTSProvider(TTSProviderBase):
                         f"添加音频文件到待播放列表: {message.content_file}"
                     )
                     if message.content_file and os.path.exists(message.content_file):
-                        # 先处理文件音频数据
-                        file_audio = self._process_audio_file(message.content_file)
+                        # 播放时再按进度分批读取文件音频
+                        file_audio = self._open_audio_file(message.content_file)
                         self.before_stop_play_files.append(
                             (file_audio, message.content_detail)
                         )
@@ -288,8 +321,7 @@ class TTSProvider(TTSProviderBase):
     async def text_to_speak(self, text, _):
         """发送文本到TTS服务"""
         try:
-            # 建立新连接
-            if self.ws is None:
+            if self.session is None:
                 logger.bind(tag=TAG).warning(f"WebSocket连接不存在，终止发送文本")
                 return
 
@@ -301,12 +333,9 @@ class TTSProvider(TTSProviderBase):
             return
         except Exception as e:
             logger.bind(tag=TAG).error(f"发送TTS文本失败: {str(e)}")
-            if self.ws:
-                try:
-                    await self.ws.close()
-                except:
-                    pass
-                self.ws = None
+            if self.session:
+                self.session.release(reusable=False)
+                self.session = None
             raise
 
     async def start_session(self, session_id):
@@ -321,8 +350,8 @@ class TTSProvider(TTSProviderBase):
                 logger.bind(tag=TAG).info("检测到未完成的上个会话，关闭监听任务和连接...")
                 await self.close()
 
-            # 建立新连接
-            await self._ensure_connection()
+            # 分配上游连接
+            await self._open_session(session_id)
 
             # 启动监听任务
             self._monitor_task = asyncio.create_task(self._start_monitor_tts_response())
@@ -338,7 +367,7 @@ class TTSProvider(TTSProviderBase):
             payload = self.get_payload_bytes(
                 event=EVENT_StartSession, speaker=self.voice
             )
-            await self.send_event(self.ws, header, optional, payload)
+            await self.send_event(self.session, header, optional, payload)
             logger.bind(tag=TAG).info("会话启动请求已发送")
         except Exception as e:
             logger.bind(tag=TAG).error(f"启动会话失败: {str(e)}")
@@ -349,7 +378,7 @@ class TTSProvider(TTSProviderBase):
     async def finish_session(self, session_id):
         logger.bind(tag=TAG).info(f"关闭会话～～{session_id}")
         try:
-            if self.ws:
+            if self.session:
                 header = Header(
                     message_type=FULL_CLIENT_REQUEST,
                     message_type_specific_flags=MsgTypeFlagWithEvent,
@@ -359,7 +388,7 @@ class TTSProvider(TTSProviderBase):
                     event=EVENT_FinishSession, sessionId=session_id
                 ).as_bytes()
                 payload = str.encode("{}")
-                await self.send_event(self.ws, header, optional, payload)
+                await self.send_event(self.session, header, optional, payload)
                 logger.bind(tag=TAG).info("会话结束请求已发送")
 
                 # 等待监听任务完成
@@ -382,7 +411,7 @@ class TTSProvider(TTSProviderBase):
     async def cancel_session(self,session_id):
         logger.bind(tag=TAG).info(f"取消会话，释放服务端资源～～{session_id}")
         try:
-            if self.ws:
+            if self.session:
                 header = Header(
                     message_type=FULL_CLIENT_REQUEST,
                     message_type_specific_flags=MsgTypeFlagWithEvent,
@@ -392,7 +421,7 @@ class TTSProvider(TTSProviderBase):
                     event=EVENT_CancelSession, sessionId=session_id
                 ).as_bytes()
                 payload = str.encode("{}")
-                await self.send_event(self.ws, header, optional, payload)
+                await self.send_event(self.session, header, optional, payload)
                 logger.bind(tag=TAG).info("会话取消请求已发送")
         except Exception as e:
             logger.bind(tag=TAG).error(f"取消会话失败: {str(e)}")
@@ -413,24 +442,23 @@ class TTSProvider(TTSProviderBase):
                 logger.bind(tag=TAG).warning(f"关闭时取消监听任务错误: {e}")
             self._monitor_task = None
 
-        if self.ws:
-            try:
-                await self.ws.close()
-            except:
-                pass
-            self.ws = None
+        if self.session:
+            # 会话未正常结束，连接上可能还有残余消息，不再复用
+            self.session.release(reusable=False)
+            self.session = None
 
     async def _start_monitor_tts_response(self):
         """监听TTS响应"""
         opus_datas_cache = []
         is_first_sentence = True
         first_sentence_segment_count = 0  # 添加计数器
+        session = self.session
+        session_finished = False  # 标记会话是否正常结束
         try:
-            session_finished = False  # 标记会话是否正常结束
             while not self.conn.stop_event.is_set():
                 try:
-                    # 确保 `recv()` 运行在同一个 event loop
-                    msg = await self.ws.recv()
+                    # 只收到属于本会话的消息
+                    msg = await session.recv()
                     res = self.parser_response(msg)
                     self.print_response(res, "send_text res:")
 
@@ -490,15 +518,11 @@ class TTSProvider(TTSProviderBase):
                     )
                     traceback.print_exc()
                     break
-            # 仅在连接异常时才关闭
-            if not session_finished and self.ws:
-                try:
-                    await self.ws.close()
-                except:
-                    pass
-                self.ws = None
-        # 监听任务退出时清理引用
+        # 监听任务退出时归还连接并清理引用，仅在会话异常结束时才关闭连接
         finally:
+            session.release(reusable=session_finished)
+            if self.session is session:
+                self.session = None
             self._monitor_task = None
 
     async def send_event(
@@ -531,7 +555,7 @@ class TTSProvider(TTSProviderBase):
         payload = self.get_payload_bytes(
             event=EVENT_TaskRequest, text=text, speaker=speaker
         )
-        return await self.send_event(self.ws, header, optional, payload)
+        return await self.send_event(self.session, header, optional, payload)
 
     # 读取 res 数组某段 字符串内容
     def read_res_content(self, res: bytes, offset: int):
@@ -609,7 +633,7 @@ class TTSProvider(TTSProviderBase):
         ).as_bytes()
         optional = Optional(event=EVENT_Start_Connection).as_bytes()
         payload = str.encode("{}")
-        return await self.send_event(self.ws, header, optional, payload)
+        return await self.send_event(self.session, header, optional, payload)
 
     def print_response(self, res, tag_msg: str):
         logger.bind(tag=TAG).debug(f"===>{tag_msg} header:{res.header.__dict__}")
@@ -23,7 +23,9 @@ class TTSProvider(TTSProviderBase):
         self.voice = config.get("voice")
         self.api_url = config.get("api_url")
         self.audio_format = "pcm"
-        self.before_stop_play_files = []
+
+    def _init_session_state(self):
+        super()._init_session_state()
         self.segment_count = 0  # 添加片段计数器
 
         # 创建Opus编码器
@@ -64,8 +66,8 @@ class TTSProvider(TTSProviderBase):
                         f"添加音频文件到待播放列表: {message.content_file}"
                     )
                     if message.content_file and os.path.exists(message.content_file):
-                        # 先处理文件音频数据
-                        file_audio = self._process_audio_file(message.content_file)
+                        # 播放时再按进度分批读取文件音频
+                        file_audio = self._open_audio_file(message.content_file)
                         self.before_stop_play_files.append(
                             (file_audio, message.content_detail)
                         )
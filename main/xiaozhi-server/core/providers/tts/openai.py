@@ -29,7 +29,7 @@ class TTSProvider(TTSProviderBase):
         if model_key_msg:
             logger.bind(tag=TAG).error(model_key_msg)
 
-    async def text_to_speak(self, text, output_file):
+    def _request(self, text, stream=False):
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -41,7 +41,10 @@ class TTSProvider(TTSProviderBase):
             "response_format": "wav",
             "speed": self.speed,
         }
-        response = requests.post(self.api_url, json=data, headers=headers)
+        return requests.post(self.api_url, json=data, headers=headers, stream=stream)
+
+    async def text_to_speak(self, text, output_file):
+        response = self._request(text)
         if response.status_code == 200:
             if output_file:
                 with open(output_file, "wb") as audio_file:
@@ -52,3 +55,14 @@ class TTSProvider(TTSProviderBase):
             raise Exception(
                 f"OpenAI TTS请求失败: {response.status_code} - {response.text}"
             )
+
+    async def text_to_speak_stream(self, text):
+        # 分块读取wav响应，收到wav头和第一块数据即可开始转码
+        with self._request(text, stream=True) as response:
+            if response.status_code != 200:
+                raise Exception(
+                    f"OpenAI TTS请求失败: {response.status_code} - {response.text}"
+                )
+            for chunk in response.iter_content(chunk_size=4096):
+                if chunk:
+                    yield chunk
@@ -0,0 +1,283 @@
+"""
+双流式TTS上游WebSocket连接复用
+
+双流式TTS原先每个设备连接各自保持一条到云端的WebSocket连接。这里改为全服务共享：
+- 每个上游服务（地址+鉴权信息）维护少量连接，会话结束后连接留给下一个会话（可以是其他设备）使用
+- 每条连接上由一个读取任务接收消息，按会话ID分发到各会话自己的队列
+- 每个上游服务的连接数有上限，达到上限且没有空闲会话位置时，新会话排队等待
+- 没有会话的连接超过空闲时间后关闭
+"""
+
+import asyncio
+import weakref
+from collections import deque
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from websockets.protocol import State
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# route(message) 返回消息所属的会话ID，无法判断时返回None
+RouteFunc = Callable[[object], Optional[str]]
+
+
+class MuxSession:
+    """一次TTS会话占用的上游连接，接口与WebSocket连接的send/recv相同"""
+
+    def __init__(self, channel: "UpstreamChannel", session_id: str):
+        self.channel = channel
+        self.session_id = session_id
+        self._queue = asyncio.Queue()
+        self.released = False
+
+    async def send(self, message) -> None:
+        await self.channel.ws.send(message)
+
+    async def recv(self):
+        """读取属于本会话的下一条消息，连接断开时抛出连接的异常"""
+        message = await self._queue.get()
+        if isinstance(message, BaseException):
+            raise message
+        return message
+
+    def release(self, reusable: bool = True) -> None:
+        """会话结束，归还连接
+
+        reusable 为False表示会话未正常结束（被打断、出错），服务端可能还会发来本会话的残余消息，
+        此时连接不再接受新会话，其上的会话全部结束后关闭。
+        """
+        if self.released:
+            return
+        self.released = True
+        self.channel.detach(self, reusable)
+
+
+class UpstreamChannel:
+    """一条上游连接及其上正在进行的会话"""
+
+    def __init__(self, mux: "SessionMux", ws, route: RouteFunc):
+        self.mux = mux
+        self.ws = ws
+        self.route = route
+        self.sessions: Dict[str, MuxSession] = {}
+        self.reusable = True
+        self._idle_handle = None
+        self._reader = asyncio.create_task(self._read())
+
+    @property
+    def available(self) -> bool:
+        return (
+            self.reusable
+            and self.ws.state is State.OPEN
+            and len(self.sessions) < self.mux.max_sessions
+        )
+
+    def attach(self, session_id: str) -> MuxSession:
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        session = MuxSession(self, session_id)
+        self.sessions[session_id] = session
+        return session
+
+    def detach(self, session: MuxSession, reusable: bool) -> None:
+        if self.sessions.get(session.session_id) is session:
+            del self.sessions[session.session_id]
+        if not reusable:
+            self.reusable = False
+        if self.sessions:
+            return
+        if not self.reusable:
+            self.close()
+        else:
+            self._idle_handle = asyncio.get_running_loop().call_later(
+                self.mux.idle_timeout, self.close
+            )
+        self.mux.wake()
+
+    def close(self) -> None:
+        self.reusable = False
+        asyncio.ensure_future(self._close())
+
+    async def _close(self) -> None:
+        try:
+            await asyncio.wait_for(self.ws.close(), timeout=2)
+        except Exception:
+            pass
+
+    async def _read(self) -> None:
+        error: BaseException = ConnectionError("上游连接已关闭")
+        try:
+            while True:
+                self._dispatch(await self.ws.recv())
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            error = e
+        finally:
+            self.reusable = False
+            if self._idle_handle is not None:
+                self._idle_handle.cancel()
+            for session in list(self.sessions.values()):
+                session._queue.put_nowait(error)
+            self.sessions.clear()
+            self.mux.remove(self)
+
+    def _dispatch(self, message) -> None:
+        session_id = self.route(message)
+        if session_id is not None:
+            session = self.sessions.get(session_id)
+        elif len(self.sessions) == 1:
+            # 不带会话ID的消息（如音频帧）只有一个会话时归属于它
+            session = next(iter(self.sessions.values()))
+        else:
+            session = None
+        if session is None:
+            # 已结束会话的残余消息
+            self.mux.stats["dropped"] += 1
+            return
+        session._queue.put_nowait(message)
+
+
+class SessionMux:
+    """单个上游服务的连接集合"""
+
+    def __init__(self, registry: "WebSocketMux", name: str, max_sessions: int):
+        self.registry = registry
+        self.name = name
+        self.max_sessions = max(int(max_sessions), 1)
+        self.idle_timeout = registry.idle_timeout
+        self._channels = []
+        self._connecting = 0
+        self._waiters = deque()
+        self.stats = {"connected": 0, "reused": 0, "waited": 0, "dropped": 0}
+
+    async def open_session(
+        self,
+        session_id: str,
+        connect: Callable[[], Awaitable],
+        route: RouteFunc,
+    ) -> MuxSession:
+        """为会话分配一条上游连接，没有可用连接时新建，达到连接上限时排队等待"""
+        while True:
+            channel = next((c for c in self._channels if c.available), None)
+            if channel is not None:
+                self.stats["reused"] += 1
+                return channel.attach(session_id)
+            max_connections = self.registry.max_connections
+            opened = len(self._channels) + self._connecting
+            if not max_connections or opened < max_connections:
+                break
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self.stats["waited"] += 1
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        self._connecting += 1
+        try:
+            ws = await connect()
+        except Exception:
+            self.wake()
+            raise
+        finally:
+            self._connecting -= 1
+        channel = UpstreamChannel(self, ws, route)
+        self._channels.append(channel)
+        self.stats["connected"] += 1
+        logger.bind(tag=TAG).debug(
+            f"新建TTS上游连接: {self.name}, 当前连接数: {len(self._channels)}"
+        )
+        return channel.attach(session_id)
+
+    def remove(self, channel: UpstreamChannel) -> None:
+        if channel in self._channels:
+            self._channels.remove(channel)
+        self.wake()
+
+    def wake(self) -> None:
+        """连接或会话位置释放后，唤醒排队的会话重新检查"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def get_stats(self) -> dict:
+        return dict(
+            self.stats,
+            upstream=self.name,
+            connections=len(self._channels),
+            sessions=sum(len(c.sessions) for c in self._channels),
+            waiting=len(self._waiters),
+        )
+
+
+class WebSocketMux:
+    """所有双流式TTS实例共享的上游连接，由WebSocketServer在启动时配置"""
+
+    def __init__(self):
+        self.configure({})
+        # 连接与事件循环绑定，每个事件循环一组
+        self._muxes = weakref.WeakKeyDictionary()
+
+    def configure(self, config: Optional[dict]) -> None:
+        config = config or {}
+        enabled = config.get("enabled", True)
+        max_connections = config.get("max_connections")
+        idle_timeout = config.get("idle_timeout")
+        self.enabled = enabled not in (False, "false", "False", "0", 0)
+        self.max_connections = int(max_connections) if max_connections else 0
+        self.idle_timeout = float(idle_timeout) if idle_timeout else 30
+
+    async def open_session(
+        self,
+        key: Hashable,
+        name: str,
+        session_id: str,
+        connect: Callable[[], Awaitable],
+        route: RouteFunc,
+        max_sessions: int = 1,
+        idle_timeout: Optional[float] = None,
+    ) -> MuxSession:
+        """打开一次TTS会话
+
+        key 区分上游服务，应包含地址与鉴权信息；name 仅用于日志与运行指标，不要包含密钥。
+        connect 无参数，返回新建并完成鉴权的WebSocket连接；route 从收到的消息中取出会话ID。
+        max_sessions 为一条连接上同时进行的会话数上限，取决于上游服务是否支持并发会话；
+        idle_timeout 为空闲连接的保留时间，服务端会主动断开空闲连接时应设置得比它短。
+        """
+        loop = asyncio.get_running_loop()
+        muxes: Dict[Hashable, SessionMux] = self._muxes.setdefault(loop, {})
+        mux = muxes.get(key)
+        if mux is None:
+            mux = SessionMux(self, name, max_sessions)
+            muxes[key] = mux
+        if idle_timeout:
+            mux.idle_timeout = min(float(idle_timeout), self.idle_timeout)
+        if not self.enabled:
+            # 不复用：每个会话独占一条新连接，会话结束即关闭
+            ws = await connect()
+            channel = UpstreamChannel(mux, ws, route)
+            channel.reusable = False
+            return channel.attach(session_id)
+        return await mux.open_session(session_id, connect, route)
+
+    def get_stats(self) -> dict:
+        muxes = [
+            mux
+            for loop_muxes in list(self._muxes.values())
+            for mux in list(loop_muxes.values())
+        ]
+        return {
+            "enabled": self.enabled,
+            "upstreams": [mux.get_stats() for mux in muxes],
+        }
+
+
+# 全局双流式TTS上游连接复用实例
+tts_ws_mux = WebSocketMux()
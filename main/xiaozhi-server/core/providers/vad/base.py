@@ -1,9 +1,39 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Optional, Dict, Any
+from core.utils.worker_pool import OrderedWorkerPool
 
 
 class VADProviderBase(ABC):
+    # VAD卸载线程池，由子类在初始化时创建；为空时在调用方线程中直接执行
+    worker_pool: Optional[OrderedWorkerPool] = None
+
+    def init_worker_pool(self, config: dict):
+        """根据配置创建VAD卸载线程池"""
+        workers = config.get("offload_workers", "4")
+        queue_size = config.get("offload_queue_size", "256")
+        self.worker_pool = OrderedWorkerPool(
+            "vad",
+            int(workers) if workers else 4,
+            int(queue_size) if queue_size else 256,
+        )
+
     @abstractmethod
     def is_vad(self, conn, data) -> bool:
         """检测音频数据中的语音活动"""
         pass
+
+    async def is_vad_async(self, conn, data) -> bool:
+        """异步检测语音活动，默认在卸载线程池中执行同步实现，不占用事件循环"""
+        if self.worker_pool is None:
+            return self.is_vad(conn, data)
+        return await self.worker_pool.run(conn.session_id, self.is_vad, conn, data)
+
+    def release(self, conn) -> None:
+        """释放连接独占的VAD状态"""
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各处理阶段的队列深度等指标"""
+        if self.worker_pool is None:
+            return {}
+        return {"offload": self.worker_pool.get_stats()}
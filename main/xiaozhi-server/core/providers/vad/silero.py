@@ -1,13 +1,141 @@
 import time
+import queue
+import asyncio
+import threading
+import concurrent.futures
+from collections import deque
 import numpy as np
 import torch
 import opuslib_next
 from config.logger import setup_logging
+from core.utils.audio_buffer import PCMRingBuffer
 from core.providers.vad.base import VADProviderBase
 
 TAG = __name__
 logger = setup_logging()
 
+SAMPLE_RATE = 16000
+# Silero 16k模型每次输入512个采样点（32ms）
+CHUNK_SAMPLES = 512
+# Silero v5 在每个块前拼接的上下文采样点数
+CONTEXT_SAMPLES = 64
+
+
+class SileroSession:
+    """每个连接独享的Opus解码器、PCM缓冲区与模型RNN状态，避免多设备之间状态串扰
+
+    解码器与缓冲区只在该连接固定的VAD工作线程中访问。
+    """
+
+    def __init__(self):
+        self.decoder = opuslib_next.Decoder(SAMPLE_RATE, 1)
+        # 预分配1秒16kHz/16bit的PCM环形缓冲区
+        self.audio_buffer = PCMRingBuffer(SAMPLE_RATE * 2)
+        # 已处理的连接重置序号，与conn.vad_reset_seq不一致时清空缓冲区
+        self.reset_seq = 0
+        self.state = torch.zeros((2, 1, 128), dtype=torch.float32)
+        self.context = torch.zeros((1, CONTEXT_SAMPLES), dtype=torch.float32)
+
+
+class SileroBatchEngine:
+    """跨连接的批量推理引擎
+
+    每个tick收集所有连接待检测的音频块，拼接为一个批次做一次前向计算。
+    同一个连接在一个批次内最多只有一个音频块，其余顺延到下一个tick，保证RNN状态按序更新。
+    """
+
+    def __init__(self, model, interval_ms: int, max_batch_size: int):
+        self.model = model
+        self.interval = max(interval_ms, 0) / 1000.0
+        self.max_batch_size = max(max_batch_size, 1)
+        self._queue = queue.Queue()
+        self._deferred = deque()
+        self._model_lock = threading.Lock()
+        self._batches = 0
+        self._batched_chunks = 0
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="silero-vad-batch"
+        )
+        self._thread.start()
+
+    def submit(self, session: SileroSession, chunk: np.ndarray):
+        """提交一个音频块，返回可等待的Future，结果为语音概率"""
+        future = concurrent.futures.Future()
+        self._queue.put((session, chunk, future))
+        return future
+
+    def infer(self, sessions, chunks):
+        """对一批(连接状态, 音频块)执行一次前向计算，返回每个块的语音概率"""
+        batch_size = len(sessions)
+        audio_tensor = torch.from_numpy(np.stack(chunks))
+        with self._model_lock:
+            # 将各连接的状态按批次维度拼接后注入模型，推理后再拆分回各连接
+            self.model._state = torch.cat([s.state for s in sessions], dim=1)
+            self.model._context = torch.cat([s.context for s in sessions], dim=0)
+            self.model._last_sr = SAMPLE_RATE
+            self.model._last_batch_size = batch_size
+            with torch.no_grad():
+                speech_probs = self.model(audio_tensor, SAMPLE_RATE)
+            new_state = self.model._state
+            new_context = self.model._context
+
+        for i, session in enumerate(sessions):
+            session.state = new_state[:, i : i + 1, :].clone()
+            session.context = new_context[i : i + 1].clone()
+        self._batches += 1
+        self._batched_chunks += batch_size
+        return speech_probs.view(-1).tolist()
+
+    def get_stats(self):
+        """获取批量推理指标"""
+        return {
+            "queue_depth": self._queue.qsize() + len(self._deferred),
+            "batches": self._batches,
+            "avg_batch_size": (
+                round(self._batched_chunks / self._batches, 2) if self._batches else 0
+            ),
+        }
+
+    def _run(self):
+        while True:
+            try:
+                deferred = self._deferred
+                if not deferred:
+                    deferred.append(self._queue.get())
+
+                # 等待一个tick，收集这段时间内所有连接提交的音频块
+                deadline = time.monotonic() + self.interval
+                while len(deferred) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        if remaining > 0:
+                            deferred.append(self._queue.get(timeout=remaining))
+                        else:
+                            deferred.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                batch, seen, rest = [], set(), deque()
+                for item in deferred:
+                    if len(batch) < self.max_batch_size and id(item[0]) not in seen:
+                        seen.add(id(item[0]))
+                        batch.append(item)
+                    else:
+                        rest.append(item)
+                self._deferred = rest
+
+                try:
+                    probs = self.infer(
+                        [item[0] for item in batch], [item[1] for item in batch]
+                    )
+                    for (_, _, future), prob in zip(batch, probs):
+                        future.set_result(prob)
+                except Exception as e:
+                    for _, _, future in batch:
+                        future.set_exception(e)
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"VAD批量推理线程异常: {e}")
+
 
 class VADProvider(VADProviderBase):
     def __init__(self, config):
@@ -19,12 +147,12 @@ class VADProvider(VADProviderBase):
             force_reload=False,
         )
 
-        self.decoder = opuslib_next.Decoder(16000, 1)
-
         # 处理空字符串的情况
         threshold = config.get("threshold", "0.5")
         threshold_low = config.get("threshold_low", "0.2")
         min_silence_duration_ms = config.get("min_silence_duration_ms", "1000")
+        batch_interval_ms = config.get("batch_interval_ms", "20")
+        max_batch_size = config.get("max_batch_size", "128")
 
         self.vad_threshold = float(threshold) if threshold else 0.5
         self.vad_threshold_low = float(threshold_low) if threshold_low else 0.2
@@ -36,53 +164,112 @@ class VADProvider(VADProviderBase):
         # 至少要多少帧才算有语音
         self.frame_window_threshold = 3
 
+        self.engine = SileroBatchEngine(
+            self.model,
+            int(batch_interval_ms) if batch_interval_ms else 20,
+            int(max_batch_size) if max_batch_size else 128,
+        )
+        # Opus解码与格式转换在卸载线程池中执行，推理交给批量引擎
+        self.init_worker_pool(config)
+
+    def _get_session(self, conn) -> SileroSession:
+        session = getattr(conn, "vad_session", None)
+        if session is None:
+            session = SileroSession()
+            conn.vad_session = session
+        return session
+
+    def release(self, conn):
+        conn.vad_session = None
+
+    def _decode_chunks(self, conn, session, opus_packet):
+        """解码Opus包并切分出所有完整的512采样点音频块"""
+        pcm_frame = session.decoder.decode(opus_packet, 960)
+        audio_buffer = session.audio_buffer
+        reset_seq = conn.vad_reset_seq
+        if session.reset_seq != reset_seq:
+            # 事件循环中的reset_vad_states不直接操作缓冲区，由这里的工作线程清空
+            session.reset_seq = reset_seq
+            audio_buffer.clear()
+        audio_buffer.write(pcm_frame)  # 将新数据加入环形缓冲区
+
+        chunks = []
+        while len(audio_buffer) >= CHUNK_SAMPLES * 2:
+            # 零拷贝读取前512个采样点（1024字节）
+            chunk = audio_buffer.read(CHUNK_SAMPLES * 2)
+
+            # 转换为模型需要的格式，一次性生成float32数组
+            audio_int16 = np.frombuffer(chunk, dtype=np.int16)
+            chunks.append(np.divide(audio_int16, 32768.0, dtype=np.float32))
+        return chunks
+
+    def _update_voice_state(self, conn, speech_probs):
+        """根据每个音频块的语音概率更新连接的语音状态"""
+        client_have_voice = False
+        for speech_prob in speech_probs:
+            # 双阈值判断
+            if speech_prob >= self.vad_threshold:
+                is_voice = True
+            elif speech_prob <= self.vad_threshold_low:
+                is_voice = False
+            else:
+                is_voice = conn.last_is_voice
+
+            # 声音没低于最低值则延续前一个状态，判断为有声音
+            conn.last_is_voice = is_voice
+
+            # 更新滑动窗口
+            conn.client_voice_window.append(is_voice)
+            client_have_voice = (
+                conn.client_voice_window.count(True) >= self.frame_window_threshold
+            )
+
+            # 如果之前有声音，但本次没有声音，且与上次有声音的时间差已经超过了静默阈值，则认为已经说完一句话
+            if conn.client_have_voice and not client_have_voice:
+                stop_duration = time.time() * 1000 - conn.last_activity_time
+                if stop_duration >= self.silence_threshold_ms:
+                    conn.client_voice_stop = True
+            if client_have_voice:
+                conn.client_have_voice = True
+                conn.last_activity_time = time.time() * 1000
+
+        return client_have_voice
+
     def is_vad(self, conn, opus_packet):
         try:
-            pcm_frame = self.decoder.decode(opus_packet, 960)
-            conn.client_audio_buffer.extend(pcm_frame)  # 将新数据加入缓冲区
-
-            # 处理缓冲区中的完整帧（每次处理512采样点）
-            client_have_voice = False
-            while len(conn.client_audio_buffer) >= 512 * 2:
-                # 提取前512个采样点（1024字节）
-                chunk = conn.client_audio_buffer[: 512 * 2]
-                conn.client_audio_buffer = conn.client_audio_buffer[512 * 2 :]
-
-                # 转换为模型需要的张量格式
-                audio_int16 = np.frombuffer(chunk, dtype=np.int16)
-                audio_float32 = audio_int16.astype(np.float32) / 32768.0
-                audio_tensor = torch.from_numpy(audio_float32)
-
-                # 检测语音活动
-                with torch.no_grad():
-                    speech_prob = self.model(audio_tensor, 16000).item()
-
-                # 双阈值判断
-                if speech_prob >= self.vad_threshold:
-                    is_voice = True
-                elif speech_prob <= self.vad_threshold_low:
-                    is_voice = False
-                else:
-                    is_voice = conn.last_is_voice
-
-                # 声音没低于最低值则延续前一个状态，判断为有声音
-                conn.last_is_voice = is_voice
-
-                # 更新滑动窗口
-                conn.client_voice_window.append(is_voice)
-                client_have_voice = (conn.client_voice_window.count(True) >= self.frame_window_threshold)
-
-                # 如果之前有声音，但本次没有声音，且与上次有声音的时间差已经超过了静默阈值，则认为已经说完一句话
-                if conn.client_have_voice and not client_have_voice:
-                    stop_duration = time.time() * 1000 - conn.last_activity_time
-                    if stop_duration >= self.silence_threshold_ms:
-                        conn.client_voice_stop = True
-                if client_have_voice:
-                    conn.client_have_voice = True
-                    conn.last_activity_time = time.time() * 1000
-
-            return client_have_voice
+            session = self._get_session(conn)
+            chunks = self._decode_chunks(conn, session, opus_packet)
+            speech_probs = []
+            for chunk in chunks:
+                speech_probs.extend(self.engine.infer([session], [chunk]))
+            return self._update_voice_state(conn, speech_probs)
         except opuslib_next.OpusError as e:
             logger.bind(tag=TAG).info(f"解码错误: {e}")
         except Exception as e:
             logger.bind(tag=TAG).error(f"Error processing audio packet: {e}")
+
+    async def is_vad_async(self, conn, opus_packet):
+        try:
+            session = self._get_session(conn)
+            chunks = await self.worker_pool.run(
+                conn.session_id, self._decode_chunks, conn, session, opus_packet
+            )
+            if not chunks:
+                return False
+            # 提交到批量推理引擎，与其他连接的音频块合并推理
+            speech_probs = await asyncio.gather(
+                *[
+                    asyncio.wrap_future(self.engine.submit(session, chunk))
+                    for chunk in chunks
+                ]
+            )
+            return self._update_voice_state(conn, speech_probs)
+        except opuslib_next.OpusError as e:
+            logger.bind(tag=TAG).info(f"解码错误: {e}")
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error processing audio packet: {e}")
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats["inference"] = self.engine.get_stats()
+        return stats
@@ -0,0 +1,77 @@
+"""
+可在事件循环中等待的线程安全队列，以及基于它的音频帧流
+"""
+
+import queue
+import asyncio
+from collections import deque
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LoopQueue(queue.Queue):
+    """兼容queue.Queue的线程安全队列
+
+    线程中照常使用put/get；事件循环中使用get_async等待数据，不占用线程。
+    """
+
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        self._async_waiters = deque()
+
+    def _put(self, item):
+        # 在持有mutex时调用，唤醒所有在事件循环中等待的消费者
+        super()._put(item)
+        while self._async_waiters:
+            loop, future = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    async def get_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.mutex:
+                if self._qsize():
+                    item = self._get()
+                    self.not_full.notify()
+                    return item
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+
+class AudioFrameStream:
+    """逐帧产出的音频流
+
+    生产方在任意线程中写入音频帧，发送方在事件循环中用 async for 边收边发。
+    已写入的全部帧保存在 frames 中，供上报、缓存使用。
+    """
+
+    _END = object()
+
+    def __init__(self):
+        self.frames = []
+        self.error = None
+        self._queue = LoopQueue()
+
+    def put(self, frames) -> None:
+        for frame in frames:
+            self.frames.append(frame)
+            self._queue.put(frame)
+
+    def finish(self, error: Exception = None) -> None:
+        self.error = error
+        self._queue.put(self._END)
+
+    async def __aiter__(self):
+        while True:
+            frame = await self._queue.get_async()
+            if frame is self._END:
+                return
+            yield frame
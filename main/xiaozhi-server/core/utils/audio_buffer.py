@@ -0,0 +1,136 @@
+"""
+预分配的固定容量音频环形缓冲区
+
+PCMRingBuffer 用于VAD按固定块大小切分PCM数据，PacketRingBuffer 用于ASR缓存Opus/PCM数据包。
+两者在初始化时一次性分配存储空间，稳态下的逐包处理不再重新分配或整体拷贝缓冲区。
+"""
+
+from typing import Iterator, List, Optional
+
+
+class PCMRingBuffer:
+    """基于memoryview的PCM字节环形缓冲区"""
+
+    def __init__(self, capacity: int):
+        self._capacity = int(capacity)
+        self._buffer = bytearray(self._capacity)
+        self._view = memoryview(self._buffer)
+        # 读取区域跨越缓冲区末尾时，拼接到暂存区返回
+        self._scratch = memoryview(bytearray(self._capacity))
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def write(self, data) -> None:
+        """写入数据，超出容量时覆盖最早的数据"""
+        data = memoryview(data).cast("B")
+        length = len(data)
+        if length == 0:
+            return
+        if length >= self._capacity:
+            self._view[:] = data[length - self._capacity :]
+            self._start = 0
+            self._size = self._capacity
+            return
+
+        overflow = self._size + length - self._capacity
+        if overflow > 0:
+            self._start = (self._start + overflow) % self._capacity
+            self._size -= overflow
+
+        end = (self._start + self._size) % self._capacity
+        first = min(length, self._capacity - end)
+        self._view[end : end + first] = data[:first]
+        if first < length:
+            self._view[: length - first] = data[first:]
+        self._size += length
+
+    def read(self, length: int) -> memoryview:
+        """读取并消费指定字节数，返回零拷贝视图
+
+        返回的视图只在下一次 read/write 之前有效，需要保留数据时请自行拷贝。
+        """
+        if length > self._size:
+            raise ValueError(f"可读数据不足: 需要{length}字节，当前{self._size}字节")
+        start = self._start
+        if start + length <= self._capacity:
+            out = self._view[start : start + length]
+        else:
+            first = self._capacity - start
+            self._scratch[:first] = self._view[start:]
+            self._scratch[first:length] = self._view[: length - first]
+            out = self._scratch[:length]
+        self._start = (start + length) % self._capacity
+        self._size -= length
+        return out
+
+    def clear(self) -> None:
+        self._start = 0
+        self._size = 0
+
+
+class PacketRingBuffer:
+    """固定槽位的音频包环形缓冲区
+
+    静音期间只保留最近 preroll 个数据包作为语音开头的预录音；
+    说话期间持续累积，超出容量时丢弃最早的数据包。
+    兼容原先列表的 append/clear/copy/len/迭代/切片 用法。
+    """
+
+    def __init__(self, capacity: int = 1000, preroll: int = 10):
+        self._capacity = max(int(capacity), 1)
+        self.preroll = min(max(int(preroll), 0), self._capacity)
+        self._slots: List[Optional[bytes]] = [None] * self._capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[bytes]:
+        for i in range(self._size):
+            yield self._slots[(self._start + i) % self._capacity]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("PacketRingBuffer index out of range")
+        return self._slots[(self._start + index) % self._capacity]
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def append(self, packet: bytes) -> None:
+        if self._size == self._capacity:
+            # 已满，覆盖最早的数据包
+            self._slots[self._start] = packet
+            self._start = (self._start + 1) % self._capacity
+        else:
+            self._slots[(self._start + self._size) % self._capacity] = packet
+            self._size += 1
+
+    def keep_last(self, count: Optional[int] = None) -> None:
+        """只保留最近count个数据包，默认保留预录音窗口"""
+        if count is None:
+            count = self.preroll
+        while self._size > count:
+            self._slots[self._start] = None
+            self._start = (self._start + 1) % self._capacity
+            self._size -= 1
+
+    def copy(self) -> List[bytes]:
+        return list(self)
+
+    def clear(self) -> None:
+        self.keep_last(0)
+        self._start = 0
@@ -0,0 +1,318 @@
+"""
+进程内音频解码与重采样
+
+将TTS接口与音乐文件常见的格式（wav、pcm、mp3、opus/ogg、p3）直接在进程内解码为
+16kHz单声道16位PCM，避免每句话都启动一次ffmpeg子进程。
+无法在进程内处理的格式或编码再回退到pydub/ffmpeg。
+StreamTranscoder 用于TTS接口逐块返回音频时的增量转码。
+"""
+
+import io
+import wave
+import struct
+from typing import List
+import numpy as np
+from config.logger import setup_logging
+from core.utils.opus_codec import StreamEncoder, pooled_decoder
+
+TAG = __name__
+logger = setup_logging()
+
+# 可选依赖：libsndfile可解码wav/flac/ogg及较新版本的mp3；soxr提供高质量重采样
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+TARGET_SAMPLE_RATE = 16000
+# Opus单包最长120ms
+_OPUS_MAX_FRAME_MS = 120
+
+
+def resample(samples: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """对float32单声道采样做向量化重采样"""
+    if from_rate == to_rate or len(samples) == 0:
+        return samples
+    if soxr is not None:
+        return soxr.resample(samples, from_rate, to_rate).astype(np.float32)
+    # 线性插值，整段一次性计算
+    out_length = int(round(len(samples) * to_rate / from_rate))
+    positions = np.arange(out_length, dtype=np.float64) * (from_rate / to_rate)
+    return np.interp(
+        positions, np.arange(len(samples), dtype=np.float64), samples
+    ).astype(np.float32)
+
+
+def to_pcm16(samples: np.ndarray, sample_rate: int) -> bytes:
+    """float32单声道采样重采样到16kHz并转换为16位小端PCM"""
+    samples = resample(samples, sample_rate, TARGET_SAMPLE_RATE)
+    # 按32768缩放，16位源数据可无损还原
+    return np.clip(samples * 32768.0, -32768, 32767).astype("<i2").tobytes()
+
+
+def _downmix(samples: np.ndarray, channels: int) -> np.ndarray:
+    if channels <= 1:
+        return samples
+    return samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+
+
+def _decode_wav(data: bytes):
+    with wave.open(io.BytesIO(data), "rb") as wf:
+        channels = wf.getnchannels()
+        sample_width = wf.getsampwidth()
+        sample_rate = wf.getframerate()
+        frames = wf.readframes(wf.getnframes())
+
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    elif sample_width == 3:
+        raw = np.frombuffer(frames[: len(frames) // 3 * 3], dtype=np.uint8)
+        raw = raw.reshape(-1, 3).astype(np.int32)
+        ints = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"不支持的wav采样位宽: {sample_width}")
+    return _downmix(samples, channels), sample_rate
+
+
+def _iter_ogg_packets(data: bytes):
+    """按Ogg页的分段表拼出数据包（只处理单个逻辑流）"""
+    pos = 0
+    packet = bytearray()
+    while pos + 27 <= len(data):
+        if data[pos : pos + 4] != b"OggS":
+            raise ValueError("无效的Ogg页")
+        segment_count = data[pos + 26]
+        lacing = data[pos + 27 : pos + 27 + segment_count]
+        pos += 27 + segment_count
+        for length in lacing:
+            packet += data[pos : pos + length]
+            pos += length
+            if length < 255:
+                yield bytes(packet)
+                packet = bytearray()
+
+
+def _decode_ogg_opus(data: bytes):
+    packets = _iter_ogg_packets(data)
+    head = next(packets, b"")
+    if not head.startswith(b"OpusHead"):
+        raise ValueError("不是Ogg Opus数据")
+    channels = head[9]
+    (pre_skip,) = struct.unpack_from("<H", head, 10)
+    next(packets, None)  # OpusTags
+
+    # Opus可直接按16kHz解码，无需再重采样
+    max_frame = TARGET_SAMPLE_RATE * _OPUS_MAX_FRAME_MS // 1000
+    with pooled_decoder(TARGET_SAMPLE_RATE, channels) as decoder:
+        pcm = b"".join(decoder.decode(packet, max_frame) for packet in packets)
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768
+    samples = _downmix(samples, channels)
+    # pre_skip以48kHz采样点计
+    return samples[pre_skip * TARGET_SAMPLE_RATE // 48000 :], TARGET_SAMPLE_RATE
+
+
+def _decode_soundfile(data: bytes):
+    if soundfile is None:
+        raise ValueError("未安装soundfile")
+    samples, sample_rate = soundfile.read(
+        io.BytesIO(data), dtype="float32", always_2d=True
+    )
+    return samples.mean(axis=1, dtype=np.float32), sample_rate
+
+
+def _decode_ffmpeg(data: bytes, file_type: str) -> bytes:
+    from pydub import AudioSegment
+
+    # -nostdin 参数：不要从标准输入读取数据，否则FFmpeg会阻塞
+    audio = AudioSegment.from_file(
+        io.BytesIO(data), format=file_type, parameters=["-nostdin"]
+    )
+    audio = audio.set_channels(1).set_frame_rate(TARGET_SAMPLE_RATE).set_sample_width(2)
+    return audio.raw_data
+
+
+_NATIVE_DECODERS = {
+    "wav": (_decode_wav, _decode_soundfile),
+    "opus": (_decode_ogg_opus,),
+    "ogg": (_decode_ogg_opus, _decode_soundfile),
+    "mp3": (_decode_soundfile,),
+    "flac": (_decode_soundfile,),
+}
+
+
+def decode_to_pcm16(data: bytes, file_type: str, sample_rate: int = 16000) -> bytes:
+    """将音频数据解码为16kHz单声道16位小端PCM
+
+    Args:
+        data: 音频文件内容
+        file_type: 格式（wav、pcm、mp3、opus、ogg等）
+        sample_rate: 仅对裸pcm（16位单声道）有效，表示其原始采样率
+    """
+    file_type = (file_type or "").lower().lstrip(".")
+    if file_type == "pcm":
+        if sample_rate == TARGET_SAMPLE_RATE:
+            return data[: len(data) // 2 * 2]
+        samples = np.frombuffer(data[: len(data) // 2 * 2], dtype="<i2")
+        return to_pcm16(samples.astype(np.float32) / 32768, sample_rate)
+
+    for decode in _NATIVE_DECODERS.get(file_type, ()):
+        try:
+            samples, rate = decode(data)
+            return to_pcm16(samples, rate)
+        except Exception as e:
+            logger.bind(tag=TAG).debug(f"进程内解码{file_type}失败: {e}")
+
+    # 进程内无法处理时回退到ffmpeg
+    return _decode_ffmpeg(data, file_type)
+
+
+class _LinearResampler:
+    """分块线性插值重采样，跨块保留插值位置，块边界处连续"""
+
+    def __init__(self, from_rate: int, to_rate: int):
+        self.step = from_rate / to_rate
+        self.position = 0.0
+        self.tail = np.zeros(0, dtype=np.float32)
+
+    def process(self, samples: np.ndarray, last: bool = False) -> np.ndarray:
+        data = np.concatenate((self.tail, samples))
+        # 非最后一块时，插值需要右侧相邻采样点，最后一个采样点留到下一块
+        limit = len(data) - 1
+        if limit < 0 or self.position > limit:
+            self.tail = data
+            return np.zeros(0, dtype=np.float32)
+        count = int((limit - self.position) // self.step) + 1
+        if not last and self.position + (count - 1) * self.step >= limit:
+            count -= 1
+        positions = self.position + np.arange(count, dtype=np.float64) * self.step
+        out = np.interp(positions, np.arange(len(data), dtype=np.float64), data)
+        self.position += count * self.step
+        consumed = int(self.position)
+        self.tail = data[consumed:]
+        self.position -= consumed
+        return out.astype(np.float32)
+
+
+def _parse_wav_header(data: bytes):
+    """解析wav头，返回((格式, 声道数, 采样率, 采样位宽), data块起始位置)，数据不足时返回None"""
+    if len(data) < 12:
+        return None
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("不是wav数据")
+    pos, fmt = 12, None
+    while pos + 8 <= len(data):
+        chunk_id = data[pos : pos + 4]
+        (size,) = struct.unpack_from("<I", data, pos + 4)
+        if chunk_id == b"fmt ":
+            if pos + 24 > len(data):
+                return None
+            audio_format, channels, sample_rate = struct.unpack_from("<HHI", data, pos + 8)
+            (bits,) = struct.unpack_from("<H", data, pos + 22)
+            fmt = (audio_format, channels, sample_rate, bits // 8)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("wav缺少fmt块")
+            return fmt, pos + 8
+        pos += 8 + size + (size & 1)
+    return None
+
+
+class StreamTranscoder:
+    """将逐块到达的音频（TTS接口返回的数据块、分块读取的本地文件）增量转码为Opus/PCM帧
+
+    裸pcm与16位PCM wav逐块解码、重采样并编码，收到第一块数据即可输出音频帧；
+    其他格式（mp3等）无法逐块解码，在结束时整体转码。
+    """
+
+    # wav头超过该长度仍未找到data块时放弃流式转码
+    _MAX_HEADER_BYTES = 65536
+
+    def __init__(self, file_type: str, sample_rate: int = 16000, is_opus: bool = True):
+        self.file_type = (file_type or "").lower().lstrip(".")
+        self.streaming = self.file_type in ("pcm", "wav")
+        self.sample_rate = sample_rate
+        self.channels = 1
+        self._header = bytearray() if self.file_type == "wav" else None
+        self._buffer = bytearray()
+        self._remainder = b""
+        self._resampler = None
+        self._encoder = StreamEncoder(is_opus)
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """写入一块音频数据，返回已可输出的帧"""
+        if not self.streaming:
+            self._buffer += chunk
+            return []
+        if self._header is not None:
+            self._header += chunk
+            try:
+                parsed = _parse_wav_header(self._header)
+            except ValueError:
+                parsed = None
+                self._stop_streaming()
+                return []
+            if parsed is None:
+                if len(self._header) > self._MAX_HEADER_BYTES:
+                    self._stop_streaming()
+                return []
+            (audio_format, channels, sample_rate, width), data_offset = parsed
+            if audio_format != 1 or width != 2:
+                # 非16位PCM编码的wav在结束时整体解码
+                self._stop_streaming()
+                return []
+            self.channels, self.sample_rate = channels, sample_rate
+            chunk = bytes(self._header[data_offset:])
+            self._header = None
+        return self._encoder.encode(self._to_pcm16(chunk))
+
+    def flush(self) -> List[bytes]:
+        """输入结束，返回剩余的帧"""
+        if not self.streaming:
+            pcm = decode_to_pcm16(bytes(self._buffer), self.file_type, self.sample_rate)
+            return self._encoder.encode(pcm) + self._encoder.flush()
+        if self._header is not None:
+            # 没有收到完整的wav头
+            return self._encoder.flush()
+        return self._encoder.encode(self._to_pcm16(b"", last=True)) + self._encoder.flush()
+
+    def close(self) -> None:
+        self._encoder.close()
+
+    def _stop_streaming(self):
+        self.streaming = False
+        self._buffer = self._header
+        self._header = None
+
+    def _to_pcm16(self, chunk: bytes, last: bool = False) -> bytes:
+        data = self._remainder + chunk
+        frame_bytes = 2 * self.channels
+        usable = len(data) // frame_bytes * frame_bytes
+        self._remainder = data[usable:]
+        if self.channels == 1 and self.sample_rate == TARGET_SAMPLE_RATE:
+            return data[:usable]
+
+        samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768
+        samples = _downmix(samples, self.channels)
+        if self.sample_rate != TARGET_SAMPLE_RATE:
+            if self._resampler is None:
+                self._resampler = (
+                    soxr.ResampleStream(self.sample_rate, TARGET_SAMPLE_RATE, 1, "float32")
+                    if soxr is not None
+                    else _LinearResampler(self.sample_rate, TARGET_SAMPLE_RATE)
+                )
+            if soxr is not None:
+                samples = self._resampler.resample_chunk(samples, last=last)
+            else:
+                samples = self._resampler.process(samples, last=last)
+        return np.clip(samples * 32768.0, -32768, 32767).astype("<i2").tobytes()
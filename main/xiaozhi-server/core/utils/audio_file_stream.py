@@ -0,0 +1,125 @@
+"""
+按播放进度分批读取的音频文件帧流
+
+音乐等较长的音频文件不再整体解码为帧列表：每次只在线程池中读取、转码一小批帧，
+发送当前批次的同时预读下一批，每个连接占用的内存与曲目长度无关。
+打断播放时发送方关闭帧流，读取器随即关闭文件并归还编码器。
+"""
+
+import os
+import asyncio
+import itertools
+from collections import deque
+from typing import List
+from core.utils import p3
+from core.utils.p3_cache import p3_cache
+from core.utils.audio_codec import StreamTranscoder
+
+# 每批读取的帧数，约1秒音频
+BATCH_FRAMES = 16
+# 非p3文件每次读取的字节数
+_CHUNK_SIZE = 16384
+
+
+class AudioFileReader:
+    """逐批读取音频文件并转换为Opus/PCM帧，可以在不同线程中依次调用，但不能并发调用
+
+    p3文件及已预转码的文件以内存映射方式逐帧读取；其他文件分块读取并增量转码，
+    在预转码目录内的文件同时写入p3缓存，完整读完后下次即可直接读取。
+    """
+
+    def __init__(self, path: str, is_opus: bool = True):
+        self.path = path
+        self.is_opus = is_opus
+        self._frames = None
+        self._file = None
+        self._transcoder = None
+        self._writer = None
+        self._pending = deque()
+        self._eof = False
+
+    def _open(self):
+        p3_path = self.path if self.path.lower().endswith(".p3") else None
+        if p3_path is None and self.is_opus:
+            cache_path = p3_cache.cache_path(self.path)
+            if cache_path is not None and os.path.exists(cache_path):
+                p3_path = cache_path
+                p3_cache.count_hit()
+            else:
+                self._writer = p3_cache.open_writer(cache_path)
+        if p3_path is not None:
+            self._frames = p3.iter_opus_from_file(p3_path)
+            return
+
+        file_type = os.path.splitext(self.path)[1].lstrip(".")
+        self._file = open(self.path, "rb")
+        self._transcoder = StreamTranscoder(file_type, is_opus=self.is_opus)
+
+    def read(self, count: int) -> List[bytes]:
+        """读取最多count帧，读完后返回空列表"""
+        if self._frames is None and self._file is None:
+            if self._eof:
+                return []
+            self._open()
+        if self._frames is not None:
+            return list(itertools.islice(self._frames, count))
+
+        while len(self._pending) < count and not self._eof:
+            chunk = self._file.read(_CHUNK_SIZE)
+            if chunk:
+                self._pending.extend(self._transcoder.feed(chunk))
+            else:
+                self._pending.extend(self._transcoder.flush())
+                self._eof = True
+        frames = [self._pending.popleft() for _ in range(min(count, len(self._pending)))]
+        if self._writer is not None:
+            self._writer.write(frames)
+            if self._eof and not self._pending:
+                self._writer.commit()
+                self._writer = None
+        return frames
+
+    def close(self):
+        if self._frames is not None:
+            self._frames.close()
+        if self._transcoder is not None:
+            self._transcoder.close()
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            # 没有完整读完（如被打断）的文件不写入缓存
+            self._writer.abort()
+        self._frames = self._file = self._transcoder = self._writer = None
+        self._pending.clear()
+        self._eof = True
+
+
+class AudioFileStream:
+    """音频文件的异步帧流，可直接交给sendAudio按播放节奏发送
+
+    每次迭代重新打开文件；读取在连接的tts线程池中进行，任何时刻最多缓存两批帧。
+    """
+
+    def __init__(self, executor, path: str, is_opus: bool = True):
+        self.executor = executor
+        self.path = path
+        self.is_opus = is_opus
+
+    async def __aiter__(self):
+        reader = AudioFileReader(self.path, self.is_opus)
+        future = self.executor.submit_to("tts", reader.read, BATCH_FRAMES)
+        try:
+            while True:
+                frames = await asyncio.wrap_future(future)
+                if not frames:
+                    break
+                # 发送当前批次的同时预读下一批
+                future = self.executor.submit_to("tts", reader.read, BATCH_FRAMES)
+                for frame in frames:
+                    yield frame
+        finally:
+            if future.done():
+                reader.close()
+            else:
+                # 读取仍在进行中，完成后再关闭，避免与工作线程同时操作读取器
+                future.add_done_callback(lambda _: reader.close())
@@ -18,6 +18,7 @@ class CacheType(Enum):
     IP_INFO = "ip_info"
     CONFIG = "config"
     DEVICE_PROMPT = "device_prompt"
+    TTS_AUDIO = "tts_audio"
 
 
 @dataclass
@@ -54,5 +55,8 @@ class CacheConfig:
             CacheType.DEVICE_PROMPT: cls(
                 strategy=CacheStrategy.TTL, ttl=None, max_size=1000  # 手动失效
             ),
+            CacheType.TTS_AUDIO: cls(
+                strategy=CacheStrategy.LRU, ttl=None, max_size=500  # 按使用频率淘汰
+            ),
         }
         return configs.get(cache_type, cls())
@@ -21,6 +21,8 @@ class GlobalCacheManager:
         self._global_lock = threading.RLock()
         self._last_cleanup = time.time()
         self._stats = {"hits": 0, "misses": 0, "evictions": 0, "cleanups": 0}
+        # 按缓存类型统计的命中情况，key为CacheType.value
+        self._type_stats: Dict[str, Dict[str, int]] = {}
 
     @property
     def logger(self):
@@ -52,6 +54,14 @@ class GlobalCacheManager:
                 self._locks[cache_name] = threading.RLock()
             return self._caches[cache_name]
 
+    def configure(
+        self, cache_type: CacheType, config: CacheConfig, namespace: str = ""
+    ) -> None:
+        """覆盖指定缓存空间的预设配置，需在首次写入前调用"""
+        cache_name = self._get_cache_name(cache_type, namespace)
+        with self._global_lock:
+            self._configs[cache_name] = config
+
     def set(
         self,
         cache_type: CacheType,
@@ -100,13 +110,21 @@ class GlobalCacheManager:
         self._maybe_cleanup(cache_name)
 
     def get(
-        self, cache_type: CacheType, key: str, namespace: str = ""
+        self,
+        cache_type: CacheType,
+        key: str,
+        namespace: str = "",
+        record_stats: bool = True,
     ) -> Optional[Any]:
-        """获取缓存值"""
+        """获取缓存值
+
+        record_stats为False时不计入命中统计，由调用方通过record自行记录查询结果
+        """
         cache_name = self._get_cache_name(cache_type, namespace)
 
         if cache_name not in self._caches:
-            self._stats["misses"] += 1
+            if record_stats:
+                self.record(cache_type, "misses")
             return None
 
         cache = self._caches[cache_name]
@@ -114,7 +132,8 @@ class GlobalCacheManager:
 
         with self._locks[cache_name]:
             if key not in cache:
-                self._stats["misses"] += 1
+                if record_stats:
+                    self.record(cache_type, "misses")
                 return None
 
             entry = cache[key]
@@ -122,7 +141,8 @@ class GlobalCacheManager:
             # 检查过期
             if entry.is_expired():
                 del cache[key]
-                self._stats["misses"] += 1
+                if record_stats:
+                    self.record(cache_type, "misses")
                 return None
 
             # 更新访问信息
@@ -133,9 +153,44 @@ class GlobalCacheManager:
                 del cache[key]
                 cache[key] = entry
 
-            self._stats["hits"] += 1
+            if record_stats:
+                self.record(cache_type, "hits")
             return entry.value
 
+    def record(self, cache_type: CacheType, event: str, count: int = 1) -> None:
+        """记录一次缓存查询结果，event为hits、misses或以hits结尾的其他命中类型"""
+        with self._global_lock:
+            stats = self._type_stats.setdefault(
+                cache_type.value, {"hits": 0, "misses": 0}
+            )
+            stats[event] = stats.get(event, 0) + count
+            if event.endswith("hits"):
+                self._stats["hits"] += count
+            elif event == "misses":
+                self._stats["misses"] += count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取全局及各缓存类型的命中率、条目数"""
+        with self._global_lock:
+            stats = dict(self._stats)
+            type_stats = {
+                name: dict(item) for name, item in self._type_stats.items()
+            }
+            sizes: Dict[str, int] = {}
+            for cache_name, cache in self._caches.items():
+                type_name = cache_name.split(":", 1)[0]
+                sizes[type_name] = sizes.get(type_name, 0) + len(cache)
+
+        stats["hit_rate"] = _hit_rate(stats["hits"], stats["misses"])
+        for name, item in type_stats.items():
+            hits = sum(v for k, v in item.items() if k.endswith("hits"))
+            item["hit_rate"] = _hit_rate(hits, item["misses"])
+        for name, size in sizes.items():
+            type_stats.setdefault(name, {"hits": 0, "misses": 0, "hit_rate": 0})
+            type_stats[name]["size"] = size
+        stats["types"] = type_stats
+        return stats
+
     def delete(self, cache_type: CacheType, key: str, namespace: str = "") -> bool:
         """删除缓存条目"""
         cache_name = self._get_cache_name(cache_type, namespace)
@@ -212,5 +267,10 @@ class GlobalCacheManager:
                 self.logger.debug(f"清理缓存 {cache_name}: 删除 {deleted} 个过期条目")
 
 
+def _hit_rate(hits: int, misses: int) -> float:
+    lookups = hits + misses
+    return round(hits / lookups, 4) if lookups else 0
+
+
 # 创建全局缓存管理器实例
 cache_manager = GlobalCacheManager()
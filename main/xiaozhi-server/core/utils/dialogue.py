@@ -4,6 +4,25 @@ from typing import List, Dict
 from datetime import datetime
 
 
+# 提示词布局：inline 为原有布局；prefix_cache 把易变内容移到末尾，使各轮请求共享最长的前缀
+LAYOUT_INLINE = "inline"
+LAYOUT_PREFIX_CACHE = "prefix_cache"
+
+# 系统提示词中每轮都可能变化的部分（时间天气等上下文、记忆）
+# 只匹配独占一行的标签，正文中`<context>`之类的引用不受影响
+_VOLATILE_BLOCK = re.compile(
+    r"\s*^<(context|memory)>$.*?^</\1>$", re.DOTALL | re.MULTILINE
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数：中日韩字符每字约1个token，其他字符约4个1个token"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if ch >= "\u2e80")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
 class Message:
     def __init__(
         self,
@@ -18,32 +37,106 @@ class Message:
         self.content = content
         self.tool_calls = tool_calls
         self.tool_call_id = tool_call_id
+        # 序列化结果与token数的缓存，消息放入对话后不再修改，只需计算一次
+        self._llm_message = None
+        self._tokens = None
+
+    def to_llm_message(self) -> Dict:
+        if self._llm_message is None:
+            if self.tool_calls is not None:
+                self._llm_message = {"role": self.role, "tool_calls": self.tool_calls}
+            elif self.role == "tool":
+                self._llm_message = {
+                    "role": self.role,
+                    "tool_call_id": (
+                        str(uuid.uuid4())
+                        if self.tool_call_id is None
+                        else self.tool_call_id
+                    ),
+                    "content": self.content,
+                }
+            else:
+                self._llm_message = {"role": self.role, "content": self.content}
+        # 部分LLM适配器会改写消息内容，返回副本以免污染缓存
+        return dict(self._llm_message)
+
+    @property
+    def tokens(self) -> int:
+        if self._tokens is None:
+            tokens = estimate_tokens(self.content) + 4
+            if self.tool_calls is not None:
+                tokens += estimate_tokens(str(self.tool_calls))
+            self._tokens = tokens
+        return self._tokens
 
 
 class Dialogue:
-    def __init__(self):
+    """对话历史
+
+    dialogue 保存完整的历史（记忆模块在会话结束时使用）；发送给LLM的历史按token预算裁剪：
+    超出max_tokens时窗口起点一次后移到预算的trim_ratio以内，并且总是从用户消息开始，
+    不会拆开工具调用与工具结果。之后几轮窗口起点保持不变，提示词前缀稳定。
+    移出窗口的对话可以由调用方总结为摘要（见pending_summary/set_summary），附加在系统提示词后。
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 0,
+        trim_ratio: float = 0.7,
+        layout: str = LAYOUT_INLINE,
+        context_role: str = "system",
+    ):
         self.dialogue: List[Message] = []
         # 获取当前时间
         self.current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.max_tokens = max_tokens
+        self.trim_ratio = trim_ratio
+        self.layout = layout
+        self.context_role = context_role
+        self.summary = None
+        # 摘要已覆盖到的最后一条消息
+        self._summary_upto = None
+        # 窗口起点消息及其下标（下标仅作查找提示，列表被替换时重新查找）
+        self._window_start_id = None
+        self._window_start_hint = 0
+        # 增强系统提示词的缓存：(系统提示词, 记忆, 说话人, 摘要) -> (系统提示词, 末尾上下文)
+        self._system_cache_key = None
+        self._system_cache = None
+        self._speakers_cache_key = None
+        self._speakers_cache = ""
+
+    @classmethod
+    def from_config(cls, config: dict, layout_config: dict = None) -> "Dialogue":
+        config = config or {}
+        layout_config = layout_config or {}
+        max_tokens = config.get("max_tokens")
+        trim_ratio = config.get("trim_ratio")
+        layout = layout_config.get("mode") or LAYOUT_INLINE
+        if layout not in (LAYOUT_INLINE, LAYOUT_PREFIX_CACHE):
+            layout = LAYOUT_INLINE
+        return cls(
+            max_tokens=int(max_tokens) if max_tokens else 0,
+            trim_ratio=float(trim_ratio) if trim_ratio else 0.7,
+            layout=layout,
+            context_role=layout_config.get("context_role") or "system",
+        )
+
+    def fork(self, messages: List[Message]) -> "Dialogue":
+        """以相同的窗口、布局设置与摘要创建一个包含指定消息的新对话"""
+        forked = Dialogue(
+            self.max_tokens, self.trim_ratio, self.layout, self.context_role
+        )
+        forked.dialogue = list(messages)
+        forked.summary = self.summary
+        forked._summary_upto = self._summary_upto
+        forked._window_start_id = self._window_start_id
+        return forked
 
     def put(self, message: Message):
         self.dialogue.append(message)
 
     def getMessages(self, m, dialogue):
-        if m.tool_calls is not None:
-            dialogue.append({"role": m.role, "tool_calls": m.tool_calls})
-        elif m.role == "tool":
-            dialogue.append(
-                {
-                    "role": m.role,
-                    "tool_call_id": (
-                        str(uuid.uuid4()) if m.tool_call_id is None else m.tool_call_id
-                    ),
-                    "content": m.content,
-                }
-            )
-        else:
-            dialogue.append({"role": m.role, "content": m.content})
+        dialogue.append(m.to_llm_message())
 
     def get_llm_dialogue(self) -> List[Dict[str, str]]:
         # 直接调用get_llm_dialogue_with_memory，传入None作为memory_str
@@ -59,6 +152,152 @@ class Dialogue:
         else:
             self.put(Message(role="system", content=new_content))
 
+    def _speakers_info(self, voiceprint_config: dict) -> str:
+        """说话人个性化描述，说话人列表不变时直接复用"""
+        try:
+            speakers = voiceprint_config.get("speakers", [])
+        except:
+            # 配置读取失败时忽略错误，不影响其他功能
+            return ""
+        key = tuple(speakers) if speakers else ()
+        if key == self._speakers_cache_key:
+            return self._speakers_cache
+        info = ""
+        if speakers:
+            info = "\n\n<speakers_info>"
+            for speaker_str in speakers:
+                try:
+                    parts = speaker_str.split(",", 2)
+                    if len(parts) >= 2:
+                        name = parts[1].strip()
+                        # 如果描述为空，则为""
+                        description = parts[2].strip() if len(parts) >= 3 else ""
+                        info += f"\n- {name}：{description}"
+                except:
+                    pass
+            info += "\n\n</speakers_info>"
+        self._speakers_cache_key, self._speakers_cache = key, info
+        return info
+
+    def _enhanced_system_prompt(
+        self, content: str, memory_str: str, voiceprint_config: dict
+    ):
+        """返回(系统提示词, 末尾上下文)，inline布局时末尾上下文为None"""
+        speakers_info = self._speakers_info(voiceprint_config)
+        key = (content, memory_str, speakers_info, self.summary, self.layout)
+        if key == self._system_cache_key:
+            return self._system_cache
+
+        content = content or ""
+        # 使用正则表达式匹配 <memory> 标签，不管中间有什么内容
+        if memory_str is not None:
+            content = re.sub(
+                r"<memory>.*?</memory>",
+                lambda _: f"<memory>\n{memory_str}\n</memory>",
+                content,
+                flags=re.DOTALL,
+            )
+        # 已移出上下文窗口的早期对话摘要
+        summary = (
+            f"<history_summary>\n{self.summary}\n</history_summary>"
+            if self.summary
+            else None
+        )
+
+        if self.layout == LAYOUT_PREFIX_CACHE:
+            # 系统提示词只保留不变的部分（角色、规则、说话人），
+            # 上下文、记忆与摘要按从稳定到易变的顺序放到末尾的消息中
+            blocks = [m.group(0).strip() for m in _VOLATILE_BLOCK.finditer(content)]
+            stable = _VOLATILE_BLOCK.sub("", content) + speakers_info
+            if summary:
+                blocks.insert(0, summary)
+            result = (stable, "\n\n".join(blocks) if blocks else None)
+        else:
+            # 基础系统提示，添加说话人个性化描述
+            enhanced_system_prompt = content + speakers_info
+            if summary:
+                enhanced_system_prompt += "\n\n" + summary
+            result = (enhanced_system_prompt, None)
+        self._system_cache_key, self._system_cache = key, result
+        return result
+
+    def _window_start(self) -> int:
+        """返回上下文窗口起点的下标"""
+        messages = self.dialogue
+        if self.max_tokens <= 0 or not messages:
+            return 0
+
+        start = 0
+        if self._window_start_id is not None:
+            hint = self._window_start_hint
+            if hint < len(messages) and messages[hint].uniq_id == self._window_start_id:
+                start = hint
+            else:
+                start = next(
+                    (
+                        i
+                        for i, m in enumerate(messages)
+                        if m.uniq_id == self._window_start_id
+                    ),
+                    0,
+                )
+
+        total = sum(m.tokens for m in messages[start:] if m.role != "system")
+        if total > self.max_tokens:
+            # 一次裁剪到预算的trim_ratio以内，之后几轮不必再移动窗口起点
+            target = self.max_tokens * self.trim_ratio
+            last_user = next(
+                (
+                    i
+                    for i in range(len(messages) - 1, start - 1, -1)
+                    if messages[i].role == "user"
+                ),
+                start,
+            )
+            i = start
+            while i < last_user and total > target:
+                if messages[i].role != "system":
+                    total -= messages[i].tokens
+                i += 1
+                # 窗口总是从用户消息开始，不拆开工具调用与工具结果
+                while i < last_user and messages[i].role != "user":
+                    if messages[i].role != "system":
+                        total -= messages[i].tokens
+                    i += 1
+            start = i
+
+        self._window_start_hint = start
+        self._window_start_id = messages[start].uniq_id if start else None
+        return start
+
+    def pending_summary(self):
+        """返回已移出窗口、尚未总结的消息及其最后一条的ID，没有时返回None"""
+        start = self._window_start()
+        if start == 0:
+            return None
+        begin = 0
+        if self._summary_upto is not None:
+            begin = next(
+                (
+                    i + 1
+                    for i, m in enumerate(self.dialogue[:start])
+                    if m.uniq_id == self._summary_upto
+                ),
+                0,
+            )
+        messages = [
+            m
+            for m in self.dialogue[begin:start]
+            if m.role in ("user", "assistant") and m.content
+        ]
+        if not messages:
+            return None
+        return messages, self.dialogue[start - 1].uniq_id
+
+    def set_summary(self, summary: str, upto_id: str):
+        self.summary = summary
+        self._summary_upto = upto_id
+
     def get_llm_dialogue_with_memory(
         self, memory_str: str = None, voiceprint_config: dict = None
     ) -> List[Dict[str, str]]:
@@ -70,45 +309,20 @@ class Dialogue:
             (msg for msg in self.dialogue if msg.role == "system"), None
         )
 
+        context = None
         if system_message:
-            # 基础系统提示
-            enhanced_system_prompt = system_message.content
-
-            # 添加说话人个性化描述
-            try:
-                speakers = voiceprint_config.get("speakers", [])
-                if speakers:
-                    enhanced_system_prompt += "\n\n<speakers_info>"
-                    for speaker_str in speakers:
-                        try:
-                            parts = speaker_str.split(",", 2)
-                            if len(parts) >= 2:
-                                name = parts[1].strip()
-                                # 如果描述为空，则为""
-                                description = (
-                                    parts[2].strip() if len(parts) >= 3 else ""
-                                )
-                                enhanced_system_prompt += f"\n- {name}：{description}"
-                        except:
-                            pass
-                    enhanced_system_prompt += "\n\n</speakers_info>"
-            except:
-                # 配置读取失败时忽略错误，不影响其他功能
-                pass
-
-            # 使用正则表达式匹配 <memory> 标签，不管中间有什么内容
-            if memory_str is not None:
-                enhanced_system_prompt = re.sub(
-                    r"<memory>.*?</memory>",
-                    f"<memory>\n{memory_str}\n</memory>",
-                    enhanced_system_prompt,
-                    flags=re.DOTALL,
-                )
-            dialogue.append({"role": "system", "content": enhanced_system_prompt})
+            system_prompt, context = self._enhanced_system_prompt(
+                system_message.content, memory_str, voiceprint_config
+            )
+            dialogue.append({"role": "system", "content": system_prompt})
 
-        # 添加用户和助手的对话
-        for m in self.dialogue:
+        # 添加上下文窗口内的用户和助手的对话
+        for m in self.dialogue[self._window_start() :]:
             if m.role != "system":  # 跳过原始的系统消息
                 self.getMessages(m, dialogue)
 
+        # prefix_cache布局：易变的上下文放在最后，前面的内容在各轮之间保持不变
+        if context:
+            dialogue.append({"role": self.context_role, "content": context})
+
         return dialogue
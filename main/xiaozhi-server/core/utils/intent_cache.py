@@ -0,0 +1,200 @@
+"""
+全服务共享的意图识别缓存
+
+以 (意图识别提示词签名, 归一化文本) 为键缓存意图LLM的识别结果，不再区分设备。
+提示词中包含可用函数列表（以及音乐、家居设备列表），函数列表变化后签名随之变化，旧结果不会再被命中。
+精确匹配未命中时，可选地用字符二元组向量在同一签名下做近邻匹配。近邻匹配只复用不带参数的识别结果，
+且要求两句话中的数字完全相同：参数（亮度、闹钟时间等）取决于原句的具体内容，不能套用到相似的句子上。
+"""
+
+import json
+import math
+import re
+import hashlib
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, Optional, Tuple
+from core.utils import textUtils
+from core.utils.cache.manager import cache_manager
+from core.utils.cache.config import CacheConfig, CacheType
+from core.utils.cache.strategies import CacheStrategy
+
+TAG = __name__
+
+_CN_DIGITS = {
+    "零": 0,
+    "〇": 0,
+    "一": 1,
+    "二": 2,
+    "两": 2,
+    "三": 3,
+    "四": 4,
+    "五": 5,
+    "六": 6,
+    "七": 7,
+    "八": 8,
+    "九": 9,
+}
+_CN_UNITS = {"十": 10, "百": 100, "千": 1000, "万": 10000}
+_CN_NUMBER = re.compile(f"[{''.join(_CN_DIGITS)}{''.join(_CN_UNITS)}]+")
+_NUMBER = re.compile(r"\d+")
+
+
+def _chinese_to_int(numeral: str) -> int:
+    total, section, number = 0, 0, 0
+    for char in numeral:
+        if char in _CN_DIGITS:
+            number = _CN_DIGITS[char]
+            continue
+        unit = _CN_UNITS[char]
+        if unit == 10000:
+            total += (section + number) * unit
+            section = 0
+        else:
+            # "十五"省略了前面的"一"
+            section += (number or 1) * unit
+        number = 0
+    return total + section + number
+
+
+def _replace_numeral(match) -> str:
+    numeral = match.group(0)
+    if numeral[0] in _CN_UNITS and numeral[0] != "十":
+        # 只转换完整的数字："百分之"、"千万别"、"万一"中的单位字不是数字
+        return numeral
+    if not any(char in _CN_UNITS for char in numeral):
+        # "二零二五"这类逐位读法
+        return "".join(str(_CN_DIGITS[char]) for char in numeral)
+    return str(_chinese_to_int(numeral))
+
+
+def normalize_text(text: str) -> str:
+    """去除标点、表情与空白，全角转半角、转小写，中文数字转为阿拉伯数字"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = textUtils.remove_punctuation_and_emoji(text)
+    return _CN_NUMBER.sub(_replace_numeral, text)
+
+
+def prompt_signature(prompt: str) -> str:
+    """意图识别提示词的签名，可用函数或设备列表变化后随之变化"""
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def _replayable(intent: str) -> bool:
+    """识别结果是否可以复用到相似的句子：只有不带参数的函数调用（含continue_chat）可以"""
+    try:
+        data = json.loads(intent)
+    except (TypeError, ValueError):
+        return False
+    if not isinstance(data, dict):
+        return False
+    calls = data.get("function_calls") or [data.get("function_call")]
+    return all(isinstance(call, dict) and not call.get("arguments") for call in calls)
+
+
+def _embed(text: str) -> Tuple[Counter, float]:
+    """字符二元组计数向量及其模长，单字文本使用单字本身"""
+    grams = Counter(text[i : i + 2] for i in range(len(text) - 1)) or Counter(text)
+    return grams, math.sqrt(sum(v * v for v in grams.values()))
+
+
+class IntentCache:
+    """意图识别结果缓存，由WebSocketServer持有，所有连接共享"""
+
+    def __init__(self, config: Optional[dict] = None):
+        config = config or {}
+        enabled = config.get("enabled", True)
+        semantic = config.get("semantic_match", False)
+        threshold = config.get("similarity_threshold", "0.9")
+        ttl = config.get("ttl", "600")
+        max_entries = config.get("max_entries", "1000")
+
+        self.enabled = enabled not in (False, "false", "False", "0", 0)
+        self.semantic_match = semantic in (True, "true", "True", "1", 1)
+        self.similarity_threshold = float(threshold) if threshold else 0.9
+        self.max_entries = int(max_entries) if max_entries else 1000
+
+        cache_manager.configure(
+            CacheType.INTENT,
+            CacheConfig(
+                strategy=CacheStrategy.TTL_LRU,
+                ttl=float(ttl) if ttl else 600,
+                max_size=self.max_entries,
+            ),
+        )
+        self._lock = threading.Lock()
+        # 近邻匹配索引：签名 -> {归一化文本: (缓存键, 数字, 向量, 模长)}
+        self._index: Dict[str, "OrderedDict[str, tuple]"] = {}
+        self._indexed = 0
+
+    def _key(self, signature: str, text: str) -> str:
+        return hashlib.sha1(f"{signature}\n{text}".encode("utf-8")).hexdigest()
+
+    def get(self, signature: str, text: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        text = normalize_text(text)
+        if not text:
+            return None
+
+        intent = cache_manager.get(
+            CacheType.INTENT, self._key(signature, text), record_stats=False
+        )
+        if intent is not None:
+            cache_manager.record(CacheType.INTENT, "hits")
+            return intent
+
+        if self.semantic_match:
+            key = self._nearest(signature, text)
+            if key is not None:
+                intent = cache_manager.get(CacheType.INTENT, key, record_stats=False)
+                if intent is not None:
+                    cache_manager.record(CacheType.INTENT, "semantic_hits")
+                    return intent
+
+        cache_manager.record(CacheType.INTENT, "misses")
+        return None
+
+    def put(self, signature: str, text: str, intent: str) -> None:
+        if not self.enabled:
+            return
+        text = normalize_text(text)
+        if not text:
+            return
+        key = self._key(signature, text)
+        cache_manager.set(CacheType.INTENT, key, intent)
+        if self.semantic_match and _replayable(intent):
+            self._add_to_index(signature, text, key)
+
+    def _add_to_index(self, signature: str, text: str, key: str) -> None:
+        vector, norm = _embed(text)
+        with self._lock:
+            entries = self._index.setdefault(signature, OrderedDict())
+            if text in entries:
+                entries.move_to_end(text)
+            else:
+                self._indexed += 1
+            entries[text] = (key, _NUMBER.findall(text), vector, norm)
+            # 索引条目总数与缓存上限一致，超出时从最大的签名分组中淘汰最旧的
+            while self._indexed > self.max_entries:
+                largest = max(self._index, key=lambda sig: len(self._index[sig]))
+                self._index[largest].popitem(last=False)
+                self._indexed -= 1
+                if not self._index[largest]:
+                    del self._index[largest]
+
+    def _nearest(self, signature: str, text: str) -> Optional[str]:
+        vector, norm = _embed(text)
+        numbers = _NUMBER.findall(text)
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            candidates = list(self._index.get(signature, {}).values())
+        for key, other_numbers, other, other_norm in candidates:
+            if other_numbers != numbers:
+                continue
+            dot = sum(count * other.get(gram, 0) for gram, count in vector.items())
+            score = dot / (norm * other_norm) if dot else 0
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
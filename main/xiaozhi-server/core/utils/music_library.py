@@ -0,0 +1,324 @@
+"""
+带索引的本地音乐库
+
+- 按目录mtime增量更新：只重新列出mtime发生变化的目录，未变化的目录只做一次stat，不再整体rglob
+- 文件列表、目录mtime以及时长、格式等元数据持久化到索引文件，重启后直接加载，只处理变化的部分
+- 歌名按字符二元组（安装了pypinyin时额外按拼音）建立倒排索引，模糊查找只比较有公共片段的候选歌曲，
+  候选歌曲仍按原先的difflib相似度排序，"稻香"这类短歌名也能匹配"周杰伦-稻香"
+"""
+
+import os
+import json
+import time
+import wave
+import struct
+import random
+import difflib
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+from config.logger import setup_logging
+from core.utils import textUtils
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+try:
+    import mutagen
+except ImportError:
+    mutagen = None
+
+TAG = __name__
+logger = setup_logging()
+
+INDEX_FORMAT_VERSION = 1
+# p3文件每帧的头部：[1字节类型，1字节保留，2字节长度]，每帧60毫秒
+_P3_HEADER = struct.Struct(">BBH")
+_P3_FRAME_SECONDS = 0.06
+
+
+def _normalize_title(title: str) -> str:
+    title = unicodedata.normalize("NFKC", title).lower()
+    return textUtils.remove_punctuation_and_emoji(title)
+
+
+def _title_keys(title: str) -> Tuple[str, Optional[str]]:
+    """歌名/查询词用于比较相似度的文本：归一化后的文字，安装了pypinyin时还有拼音"""
+    text = _normalize_title(title)
+    pinyin = " ".join(lazy_pinyin(text)) if lazy_pinyin is not None and text else None
+    return text, pinyin
+
+
+def _grams(keys: Tuple[str, Optional[str]]) -> Set[str]:
+    """歌名/查询词的索引片段：字符二元组，安装了pypinyin时再加上拼音二元组"""
+    text, pinyin = keys
+    if not text:
+        return set()
+    grams = {"c:" + text[i : i + 2] for i in range(len(text) - 1)} or {"c:" + text}
+    if pinyin is not None:
+        syllables = pinyin.split(" ")
+        grams.update(
+            "p:" + "".join(syllables[i : i + 2]) for i in range(len(syllables) - 1)
+        )
+        if len(syllables) == 1:
+            grams.add("p:" + syllables[0])
+    return grams
+
+
+def _similarity(a: Tuple[str, Optional[str]], b: Tuple[str, Optional[str]]) -> float:
+    """与原先逐个比较时相同的difflib相似度，有拼音时取文字与拼音中较高的一个"""
+    score = difflib.SequenceMatcher(None, a[0], b[0]).ratio()
+    if a[1] is not None and b[1] is not None:
+        score = max(score, difflib.SequenceMatcher(None, a[1], b[1]).ratio())
+    return score
+
+
+def _probe_duration(path: str, ext: str) -> Optional[float]:
+    """读取音频时长（秒），无法识别时返回None"""
+    try:
+        if ext == ".p3":
+            frames = 0
+            with open(path, "rb") as f:
+                while True:
+                    header = f.read(_P3_HEADER.size)
+                    if len(header) < _P3_HEADER.size:
+                        break
+                    _, _, data_len = _P3_HEADER.unpack(header)
+                    f.seek(data_len, os.SEEK_CUR)
+                    frames += 1
+            return round(frames * _P3_FRAME_SECONDS, 2)
+        if ext == ".wav":
+            with wave.open(path, "rb") as f:
+                return round(f.getnframes() / f.getframerate(), 2)
+        if mutagen is not None:
+            audio = mutagen.File(path)
+            if audio is not None and audio.info is not None:
+                return round(audio.info.length, 2)
+    except Exception as e:
+        logger.bind(tag=TAG).debug(f"读取音乐时长失败: {path}, {e}")
+    return None
+
+
+class MusicLibrary:
+    """本地音乐库索引，所有连接共享"""
+
+    def __init__(
+        self,
+        music_dir: str,
+        music_ext,
+        refresh_time: float = 60,
+        index_file: Optional[str] = None,
+    ):
+        self.music_dir = os.path.abspath(music_dir)
+        self.music_ext = tuple(ext.lower() for ext in music_ext)
+        self.refresh_time = float(refresh_time) if refresh_time else 60
+        self.index_file = index_file or None
+        # 文件列表每次变化时递增
+        self.version = 0
+        self.files: List[str] = []
+        self.names: List[str] = []
+
+        self._lock = threading.RLock()
+        # 目录相对路径 -> {"mtime": 纳秒, "subdirs": [...], "files": [...]}
+        self._dirs: Dict[str, dict] = {}
+        # 文件相对路径 -> {"mtime", "size", "format", "duration"}
+        self._entries: Dict[str, dict] = {}
+        # 倒排索引：片段 -> 文件相对路径集合
+        self._postings: Dict[str, Set[str]] = {}
+        self._file_grams: Dict[str, Set[str]] = {}
+        self._file_keys: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._scan_time = 0.0
+
+        self._load_index()
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> bool:
+        """按目录mtime增量同步文件列表，距上次同步不足refresh_time时直接返回，有变化时返回True"""
+        with self._lock:
+            if not force and time.time() - self._scan_time < self.refresh_time:
+                return False
+            start = time.time()
+            changed = self._sync()
+            self._scan_time = time.time()
+            if changed:
+                self.files = sorted(self._entries)
+                self.names = [os.path.splitext(f)[0] for f in self.files]
+                self.version += 1
+                self._save_index()
+                logger.bind(tag=TAG).info(
+                    f"音乐库已更新: {len(self.files)} 首, 耗时 {time.time() - start:.3f}秒"
+                )
+            return changed
+
+    def search(self, query: str, threshold: float = 0.4) -> Optional[str]:
+        """模糊查找与query最相近的歌曲，返回其相对路径
+
+        倒排索引只用来挑出与query有公共片段的候选歌曲，候选歌曲按difflib相似度排序，
+        相似度需高于threshold。
+        """
+        query_keys = _title_keys(query)
+        query_grams = _grams(query_keys)
+        if not query_grams:
+            return None
+        with self._lock:
+            candidates = set()
+            for gram in query_grams:
+                candidates.update(self._postings.get(gram, ()))
+
+            best, best_score = None, threshold
+            for file in candidates:
+                score = _similarity(query_keys, self._file_keys[file])
+                if score > best_score or (
+                    score == best_score and best is not None and len(file) < len(best)
+                ):
+                    best, best_score = file, score
+            return best
+
+    def random_file(self) -> Optional[str]:
+        files = self.files
+        return random.choice(files) if files else None
+
+    def get_metadata(self, file: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(file)
+            return dict(entry) if entry else None
+
+    def _sync(self) -> bool:
+        if not os.path.isdir(self.music_dir):
+            if not self._entries and not self._dirs:
+                return False
+            for file in list(self._entries):
+                self._remove_file(file)
+            self._dirs.clear()
+            return True
+
+        changed = False
+        seen = set()
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                mtime = os.stat(os.path.join(self.music_dir, rel_dir)).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(rel_dir)
+            node = self._dirs.get(rel_dir)
+            if node is None or node["mtime"] != mtime:
+                node = self._list_dir(rel_dir, mtime, node)
+                changed = True
+            stack.extend(os.path.join(rel_dir, sub) for sub in node["subdirs"])
+
+        # 已被删除的目录
+        for rel_dir in set(self._dirs) - seen:
+            for name in self._dirs.pop(rel_dir)["files"]:
+                self._remove_file(os.path.join(rel_dir, name))
+            changed = True
+        return changed
+
+    def _list_dir(self, rel_dir: str, mtime: int, old_node: Optional[dict]) -> dict:
+        """重新列出一个目录，新增、修改的文件重新读取元数据"""
+        subdirs, files = [], []
+        try:
+            with os.scandir(os.path.join(self.music_dir, rel_dir)) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                        continue
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    if not entry.is_file() or ext not in self.music_ext:
+                        continue
+                    files.append(entry.name)
+                    file = os.path.join(rel_dir, entry.name)
+                    stat = entry.stat()
+                    old = self._entries.get(file)
+                    if (
+                        old is None
+                        or old["mtime"] != stat.st_mtime_ns
+                        or old["size"] != stat.st_size
+                    ):
+                        self._add_file(
+                            file,
+                            {
+                                "mtime": stat.st_mtime_ns,
+                                "size": stat.st_size,
+                                "format": ext.lstrip("."),
+                                "duration": _probe_duration(entry.path, ext),
+                            },
+                        )
+        except OSError as e:
+            logger.bind(tag=TAG).warning(f"读取音乐目录失败: {rel_dir}, {e}")
+
+        if old_node is not None:
+            for name in set(old_node["files"]) - set(files):
+                self._remove_file(os.path.join(rel_dir, name))
+        node = {"mtime": mtime, "subdirs": subdirs, "files": files}
+        self._dirs[rel_dir] = node
+        return node
+
+    def _add_file(self, file: str, entry: dict) -> None:
+        if file in self._entries:
+            self._remove_file(file)
+        self._entries[file] = entry
+        self._index_file(file)
+
+    def _index_file(self, file: str) -> None:
+        keys = _title_keys(os.path.splitext(os.path.basename(file))[0])
+        grams = _grams(keys)
+        self._file_keys[file] = keys
+        self._file_grams[file] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(file)
+
+    def _remove_file(self, file: str) -> None:
+        self._entries.pop(file, None)
+        self._file_keys.pop(file, None)
+        for gram in self._file_grams.pop(file, ()):
+            files = self._postings.get(gram)
+            if files is not None:
+                files.discard(file)
+                if not files:
+                    del self._postings[gram]
+
+    def _load_index(self) -> None:
+        if not self.index_file or not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if (
+                data.get("format_version") != INDEX_FORMAT_VERSION
+                or data.get("music_dir") != self.music_dir
+                or tuple(data.get("music_ext", ())) != self.music_ext
+            ):
+                return
+            self._dirs = data["dirs"]
+            for file, entry in data["entries"].items():
+                self._entries[file] = entry
+                self._index_file(file)
+            self.files = sorted(self._entries)
+            self.names = [os.path.splitext(f)[0] for f in self.files]
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"加载音乐索引失败，将重新建立: {e}")
+            self._dirs, self._entries = {}, {}
+            self._postings, self._file_grams, self._file_keys = {}, {}, {}
+
+    def _save_index(self) -> None:
+        if not self.index_file:
+            return
+        data = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "music_dir": self.music_dir,
+            "music_ext": list(self.music_ext),
+            "dirs": self._dirs,
+            "entries": self._entries,
+        }
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_file)), exist_ok=True)
+            tmp_path = f"{self.index_file}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_file)
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"保存音乐索引失败: {e}")
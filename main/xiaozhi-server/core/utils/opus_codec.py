@@ -0,0 +1,177 @@
+"""
+可复用的Opus编解码器池
+
+编解码器按线程缓存，借出前重置状态，避免每句话、每次上报都重新创建libopus状态。
+同时提供整段PCM的批量编码、逐块PCM的增量编码与Opus帧列表的批量解码接口。
+"""
+
+import ctypes
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Optional, Union
+import opuslib_next
+
+SAMPLE_RATE = 16000
+CHANNELS = 1
+FRAME_DURATION_MS = 60
+
+_thread_local = threading.local()
+
+
+def _free_list(kind: str, key: tuple) -> list:
+    pools = getattr(_thread_local, kind, None)
+    if pools is None:
+        pools = {}
+        setattr(_thread_local, kind, pools)
+    return pools.setdefault(key, [])
+
+
+def _acquire_encoder(sample_rate, channels, application):
+    free = _free_list("encoders", (sample_rate, channels, application))
+    if free:
+        encoder = free.pop()
+        encoder.reset_state()
+        return encoder
+    return opuslib_next.Encoder(sample_rate, channels, application)
+
+
+def _release_encoder(encoder, sample_rate, channels, application):
+    _free_list("encoders", (sample_rate, channels, application)).append(encoder)
+
+
+@contextmanager
+def pooled_encoder(
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = CHANNELS,
+    application: int = opuslib_next.APPLICATION_AUDIO,
+):
+    """借出当前线程缓存的编码器，借出时已重置为初始状态，用完自动归还"""
+    encoder = _acquire_encoder(sample_rate, channels, application)
+    try:
+        yield encoder
+    finally:
+        _release_encoder(encoder, sample_rate, channels, application)
+
+
+@contextmanager
+def pooled_decoder(sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS):
+    """借出当前线程缓存的解码器，借出时已重置为初始状态，用完自动归还"""
+    free = _free_list("decoders", (sample_rate, channels))
+    if free:
+        decoder = free.pop()
+        decoder.reset_state()
+    else:
+        decoder = opuslib_next.Decoder(sample_rate, channels)
+    try:
+        yield decoder
+    finally:
+        free.append(decoder)
+
+
+def _encode_frames(encoder, buffer: bytearray, frame_size: int, frame_bytes: int):
+    """buffer长度须为整帧，每帧直接引用buffer交给libopus，不再逐帧拷贝"""
+    if encoder is None:
+        return [
+            bytes(buffer[offset : offset + frame_bytes])
+            for offset in range(0, len(buffer), frame_bytes)
+        ]
+    frame_type = ctypes.c_char * frame_bytes
+    return [
+        encoder.encode(frame_type.from_buffer(buffer, offset), frame_size)
+        for offset in range(0, len(buffer), frame_bytes)
+    ]
+
+
+def encode_pcm(
+    pcm: Union[bytes, bytearray, memoryview],
+    is_opus: bool = True,
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = CHANNELS,
+    frame_duration_ms: int = FRAME_DURATION_MS,
+) -> List[bytes]:
+    """将一整段16位PCM按帧切分并编码，最后一帧不足时补零
+
+    PCM只在开头整体拷贝一次（用于补零），之后每帧直接引用该缓冲区交给libopus编码。
+    """
+    frame_size = sample_rate * frame_duration_ms // 1000
+    frame_bytes = frame_size * channels * 2
+    length = len(memoryview(pcm).cast("B"))
+    if length == 0:
+        return []
+
+    buffer = bytearray(-(-length // frame_bytes) * frame_bytes)
+    buffer[:length] = pcm
+    if not is_opus:
+        return _encode_frames(None, buffer, frame_size, frame_bytes)
+    with pooled_encoder(sample_rate, channels) as encoder:
+        return _encode_frames(encoder, buffer, frame_size, frame_bytes)
+
+
+class StreamEncoder:
+    """增量编码器：逐块写入PCM，凑满一帧即编码输出，结束时补零编码最后一帧
+
+    在同一个线程中使用，持有期间独占一个池化编码器，close后归还。
+    """
+
+    def __init__(
+        self,
+        is_opus: bool = True,
+        sample_rate: int = SAMPLE_RATE,
+        channels: int = CHANNELS,
+        frame_duration_ms: int = FRAME_DURATION_MS,
+    ):
+        self._key = (sample_rate, channels, opuslib_next.APPLICATION_AUDIO)
+        self.frame_size = sample_rate * frame_duration_ms // 1000
+        self.frame_bytes = self.frame_size * channels * 2
+        self._pending = bytearray()
+        self._encoder = _acquire_encoder(*self._key) if is_opus else None
+
+    def encode(self, pcm) -> List[bytes]:
+        self._pending += pcm
+        usable = len(self._pending) // self.frame_bytes * self.frame_bytes
+        if usable == 0:
+            return []
+        frames = _encode_frames(
+            self._encoder, self._pending[:usable], self.frame_size, self.frame_bytes
+        )
+        del self._pending[:usable]
+        return frames
+
+    def flush(self) -> List[bytes]:
+        if not self._pending:
+            return []
+        self._pending += bytes(self.frame_bytes - len(self._pending))
+        return self.encode(b"")
+
+    def close(self) -> None:
+        if self._encoder is not None:
+            _release_encoder(self._encoder, *self._key)
+            self._encoder = None
+
+
+def decode_opus(
+    opus_datas: Iterable[bytes],
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = CHANNELS,
+    frame_duration_ms: int = FRAME_DURATION_MS,
+    on_error: Optional[Callable[[int, Exception], None]] = None,
+) -> List[bytes]:
+    """用同一个解码器按顺序解码Opus帧列表，返回每帧的PCM数据
+
+    空包与解码失败的包会被跳过，失败时调用on_error(index, error)。
+    """
+    frame_size = sample_rate * frame_duration_ms // 1000
+    pcm_frames = []
+    with pooled_decoder(sample_rate, channels) as decoder:
+        for i, opus_packet in enumerate(opus_datas):
+            if not opus_packet:
+                continue
+            try:
+                pcm_frame = decoder.decode(opus_packet, frame_size)
+            except opuslib_next.OpusError as e:
+                if on_error is not None:
+                    on_error(i, e)
+                continue
+            if pcm_frame:
+                pcm_frames.append(pcm_frame)
+    return pcm_frames
@@ -1,59 +1,77 @@
+import io
+import os
+import mmap
 import struct
+import threading
 
-def decode_opus_from_file(input_file):
+# 每帧头部（4字节）：[1字节类型，1字节保留，2字节长度]
+_HEADER = struct.Struct('>BBH')
+FRAME_DURATION_MS = 60  # 帧时长
+
+
+def iter_opus_from_file(input_file):
     """
-    从p3文件中解码 Opus 数据，并返回一个 Opus 数据包的列表以及总时长。
+    以内存映射方式逐帧读取p3文件中的 Opus 数据包，不需要先把整个文件读入内存。
     """
-    opus_datas = []
-    total_frames = 0
-    sample_rate = 16000  # 文件采样率
-    frame_duration_ms = 60  # 帧时长
-    frame_size = int(sample_rate * frame_duration_ms / 1000)
-
     with open(input_file, 'rb') as f:
-        while True:
-            # 读取头部（4字节）：[1字节类型，1字节保留，2字节长度]
-            header = f.read(4)
-            if not header:
-                break
-
-            # 解包头部信息
-            _, _, data_len = struct.unpack('>BBH', header)
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset + _HEADER.size <= len(data):
+                _, _, data_len = _HEADER.unpack_from(data, offset)
+                offset += _HEADER.size
+                if offset + data_len > len(data):
+                    raise ValueError(f"Data length({len(data) - offset}) mismatch({data_len}) in the file.")
+                yield data[offset:offset + data_len]
+                offset += data_len
 
-            # 根据头部指定的长度读取 Opus 数据
-            opus_data = f.read(data_len)
-            if len(opus_data) != data_len:
-                raise ValueError(f"Data length({len(opus_data)}) mismatch({data_len}) in the file.")
 
-            opus_datas.append(opus_data)
-            total_frames += 1
+def decode_opus_from_file(input_file):
+    """
+    从p3文件中解码 Opus 数据，并返回一个 Opus 数据包的列表以及总时长。
+    """
+    opus_datas = list(iter_opus_from_file(input_file))
 
     # 计算总时长
-    total_duration = (total_frames * frame_duration_ms) / 1000.0
+    total_duration = (len(opus_datas) * FRAME_DURATION_MS) / 1000.0
     return opus_datas, total_duration
 
 def decode_opus_from_bytes(input_bytes):
     """
     从p3二进制数据中解码 Opus 数据，并返回一个 Opus 数据包的列表以及总时长。
     """
-    import io
     opus_datas = []
     total_frames = 0
-    sample_rate = 16000  # 文件采样率
-    frame_duration_ms = 60  # 帧时长
-    frame_size = int(sample_rate * frame_duration_ms / 1000)
 
     f = io.BytesIO(input_bytes)
     while True:
         header = f.read(4)
         if not header:
             break
-        _, _, data_len = struct.unpack('>BBH', header)
+        _, _, data_len = _HEADER.unpack(header)
         opus_data = f.read(data_len)
         if len(opus_data) != data_len:
             raise ValueError(f"Data length({len(opus_data)}) mismatch({data_len}) in the bytes.")
         opus_datas.append(opus_data)
         total_frames += 1
 
-    total_duration = (total_frames * frame_duration_ms) / 1000.0
-    return opus_datas, total_duration
\ No newline at end of file
+    total_duration = (total_frames * FRAME_DURATION_MS) / 1000.0
+    return opus_datas, total_duration
+
+def write_opus_frames(f, opus_datas):
+    """
+    将 Opus 数据包按p3格式逐帧写入已打开的文件。
+    """
+    for opus_data in opus_datas:
+        f.write(_HEADER.pack(0, 0, len(opus_data)))
+        f.write(opus_data)
+
+def encode_opus_to_file(opus_datas, output_file):
+    """
+    将 Opus 数据包列表写为p3文件。先写临时文件再替换，避免并发读取到不完整的文件。
+    """
+    tmp_file = f"{output_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'wb') as f:
+        write_opus_frames(f, opus_datas)
+    os.replace(tmp_file, output_file)
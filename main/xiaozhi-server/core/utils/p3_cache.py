@@ -0,0 +1,174 @@
+"""
+本地音乐与提示音的预转码缓存
+
+把音乐目录、config/assets 下的音频统一转码为p3（16kHz单声道、60ms一帧的Opus帧序列）保存到缓存目录，
+之后播放时以内存映射方式直接读取帧，省去每次的解码、重采样与Opus编码。
+缓存键包含源文件的路径、大小与修改时间，源文件变化后会重新转码。
+服务启动时在后台线程中转码尚未缓存的文件；播放时遇到未缓存的文件，照常转码后顺便写入缓存。
+"""
+
+import os
+import hashlib
+import threading
+from typing import Iterable, Optional
+from config.logger import setup_logging
+from core.utils import p3
+from core.utils.audio_codec import decode_to_pcm16
+from core.utils.opus_codec import encode_pcm
+
+TAG = __name__
+logger = setup_logging()
+
+# 后台预转码的文件类型
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg", ".opus", ".flac", ".m4a", ".aac")
+
+
+class P3Cache:
+    """预转码缓存，由WebSocketServer在启动时配置，所有连接共享"""
+
+    def __init__(self):
+        self.enabled = False
+        self.cache_dir = None
+        self.roots = []
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "transcoded": 0, "failed": 0}
+        self._warm_thread = None
+
+    def configure(self, config: Optional[dict], default_dirs: Iterable[str]) -> None:
+        config = config or {}
+        enabled = config.get("enabled", True)
+        self.enabled = enabled not in (False, "false", "False", "0", 0)
+        self.cache_dir = os.path.abspath(config.get("cache_dir") or "data/p3_cache")
+        dirs = config.get("dirs") or list(default_dirs)
+        self.roots = [os.path.abspath(d) + os.sep for d in dirs if d]
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if self._warm_thread is None or not self._warm_thread.is_alive():
+            self._warm_thread = threading.Thread(
+                target=self._warm, daemon=True, name="p3-precache"
+            )
+            self._warm_thread.start()
+
+    def cache_path(self, audio_file_path: str) -> Optional[str]:
+        """返回源文件对应的p3缓存路径，不在预转码目录内或本身就是p3时返回None"""
+        if not self.enabled or audio_file_path.lower().endswith(".p3"):
+            return None
+        path = os.path.abspath(audio_file_path)
+        if not any(path.startswith(root) for root in self.roots):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        raw = f"{path}\n{stat.st_size}\n{stat.st_mtime_ns}".encode("utf-8")
+        key = hashlib.sha1(raw).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.p3")
+
+    def load(self, cache_path: Optional[str]):
+        """读取已缓存的帧，未缓存时返回None"""
+        if cache_path is None:
+            return None
+        if not os.path.exists(cache_path):
+            self._count("misses")
+            return None
+        try:
+            opus_datas, duration = p3.decode_opus_from_file(cache_path)
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"读取预转码缓存失败: {cache_path}, {e}")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return opus_datas, duration
+
+    def store(self, cache_path: Optional[str], opus_datas) -> None:
+        if cache_path is None or not opus_datas:
+            return
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            p3.encode_opus_to_file(opus_datas, cache_path)
+            self._count("transcoded")
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"写入预转码缓存失败: {cache_path}, {e}")
+
+    def open_writer(self, cache_path: Optional[str]) -> Optional["P3CacheWriter"]:
+        """边播放边写入缓存，完整读完源文件后才生效"""
+        if cache_path is None:
+            return None
+        self._count("misses")
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            return P3CacheWriter(self, cache_path)
+        except OSError as e:
+            logger.bind(tag=TAG).warning(f"写入预转码缓存失败: {cache_path}, {e}")
+            return None
+
+    def count_hit(self) -> None:
+        self._count("hits")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["enabled"] = self.enabled
+        return stats
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _warm(self) -> None:
+        """后台逐个转码预转码目录中尚未缓存的音频文件"""
+        for root in self.roots:
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    ext = os.path.splitext(filename)[1].lower()
+                    if ext not in AUDIO_EXTENSIONS:
+                        continue
+                    source = os.path.join(dirpath, filename)
+                    cache_path = self.cache_path(source)
+                    if cache_path is None or os.path.exists(cache_path):
+                        continue
+                    try:
+                        with open(source, "rb") as f:
+                            pcm = decode_to_pcm16(f.read(), ext.lstrip("."))
+                        self.store(cache_path, encode_pcm(pcm))
+                    except Exception as e:
+                        self._count("failed")
+                        logger.bind(tag=TAG).warning(f"预转码失败: {source}, {e}")
+        logger.bind(tag=TAG).info(f"音频预转码完成: {self.get_stats()}")
+
+
+class P3CacheWriter:
+    """逐批写入p3缓存的临时文件，commit时替换为正式文件，abort时删除"""
+
+    def __init__(self, cache: P3Cache, cache_path: str):
+        self._cache = cache
+        self._cache_path = cache_path
+        self._tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, opus_datas) -> None:
+        if self._file is not None:
+            p3.write_opus_frames(self._file, opus_datas)
+
+    def commit(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self._cache_path)
+        self._cache._count("transcoded")
+
+    def abort(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+# 全局预转码缓存实例
+p3_cache = P3Cache()
@@ -0,0 +1,97 @@
+"""
+LLM请求的前缀复用统计
+
+对每个设备记录上一轮请求各条消息的累积哈希，与本轮请求比较得到两轮之间相同的前缀长度。
+vLLM、Ollama等服务只能对相同的前缀复用KV缓存，前缀复用率越高，预填充耗时越短。
+"""
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+from core.utils.dialogue import estimate_tokens
+
+# 最多记录的设备数，超出时淘汰最久未请求的设备
+MAX_DEVICES = 1000
+
+
+def _hash_chain(messages: List[Dict]):
+    """返回每条消息处的(累积哈希, 累积token数)"""
+    chain = []
+    digest = hashlib.sha1()
+    tokens = 0
+    for message in messages:
+        raw = json.dumps(message, ensure_ascii=False, sort_keys=True, default=str)
+        digest.update(raw.encode("utf-8"))
+        tokens += estimate_tokens(raw)
+        chain.append((digest.copy().hexdigest()[:16], tokens))
+    return chain
+
+
+class PrefixStats:
+    """按设备统计相邻两轮LLM请求的前缀复用情况，所有连接共享"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chains: "OrderedDict[str, list]" = OrderedDict()
+        self._devices: "OrderedDict[str, dict]" = OrderedDict()
+        self._totals = {"requests": 0, "prompt_tokens": 0, "reused_tokens": 0}
+
+    def record(self, device_id: str, messages: List[Dict], tools=None) -> int:
+        """记录一次请求，返回与该设备上一次请求相同的前缀token数（估算）
+
+        大多数对话模板把工具列表放在消息之前，因此工具列表也计入前缀。
+        """
+        chain = _hash_chain(([{"tools": tools}] if tools else []) + list(messages))
+        total_tokens = chain[-1][1] if chain else 0
+        with self._lock:
+            previous = self._chains.pop(device_id, None) or []
+            reused_messages = 0
+            for (current, _), (last, _) in zip(chain, previous):
+                if current != last:
+                    break
+                reused_messages += 1
+            reused_tokens = chain[reused_messages - 1][1] if reused_messages else 0
+
+            self._chains[device_id] = chain
+            stats = self._devices.pop(device_id, None) or {
+                "requests": 0,
+                "prompt_tokens": 0,
+                "reused_tokens": 0,
+            }
+            stats["requests"] += 1
+            stats["prompt_tokens"] += total_tokens
+            stats["reused_tokens"] += reused_tokens
+            stats["last_prefix_hash"] = chain[0][0] if chain else None
+            stats["last_reused_messages"] = reused_messages
+            self._devices[device_id] = stats
+            while len(self._devices) > MAX_DEVICES:
+                evicted, _ = self._devices.popitem(last=False)
+                self._chains.pop(evicted, None)
+
+            self._totals["requests"] += 1
+            self._totals["prompt_tokens"] += total_tokens
+            self._totals["reused_tokens"] += reused_tokens
+        return reused_tokens
+
+    @staticmethod
+    def _reuse_rate(stats: dict) -> float:
+        if not stats["prompt_tokens"]:
+            return 0.0
+        return round(stats["reused_tokens"] / stats["prompt_tokens"], 4)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            devices = {
+                device_id: dict(stats, reuse_rate=self._reuse_rate(stats))
+                for device_id, stats in self._devices.items()
+            }
+            totals = dict(self._totals)
+        totals["reuse_rate"] = self._reuse_rate(totals)
+        totals["devices"] = devices
+        return totals
+
+
+# 全局前缀复用统计实例
+prefix_stats = PrefixStats()
@@ -0,0 +1,119 @@
+"""
+按配置共享的ASR/TTS提供者实例
+
+远程ASR与TTS原先每个设备连接都重新实例化一次提供者：重新解析配置、获取鉴权Token、创建SDK客户端等。
+这里按配置指纹（模块名+模块配置）只实例化一次作为原型，新连接从原型fork出只包含队列与会话状态的会话对象；
+本地ASR本身可以被多个连接共享，直接返回原型。
+"""
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from config.logger import setup_logging
+from core.providers.asr.dto.dto import InterfaceType
+from core.utils.modules_initialize import initialize_asr, initialize_tts
+
+TAG = __name__
+logger = setup_logging()
+
+
+def _fingerprint(kind: str, config: Dict[str, Any]) -> str:
+    module = config["selected_module"][kind]
+    raw = json.dumps(
+        {
+            "module": module,
+            "config": config[kind][module],
+            "delete_audio": str(config.get("delete_audio", True)),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return f"{kind}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+class ProviderEngines:
+    """ASR/TTS提供者原型，由WebSocketServer在启动时配置，所有连接共享"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines: "OrderedDict[str, Any]" = OrderedDict()
+        # 同一配置只实例化一次，其他连接等待其完成
+        self._building: Dict[str, threading.Lock] = {}
+        self._stats = {"hits": 0, "builds": 0}
+        self.configure({})
+
+    def configure(self, config: Optional[dict]) -> None:
+        config = config or {}
+        enabled = config.get("enabled", True)
+        max_engines = config.get("max_engines")
+        self.enabled = enabled not in (False, "false", "False", "0", 0)
+        self.max_engines = int(max_engines) if max_engines else 64
+        with self._lock:
+            self._engines.clear()
+
+    def tts(self, config: Dict[str, Any]):
+        """返回当前连接使用的TTS实例"""
+        if not self.enabled:
+            return initialize_tts(config)
+        return self._engine("TTS", config, initialize_tts).fork()
+
+    def asr(self, config: Dict[str, Any]):
+        """返回当前连接使用的ASR实例，本地ASR所有连接共用同一实例"""
+        if not self.enabled:
+            return initialize_asr(config)
+        engine = self._engine("ASR", config, initialize_asr)
+        if engine.interface_type == InterfaceType.LOCAL:
+            return engine
+        return engine.fork()
+
+    def _engine(self, kind: str, config: Dict[str, Any], build):
+        key = _fingerprint(kind, config)
+        engine = self._get(key)
+        if engine is not None:
+            return engine
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            engine = self._get(key)
+            if engine is not None:
+                return engine
+            try:
+                engine = build(config)
+            except Exception:
+                with self._lock:
+                    self._building.pop(key, None)
+                raise
+            # 先放入原型再移除构建锁，两步在同一把锁内完成：
+            # 否则其他线程可能在两步之间新建构建锁且查不到原型，再实例化一次
+            with self._lock:
+                self._stats["builds"] += 1
+                self._engines[key] = engine
+                while len(self._engines) > self.max_engines:
+                    self._engines.popitem(last=False)
+                self._building.pop(key, None)
+            logger.bind(tag=TAG).info(
+                f"实例化{kind}提供者: {config['selected_module'][kind]}"
+            )
+            return engine
+
+    def _get(self, key: str):
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is not None:
+                self._engines.move_to_end(key)
+                self._stats["hits"] += 1
+            return engine
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["engines"] = len(self._engines)
+        stats["enabled"] = self.enabled
+        return stats
+
+
+# 全局提供者原型实例
+provider_engines = ProviderEngines()
@@ -0,0 +1,395 @@
+"""
+聊天记录批量上报管道
+
+原先每条ASR/TTS记录在report线程池中单独转码、单独请求manager-api，失败时在线程中sleep重试，
+manager-api变慢时report线程被重试占满，上报任务越积越多。这里改为全服务共享的上报管道：
+- Opus转WAV仍在report线程池中执行，线程数有上限，不占用事件循环与实时链路的线程
+- 转码后的记录进入全服务共享的待发送队列，由一个发送线程把多个设备的记录合并为一次批量请求
+- 请求失败时不在线程中重试，记录写入本地落盘队列，之后按退避间隔补发；待发送记录过多时也先落盘
+- 服务退出时先等待转码中的记录（最多等待close的timeout），再把未发送的记录落盘
+- 落盘队列在服务重启后继续补发；manager-api不支持批量接口时退回逐条上报
+"""
+
+import os
+import json
+import time
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from config.logger import setup_logging
+from config.manage_api_client import (
+    ManageApiClient,
+    build_report_record,
+    report_batch,
+    report_record,
+)
+from core.handle.reportHandle import opus_to_wav
+
+TAG = __name__
+logger = setup_logging()
+
+
+class SpillQueue:
+    """本地落盘队列，每个文件保存一批记录（每行一条JSON），按文件名顺序补发"""
+
+    def __init__(self, spill_dir: str, max_bytes: int):
+        self.spill_dir = spill_dir
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._seq = 0
+        os.makedirs(spill_dir, exist_ok=True)
+        # 上次运行留下的文件，启动后继续补发
+        names = sorted(n for n in os.listdir(spill_dir) if n.endswith(".jsonl"))
+        self._files = deque(names)
+        self._bytes = sum(self._size(n) for n in names)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.spill_dir, name)
+
+    def _size(self, name: str) -> int:
+        try:
+            return os.path.getsize(self._path(name))
+        except OSError:
+            return 0
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        data = "".join(
+            json.dumps(record, ensure_ascii=False) + "\n" for record in records
+        ).encode("utf-8")
+        with self._lock:
+            self._seq += 1
+            name = f"{time.time_ns():020d}-{self._seq:06d}.jsonl"
+            path = self._path(name)
+            # 先写临时文件再改名，进程中途退出也不会留下半个文件
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            self._files.append(name)
+            self._bytes += len(data)
+            # 超出容量时丢弃最早的记录
+            while self._bytes > self.max_bytes and len(self._files) > 1:
+                self._drop(self._files.popleft())
+
+    def peek(self, max_records: int) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """读取最早的若干文件，记录数不超过max_records（至少一个文件），不删除"""
+        names, records = [], []
+        with self._lock:
+            for name in list(self._files):
+                try:
+                    with open(self._path(name), "rb") as f:
+                        batch = [json.loads(line) for line in f if line.strip()]
+                except (OSError, ValueError) as e:
+                    logger.bind(tag=TAG).warning(f"上报落盘文件损坏，已丢弃: {name}, {e}")
+                    self._files.remove(name)
+                    self._drop(name)
+                    continue
+                if names and len(records) + len(batch) > max_records:
+                    break
+                names.append(name)
+                records.extend(batch)
+        return names, records
+
+    def ack(self, names: List[str]) -> None:
+        """删除已补发成功的文件"""
+        with self._lock:
+            for name in names:
+                if name in self._files:
+                    self._files.remove(name)
+                    self._bytes -= self._size(name)
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+
+    def _drop(self, name: str) -> None:
+        path = self._path(name)
+        try:
+            with open(path, "rb") as f:
+                self.dropped += sum(1 for line in f if line.strip())
+        except OSError:
+            pass
+        self._bytes -= self._size(name)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ReportPipeline:
+    """全服务共享的聊天记录上报管道，由WebSocketServer在启动时配置"""
+
+    def __init__(self):
+        self.enabled = False
+        self._scheduler = None
+        self._spill: Optional[SpillQueue] = None
+        self._cond = threading.Condition()
+        # (进入队列的时间, 记录)
+        self._pending = deque()
+        # report线程池中尚未完成转码的任务
+        self._preparing = set()
+        self._thread = None
+        self._closed = False
+        # 所连接的manager-api是否支持批量上报接口
+        self._batch_supported = True
+        self._retry_at = 0.0
+        self._stats = {
+            "submitted": 0,
+            "sent": 0,
+            "batches": 0,
+            "spilled": 0,
+            "resent": 0,
+            "failed": 0,
+        }
+        self.configure({}, None)
+
+    def configure(self, config: Optional[dict], scheduler) -> None:
+        config = config or {}
+        enabled = config.get("enabled", True)
+        batch_size = config.get("batch_size")
+        flush_interval = config.get("flush_interval")
+        max_pending = config.get("max_pending")
+        retry_interval = config.get("retry_interval")
+        max_retry_interval = config.get("max_retry_interval")
+        spill_max_mb = config.get("spill_max_mb")
+        self.batch_size = int(batch_size) if batch_size else 20
+        self.flush_interval = float(flush_interval) if flush_interval else 1
+        self.max_pending = int(max_pending) if max_pending else 1000
+        self.retry_interval = float(retry_interval) if retry_interval else 5
+        self.max_retry_interval = (
+            float(max_retry_interval) if max_retry_interval else 60
+        )
+        self._retry_delay = self.retry_interval
+        self._scheduler = scheduler
+        # 没有线程池时无法转码，保持原有的逐条上报
+        self.enabled = (
+            enabled not in (False, "false", "False", "0", 0) and scheduler is not None
+        )
+        if not self.enabled:
+            return
+        spill_dir = os.path.abspath(config.get("spill_dir") or "data/report_spill")
+        spill_max_mb = float(spill_max_mb) if spill_max_mb else 200
+        spill_max_bytes = int(spill_max_mb * 1024 * 1024)
+        if self._spill is None or self._spill.spill_dir != spill_dir:
+            self._spill = SpillQueue(spill_dir, spill_max_bytes)
+        else:
+            self._spill.max_bytes = spill_max_bytes
+        self._closed = False
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, daemon=True, name="report-sender"
+            )
+            self._thread.start()
+
+    def submit(self, conn, chat_type: int, text: str, opus_data, report_time) -> None:
+        """提交一条聊天记录，转码与发送都在后台进行"""
+        if not text:
+            return
+        future = self._scheduler.submit(
+            "report",
+            conn.device_id,
+            self._prepare,
+            conn,
+            conn.device_id,
+            conn.session_id,
+            chat_type,
+            text,
+            opus_data,
+            report_time,
+        )
+        with self._cond:
+            self._preparing.add(future)
+        future.add_done_callback(self._prepared)
+
+    def _prepared(self, future: concurrent.futures.Future) -> None:
+        with self._cond:
+            self._preparing.discard(future)
+
+    def _prepare(
+        self, conn, device_id, session_id, chat_type, text, opus_data, report_time
+    ) -> None:
+        try:
+            audio = opus_to_wav(conn, opus_data) if opus_data else None
+            record = build_report_record(
+                device_id, session_id, chat_type, text, audio, report_time
+            )
+        except Exception as e:
+            conn.logger.bind(tag=TAG).error(f"聊天记录上报失败: {e}")
+            return
+        self._put(record)
+
+    def _put(self, record: Dict[str, Any]) -> None:
+        overflow = None
+        with self._cond:
+            self._stats["submitted"] += 1
+            if self._closed:
+                # 服务退出后才完成转码的记录，发送线程已退出，直接落盘
+                overflow = [record]
+            else:
+                self._pending.append((time.monotonic(), record))
+            if len(self._pending) > self.max_pending:
+                # 发送跟不上时把最早的一批先落盘，内存中的待发送记录有上限
+                count = min(self.batch_size, len(self._pending))
+                overflow = [self._pending.popleft()[1] for _ in range(count)]
+            self._cond.notify()
+        if overflow:
+            self._spill_records(overflow)
+
+    def _spill_records(self, records: List[Dict[str, Any]]) -> None:
+        try:
+            self._spill.append(records)
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"聊天记录落盘失败，丢弃{len(records)}条: {e}")
+            self._count("failed", len(records))
+            return
+        self._count("spilled", len(records))
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._cond:
+            self._stats[name] += n
+
+    def _run(self) -> None:
+        while not self._closed:
+            try:
+                self._step()
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"聊天记录上报线程异常: {e}")
+                time.sleep(self.flush_interval)
+
+    def _step(self) -> None:
+        batch = self._take()
+        backing_off = time.monotonic() < self._retry_at
+        if batch:
+            unsent = batch if backing_off else self._send(batch)
+            if unsent:
+                self._spill_records(unsent)
+            return
+        if not backing_off and len(self._spill):
+            names, records = self._spill.peek(self.batch_size)
+            if records:
+                unsent = self._send(records)
+                if len(unsent) < len(records):
+                    # 部分补发成功时，剩余记录重新落盘
+                    self._spill.ack(names)
+                    self._count("resent", len(records) - len(unsent))
+                    if unsent:
+                        self._spill.append(unsent)
+                return
+        with self._cond:
+            if not self._pending and not self._closed:
+                self._cond.wait(self.flush_interval)
+
+    def _take(self) -> List[Dict[str, Any]]:
+        """凑满一批，或最早的记录已等待flush_interval时，取出一批待发送记录"""
+        with self._cond:
+            while self._pending and not self._closed:
+                if len(self._pending) >= self.batch_size:
+                    break
+                remaining = self._pending[0][0] + self.flush_interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(self.batch_size, len(self._pending))
+            return [self._pending.popleft()[1] for _ in range(count)]
+
+    def _send(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """发送一批记录，返回因manager-api暂时不可用而未发送的记录"""
+        if ManageApiClient._instance is None:
+            self._backoff()
+            return records
+        if self._batch_supported and len(records) > 1:
+            try:
+                report_batch(records)
+                self._sent(records)
+                return []
+            except Exception as e:
+                if ManageApiClient._should_retry(e):
+                    self._backoff(e)
+                    return records
+                if isinstance(e, httpx.HTTPStatusError) and (
+                    e.response.status_code in (404, 405)
+                ):
+                    self._batch_supported = False
+                    logger.bind(tag=TAG).info("manager-api不支持批量上报，改为逐条上报")
+                # 其他业务错误多为个别记录不合法，逐条重发以免整批丢弃
+        for i, record in enumerate(records):
+            try:
+                report_record(record)
+                self._sent([record])
+            except Exception as e:
+                if ManageApiClient._should_retry(e):
+                    self._backoff(e)
+                    return records[i:]
+                self._count("failed")
+                logger.bind(tag=TAG).error(f"聊天记录上报失败: {e}")
+        return []
+
+    def _sent(self, records: List[Dict[str, Any]]) -> None:
+        self._retry_delay = self.retry_interval
+        with self._cond:
+            self._stats["sent"] += len(records)
+            self._stats["batches"] += 1
+
+    def _backoff(self, error: Optional[Exception] = None) -> None:
+        self._retry_at = time.monotonic() + self._retry_delay
+        if error is not None:
+            logger.bind(tag=TAG).warning(
+                f"manager-api暂时不可用，聊天记录已落盘，{self._retry_delay:.1f}秒后补发: {error}"
+            )
+        self._retry_delay = min(self._retry_delay * 2, self.max_retry_interval)
+
+    def close(self, timeout: float = 5) -> None:
+        """服务退出时调用，等待转码中的记录后把尚未发送的记录落盘，下次启动后补发
+
+        转码超过timeout仍未完成的记录会丢失。
+        """
+        if not self.enabled:
+            return
+        with self._cond:
+            preparing = list(self._preparing)
+        if preparing:
+            _, not_done = concurrent.futures.wait(preparing, timeout)
+            if not_done:
+                logger.bind(tag=TAG).warning(
+                    f"服务退出时仍有{len(not_done)}条聊天记录在转码，已丢弃"
+                )
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._cond:
+            records = [record for _, record in self._pending]
+            self._pending.clear()
+        if records:
+            self._spill_records(records)
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+            stats["preparing"] = len(self._preparing)
+        stats["enabled"] = self.enabled
+        stats["batch_supported"] = self._batch_supported
+        stats["backing_off"] = time.monotonic() < self._retry_at
+        if self._spill is not None:
+            stats["spill_files"] = len(self._spill)
+            stats["spill_bytes"] = self._spill.size
+            stats["spill_dropped"] = self._spill.dropped
+        return stats
+
+
+# 全局聊天记录上报管道实例
+report_pipeline = ReportPipeline()
@@ -0,0 +1,201 @@
+"""
+服务器级共享任务调度器
+
+所有连接共享一组具名线程池（llm、llm_io、intent、asr、tts、report、tools、session），线程总数有上限。
+每个线程池内部按连接轮询取任务，避免单个连接的大量任务饿死其他连接。
+"""
+
+import asyncio
+import threading
+import concurrent.futures
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Hashable, Optional
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+_thread_local = threading.local()
+
+# 各线程池默认线程数
+DEFAULT_POOL_SIZES = {
+    "llm": 32,
+    # 无异步接口的LLM服务逐块读取响应，不能与等待这些读取的对话线程共用llm线程池
+    "llm_io": 32,
+    # 意图识别不能排在正在流式输出的对话之后，单独使用一个线程池
+    "intent": 8,
+    "asr": 16,
+    "tts": 32,
+    "report": 4,
+    "tools": 16,
+    "session": 8,
+}
+
+
+def run_coroutine_sync(coro) -> Any:
+    """在当前工作线程中执行协程
+
+    复用线程私有的事件循环，避免每次调用都新建、销毁事件循环。
+    只能在没有运行中事件循环的线程（如线程池工作线程）中调用。
+    """
+    loop = getattr(_thread_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _thread_local.loop = loop
+    asyncio.set_event_loop(loop)
+    return loop.run_until_complete(coro)
+
+
+class FairThreadPool:
+    """按连接公平调度的有界线程池，线程按需创建，不超过max_workers"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(int(max_workers), 1)
+        self._cond = threading.Condition()
+        # 每个连接一个FIFO队列，按OrderedDict顺序轮询
+        self._queues: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self._threads = []
+        self._idle = 0
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+
+    def submit(
+        self, key: Hashable, fn: Callable, *args, **kwargs
+    ) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        with self._cond:
+            self._queues.setdefault(key, deque()).append((future, fn, args, kwargs))
+            self._queued += 1
+            if self._queued > self._idle and len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._worker,
+                    daemon=True,
+                    name=f"{self.name}-{len(self._threads)}",
+                )
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+        return future
+
+    def cancel(self, key: Hashable) -> int:
+        """取消某个连接尚未开始执行的任务"""
+        with self._cond:
+            tasks = self._queues.pop(key, None)
+            if not tasks:
+                return 0
+            self._queued -= len(tasks)
+        for future, _, _, _ in tasks:
+            future.cancel()
+        return len(tasks)
+
+    def _next_task(self):
+        # 轮询：取队首连接的一个任务，若该连接还有任务则排到队尾
+        key, tasks = next(iter(self._queues.items()))
+        task = tasks.popleft()
+        if tasks:
+            self._queues.move_to_end(key)
+        else:
+            del self._queues[key]
+        self._queued -= 1
+        return task
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                self._idle += 1
+                while not self._queues:
+                    self._cond.wait()
+                self._idle -= 1
+                future, fn, args, kwargs = self._next_task()
+                self._active += 1
+
+            failed = False
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        failed = True
+                        future.set_exception(e)
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"{self.name} 线程池任务异常: {e}")
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    if failed:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_workers": self.max_workers,
+                "threads": len(self._threads),
+                "active": self._active,
+                "queued": self._queued,
+                "waiting_connections": len(self._queues),
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+
+class TaskScheduler:
+    """具名线程池集合，由WebSocketServer持有，所有连接共享"""
+
+    def __init__(self, config: Optional[dict] = None):
+        pool_sizes = dict(DEFAULT_POOL_SIZES)
+        pool_sizes.update((config or {}).get("pools", {}) or {})
+        self.pools: Dict[str, FairThreadPool] = {
+            name: FairThreadPool(name, size) for name, size in pool_sizes.items()
+        }
+
+    def submit(
+        self, pool: str, key: Hashable, fn: Callable, *args, **kwargs
+    ) -> concurrent.futures.Future:
+        return self.pools[pool].submit(key, fn, *args, **kwargs)
+
+    def cancel(self, key: Hashable) -> int:
+        """取消某个连接在所有线程池中排队的任务"""
+        return sum(pool.cancel(key) for pool in self.pools.values())
+
+    def executor_for(self, key: Hashable, default_pool: str = "llm"):
+        return ConnectionExecutor(self, key, default_pool)
+
+    @property
+    def thread_budget(self) -> int:
+        return sum(pool.max_workers for pool in self.pools.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "thread_budget": self.thread_budget,
+            "pools": {name: pool.get_stats() for name, pool in self.pools.items()},
+        }
+
+
+class ConnectionExecutor:
+    """连接级别的任务提交入口，任务实际在服务器共享线程池中执行"""
+
+    def __init__(self, scheduler: TaskScheduler, key: Hashable, default_pool: str):
+        self.scheduler = scheduler
+        self.key = key
+        self.default_pool = default_pool
+
+    def submit(self, fn: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        return self.scheduler.submit(self.default_pool, self.key, fn, *args, **kwargs)
+
+    def submit_to(
+        self, pool: str, fn: Callable, *args, **kwargs
+    ) -> concurrent.futures.Future:
+        return self.scheduler.submit(pool, self.key, fn, *args, **kwargs)
+
+    async def run(self, pool: str, fn: Callable, *args, **kwargs) -> Any:
+        """在共享线程池中执行阻塞函数并在事件循环中等待结果"""
+        return await asyncio.wrap_future(self.submit_to(pool, fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = False) -> None:
+        """连接关闭时取消尚未执行的任务，正在执行的任务不受影响"""
+        self.scheduler.cancel(self.key)
@@ -1,4 +1,5 @@
 import json
+import unicodedata
 
 TAG = __name__
 EMOJI_MAP = {
@@ -49,6 +50,16 @@ def get_string_no_punctuation_or_emoji(s):
     return "".join(chars[start : end + 1])
 
 
+def remove_punctuation_and_emoji(s):
+    """去除字符串中所有位置的空白、标点符号和表情符号"""
+    return "".join(
+        char
+        for char in s
+        if not is_punctuation_or_emoji(char)
+        and not unicodedata.category(char).startswith("P")
+    )
+
+
 def is_punctuation_or_emoji(char):
     """检查字符是否为空格、指定标点或表情符号"""
     # 定义需要去除的中英文标点（包括全角/半角）
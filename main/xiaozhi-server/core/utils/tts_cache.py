@@ -0,0 +1,161 @@
+"""
+按内容寻址的TTS音频缓存
+
+以 (TTS提供者及其配置, 归一化文本, 音频格式) 为键，缓存合成后的Opus/PCM帧列表。
+内存层使用全局缓存管理器的LRU空间，可选的磁盘层在服务重启后仍然有效。
+适用于欢迎语、字数超限提示、绑定码提示、插件直接回复等反复出现的固定文本。
+"""
+
+import os
+import re
+import json
+import struct
+import hashlib
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional
+from config.logger import setup_logging
+from core.utils.cache.manager import cache_manager
+from core.utils.cache.config import CacheConfig, CacheType
+from core.utils.cache.strategies import CacheStrategy
+
+TAG = __name__
+logger = setup_logging()
+
+# 磁盘文件中每一帧的长度前缀
+_FRAME_HEADER = struct.Struct(">I")
+
+
+def provider_namespace(provider, config: dict) -> str:
+    """根据TTS提供者类型及其配置生成命名空间，配置（音色、模型等）变化后自动失效"""
+    digest = hashlib.sha1(
+        json.dumps(config, sort_keys=True, ensure_ascii=False, default=str).encode(
+            "utf-8"
+        )
+    ).hexdigest()[:16]
+    return f"{type(provider).__module__}:{digest}"
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本：全角转半角、去除首尾及连续空白"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class TTSCache:
+    """TTS音频帧缓存，由WebSocketServer持有，所有连接共享"""
+
+    def __init__(self, config: Optional[dict] = None):
+        config = config or {}
+        enabled = config.get("enabled", True)
+        max_entries = config.get("max_entries", "500")
+        max_text_length = config.get("max_text_length", "50")
+
+        self.enabled = enabled not in (False, "false", "False", "0", 0)
+        self.max_text_length = int(max_text_length) if max_text_length else 50
+        self.disk_dir = config.get("disk_dir") or None
+        if self.enabled and self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        cache_manager.configure(
+            CacheType.TTS_AUDIO,
+            CacheConfig(
+                strategy=CacheStrategy.LRU,
+                ttl=None,
+                max_size=int(max_entries) if max_entries else 500,
+            ),
+        )
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def make_key(self, namespace: str, text: str, audio_format: str) -> Optional[str]:
+        """生成缓存键，文本为空或过长（不太可能重复出现）时返回None"""
+        if not self.enabled:
+            return None
+        text = normalize_text(text)
+        if not text or len(text) > self.max_text_length:
+            return None
+        raw = f"{namespace}\n{audio_format}\n{text}".encode("utf-8")
+        return hashlib.sha1(raw).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[List[bytes]]:
+        if key is None:
+            return None
+        frames = cache_manager.get(CacheType.TTS_AUDIO, key)
+        if frames is not None:
+            self._count("memory_hits")
+            return frames
+
+        frames = self._load(key)
+        if frames is not None:
+            # 磁盘命中后提升到内存层
+            cache_manager.set(CacheType.TTS_AUDIO, key, frames)
+            self._count("disk_hits")
+            return frames
+
+        self._count("misses")
+        return None
+
+    def put(self, key: Optional[str], frames: Optional[List[bytes]]) -> None:
+        if key is None or not frames:
+            return
+        frames = list(frames)
+        cache_manager.set(CacheType.TTS_AUDIO, key, frames)
+        self._save(key, frames)
+        self._count("stores")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4)
+            if lookups
+            else 0
+        )
+        stats["enabled"] = self.enabled
+        stats["disk"] = self.disk_dir is not None
+        return stats
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.frames")
+
+    def _load(self, key: str) -> Optional[List[bytes]]:
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            frames, offset = [], 0
+            while offset < len(data):
+                (length,) = _FRAME_HEADER.unpack_from(data, offset)
+                offset += _FRAME_HEADER.size
+                frames.append(data[offset : offset + length])
+                offset += length
+            return frames
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"读取TTS磁盘缓存失败: {path}, {e}")
+            return None
+
+    def _save(self, key: str, frames: List[bytes]) -> None:
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                for frame in frames:
+                    f.write(_FRAME_HEADER.pack(len(frame)))
+                    f.write(frame)
+            # 先写临时文件再替换，避免并发读取到不完整的文件
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"写入TTS磁盘缓存失败: {path}, {e}")
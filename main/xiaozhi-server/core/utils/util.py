@@ -6,10 +6,10 @@ import os
 import wave
 from io import BytesIO
 from core.utils import p3
-import numpy as np
+from core.utils.p3_cache import p3_cache
 import requests
-import opuslib_next
-from pydub import AudioSegment
+from core.utils.audio_codec import decode_to_pcm16
+from core.utils.opus_codec import encode_pcm, decode_opus
 import copy
 
 TAG = __name__
@@ -212,91 +212,48 @@ def extract_json_from_string(input_string):
 
 
 def audio_to_data(audio_file_path, is_opus=True):
+    # 音乐与提示音优先使用预转码好的p3缓存
+    cache_path = p3_cache.cache_path(audio_file_path) if is_opus else None
+    cached = p3_cache.load(cache_path)
+    if cached is not None:
+        return cached
+
     # 获取文件后缀名
     file_type = os.path.splitext(audio_file_path)[1]
     if file_type:
         file_type = file_type.lstrip(".")
-    # 读取音频文件，-nostdin 参数：不要从标准输入读取数据，否则FFmpeg会阻塞
-    audio = AudioSegment.from_file(
-        audio_file_path, format=file_type, parameters=["-nostdin"]
-    )
-
-    # 转换为单声道/16kHz采样率/16位小端编码（确保与编码器匹配）
-    audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-
-    # 音频时长(秒)
-    duration = len(audio) / 1000.0
-
-    # 获取原始PCM数据（16位小端）
-    raw_data = audio.raw_data
-    return pcm_to_data(raw_data, is_opus), duration
+    with open(audio_file_path, "rb") as f:
+        audio_bytes = f.read()
+    audio_datas, duration = audio_bytes_to_data(audio_bytes, file_type, is_opus)
+    p3_cache.store(cache_path, audio_datas)
+    return audio_datas, duration
 
 
 def audio_bytes_to_data(audio_bytes, file_type, is_opus=True):
     """
-    直接用音频二进制数据转为opus/pcm数据，支持wav、mp3、p3
+    直接用音频二进制数据转为opus/pcm数据，支持wav、pcm、mp3、opus/ogg、p3
     """
     if file_type == "p3":
         # 直接用p3解码
         return p3.decode_opus_from_bytes(audio_bytes)
     else:
-        # 其他格式用pydub
-        audio = AudioSegment.from_file(
-            BytesIO(audio_bytes), format=file_type, parameters=["-nostdin"]
-        )
-        audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-        duration = len(audio) / 1000.0
-        raw_data = audio.raw_data
+        # 其他格式在进程内解码为单声道/16kHz/16位小端PCM，必要时回退到ffmpeg
+        raw_data = decode_to_pcm16(audio_bytes, file_type)
+        # 音频时长(秒)
+        duration = len(raw_data) / 2 / 16000
         return pcm_to_data(raw_data, is_opus), duration
 
 
 def pcm_to_data(raw_data, is_opus=True):
-    # 初始化Opus编码器
-    encoder = opuslib_next.Encoder(16000, 1, opuslib_next.APPLICATION_AUDIO)
-
-    # 编码参数
-    frame_duration = 60  # 60ms per frame
-    frame_size = int(16000 * frame_duration / 1000)  # 960 samples/frame
-
-    datas = []
-    # 按帧处理所有音频数据（包括最后一帧可能补零）
-    for i in range(0, len(raw_data), frame_size * 2):  # 16bit=2bytes/sample
-        # 获取当前帧的二进制数据
-        chunk = raw_data[i : i + frame_size * 2]
-
-        # 如果最后一帧不足，补零
-        if len(chunk) < frame_size * 2:
-            chunk += b"\x00" * (frame_size * 2 - len(chunk))
-
-        if is_opus:
-            # 转换为numpy数组处理
-            np_frame = np.frombuffer(chunk, dtype=np.int16)
-            # 编码Opus数据
-            frame_data = encoder.encode(np_frame.tobytes(), frame_size)
-        else:
-            frame_data = chunk if isinstance(chunk, bytes) else bytes(chunk)
-
-        datas.append(frame_data)
-
-    return datas
+    """将16kHz单声道PCM按60ms分帧，编码为Opus帧列表或返回PCM帧列表"""
+    return encode_pcm(raw_data, is_opus)
 
 
 def opus_datas_to_wav_bytes(opus_datas, sample_rate=16000, channels=1):
     """
     将opus帧列表解码为wav字节流
     """
-    decoder = opuslib_next.Decoder(sample_rate, channels)
-    pcm_datas = []
-
-    frame_duration = 60  # ms
-    frame_size = int(sample_rate * frame_duration / 1000)  # 960
-
-    for opus_frame in opus_datas:
-        # 解码为PCM（返回bytes，2字节/采样点）
-        pcm = decoder.decode(opus_frame, frame_size)
-        pcm_datas.append(pcm)
-
-    pcm_bytes = b"".join(pcm_datas)
+    pcm_bytes = b"".join(decode_opus(opus_datas, sample_rate, channels))
 
     # 写入wav字节流
     wav_buffer = BytesIO()
@@ -0,0 +1,167 @@
+"""
+按连接保序的有界工作线程池
+"""
+
+import queue
+import asyncio
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Any, Callable, Dict, Hashable
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+
+class OrderedWorkerPool:
+    """按key保序的有界线程池
+
+    同一个key（通常是连接的session_id）的任务固定分配到同一个工作线程，保证按提交顺序执行；
+    每个工作线程的队列有上限，队列满时提交方等待，形成背压，而不是无限堆积。
+    事件循环中的提交方在队列满时登记等待，工作线程每取出一个任务唤醒一个等待者，不轮询。
+    """
+
+    def __init__(self, name: str, workers: int = 4, queue_size: int = 256):
+        self.name = name
+        self.workers = max(int(workers), 1)
+        self.queue_size = max(int(queue_size), 1)
+        self._queues = [
+            queue.Queue(maxsize=self.queue_size) for _ in range(self.workers)
+        ]
+        # 每个队列的等待者 (事件循环, Future)，按登记顺序唤醒
+        self._waiters = [deque() for _ in range(self.workers)]
+        self._waiters_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "backpressure": 0}
+        self._threads = []
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker,
+                args=(index,),
+                daemon=True,
+                name=f"{name}-worker-{index}",
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _pick_index(self, key: Hashable) -> int:
+        return hash(key) % self.workers
+
+    def _pick_queue(self, key: Hashable) -> queue.Queue:
+        return self._queues[self._pick_index(key)]
+
+    def _count(self, field: str):
+        with self._stats_lock:
+            self._stats[field] += 1
+
+    def submit(
+        self, key: Hashable, fn: Callable, *args, **kwargs
+    ) -> concurrent.futures.Future:
+        """在线程中提交任务，队列满时阻塞等待"""
+        future = concurrent.futures.Future()
+        task_queue = self._pick_queue(key)
+        if task_queue.full():
+            self._count("backpressure")
+        task_queue.put((future, fn, args, kwargs))
+        self._count("submitted")
+        return future
+
+    async def run(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """在事件循环中提交任务并等待结果，队列满时让出事件循环等待，不阻塞其他连接"""
+        future = concurrent.futures.Future()
+        task = (future, fn, args, kwargs)
+        index = self._pick_index(key)
+        loop = asyncio.get_running_loop()
+        woken = False
+        while True:
+            waiter = self._put_or_wait(index, task, loop, woken)
+            if waiter is None:
+                break
+            if not woken:
+                self._count("backpressure")
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._waiters_lock:
+                    registered = (loop, waiter) in self._waiters[index]
+                    if registered:
+                        self._waiters[index].remove((loop, waiter))
+                if not registered:
+                    # 已被唤醒却不再提交，把空出的位置让给下一个等待者
+                    self._wake(index)
+                raise
+            woken = True
+        self._count("submitted")
+        return await asyncio.wrap_future(future)
+
+    def _put_or_wait(self, index: int, task: tuple, loop, woken: bool):
+        """放入队列，成功时返回None；队列满时登记并返回等待唤醒的Future"""
+        with self._waiters_lock:
+            waiters = self._waiters[index]
+            # 已有等待者时排在它们之后，保证同一连接的任务按提交顺序进入队列
+            if woken or not waiters:
+                try:
+                    self._queues[index].put_nowait(task)
+                    return None
+                except queue.Full:
+                    pass
+            waiter = loop.create_future()
+            if woken:
+                # 被唤醒后空位又被线程中的submit抢走，保留原来的位置
+                waiters.appendleft((loop, waiter))
+            else:
+                waiters.append((loop, waiter))
+            return waiter
+
+    def _wake(self, index: int) -> None:
+        """队列空出一个位置，唤醒最早登记的等待者"""
+        with self._waiters_lock:
+            waiters = self._waiters[index]
+            while waiters:
+                loop, waiter = waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._notify, waiter)
+                    return
+                except RuntimeError:
+                    # 等待者所在的事件循环已关闭
+                    continue
+
+    @staticmethod
+    def _notify(waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def _worker(self, index: int):
+        task_queue = self._queues[index]
+        while True:
+            future, fn, args, kwargs = task_queue.get()
+            self._wake(index)
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                    self._count("completed")
+                except Exception as e:
+                    future.set_exception(e)
+                    self._count("failed")
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"{self.name} 工作线程异常: {e}")
+            finally:
+                task_queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取线程池运行指标"""
+        depths = [q.qsize() for q in self._queues]
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(
+            {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queue_depth": sum(depths),
+                "max_worker_depth": max(depths),
+            }
+        )
+        return stats
@@ -5,6 +5,18 @@ from core.connection import ConnectionHandler
 from config.config_loader import get_config_from_api
 from core.utils.modules_initialize import initialize_modules
 from core.utils.util import check_vad_update, check_asr_update
+from core.utils.scheduler import TaskScheduler
+from core.utils.tts_cache import TTSCache
+from core.utils.intent_cache import IntentCache
+from core.utils.cache.manager import cache_manager
+from core.utils.p3_cache import p3_cache
+from core.providers.llm.transport import llm_transport
+from core.providers.asr.ws_pool import asr_ws_pool
+from core.providers.tts.ws_mux import tts_ws_mux
+from core.utils.provider_engines import provider_engines
+from core.utils.prefix_stats import prefix_stats
+from config.private_config_service import private_config_service
+from core.utils.report_pipeline import report_pipeline
 
 TAG = __name__
 
@@ -14,6 +26,25 @@ class WebSocketServer:
         self.config = config
         self.logger = setup_logging()
         self.config_lock = asyncio.Lock()
+        # 所有连接共享的具名线程池
+        self.scheduler = TaskScheduler(self.config.get("scheduler", {}))
+        # 所有连接共享的TTS音频缓存
+        self.tts_cache = TTSCache(self.config.get("tts_cache", {}))
+        self.intent_cache = IntentCache(self.config.get("intent_cache", {}))
+        # 在后台把音乐目录与提示音预转码为p3
+        music_config = self.config.get("plugins", {}).get("play_music", {})
+        music_dir = music_config.get("music_dir")
+        p3_cache.configure(
+            self.config.get("audio_precache", {}),
+            [music_dir or "./music", "config/assets"],
+        )
+        # LLM共享连接池需在创建LLM实例之前配置
+        llm_transport.configure(self.config.get("llm_transport", {}))
+        asr_ws_pool.configure(self.config.get("asr_ws_pool", {}))
+        tts_ws_mux.configure(self.config.get("tts_ws_mux", {}))
+        provider_engines.configure(self.config.get("provider_engines", {}))
+        private_config_service.configure(self.config.get("private_config_cache", {}))
+        report_pipeline.configure(self.config.get("report_pipeline", {}), self.scheduler)
         modules = initialize_modules(
             self.logger,
             self.config,
@@ -77,6 +108,32 @@ class WebSocketServer:
                     f"服务器端强制关闭连接时出错: {close_error}"
                 )
 
+    def get_metrics(self) -> dict:
+        """获取服务运行指标，包括各处理阶段的队列深度"""
+        metrics = {
+            "connections": len(self.active_connections),
+            # 已接收但尚未进入VAD阶段的音频包数量
+            "audio_ingress_queue_depth": sum(
+                conn.asr_audio_queue.qsize() for conn in list(self.active_connections)
+            ),
+        }
+        if self._vad is not None:
+            metrics["vad"] = self._vad.get_stats()
+        metrics["scheduler"] = self.scheduler.get_stats()
+        metrics["tts_cache"] = self.tts_cache.get_stats()
+        # 各类全局缓存（含意图缓存）的命中率
+        metrics["cache"] = cache_manager.get_stats()
+        metrics["audio_precache"] = p3_cache.get_stats()
+        metrics["llm_transport"] = llm_transport.get_stats()
+        metrics["asr_ws_pool"] = asr_ws_pool.get_stats()
+        metrics["tts_ws_mux"] = tts_ws_mux.get_stats()
+        metrics["provider_engines"] = provider_engines.get_stats()
+        metrics["private_config"] = private_config_service.get_stats()
+        metrics["report_pipeline"] = report_pipeline.get_stats()
+        # 各设备相邻两轮LLM请求的前缀复用率
+        metrics["prompt_prefix"] = prefix_stats.get_stats()
+        return metrics
+
     async def _http_response(self, websocket, request_headers):
         # 检查是否为 WebSocket 升级请求
         if request_headers.headers.get("connection", "").lower() == "upgrade":
@@ -108,6 +165,8 @@ class WebSocketServer:
                 )
                 # 更新配置
                 self.config = new_config
+                # 智控台配置已变更，设备缓存的差异化配置需重新获取
+                private_config_service.invalidate()
                 # 重新初始化组件
                 modules = initialize_modules(
                     self.logger,
@@ -1,13 +1,11 @@
 import os
 import re
-import time
 import random
-import difflib
 import traceback
-from pathlib import Path
 from core.handle.sendAudioHandle import send_stt_message
 from plugins_func.register import register_function, ToolType, ActionResponse, Action
 from core.utils.dialogue import Message
+from core.utils.music_library import MusicLibrary
 from core.providers.tts.dto.dto import TTSMessageDTO, SentenceType, ContentType
 
 TAG = __name__
@@ -82,39 +80,6 @@ def _extract_song_name(text):
     return None
 
 
-def _find_best_match(potential_song, music_files):
-    """查找最匹配的歌曲"""
-    best_match = None
-    highest_ratio = 0
-
-    for music_file in music_files:
-        song_name = os.path.splitext(music_file)[0]
-        ratio = difflib.SequenceMatcher(None, potential_song, song_name).ratio()
-        if ratio > highest_ratio and ratio > 0.4:
-            highest_ratio = ratio
-            best_match = music_file
-    return best_match
-
-
-def get_music_files(music_dir, music_ext):
-    music_dir = Path(music_dir)
-    music_files = []
-    music_file_names = []
-    for file in music_dir.rglob("*"):
-        # 判断是否是文件
-        if file.is_file():
-            # 获取文件扩展名
-            ext = file.suffix.lower()
-            # 判断扩展名是否在列表中
-            if ext in music_ext:
-                # 添加相对路径
-                music_files.append(str(file.relative_to(music_dir)))
-                music_file_names.append(
-                    os.path.splitext(str(file.relative_to(music_dir)))[0]
-                )
-    return music_files, music_file_names
-
-
 def initialize_music_handler(conn):
     global MUSIC_CACHE
     if MUSIC_CACHE == {}:
@@ -129,18 +94,33 @@ def initialize_music_handler(conn):
             MUSIC_CACHE["refresh_time"] = MUSIC_CACHE["music_config"].get(
                 "refresh_time", 60
             )
+            index_file = MUSIC_CACHE["music_config"].get(
+                "index_file", "data/music_index.json"
+            )
         else:
             MUSIC_CACHE["music_dir"] = os.path.abspath("./music")
             MUSIC_CACHE["music_ext"] = (".mp3", ".wav", ".p3")
             MUSIC_CACHE["refresh_time"] = 60
-        # 获取音乐文件列表
-        MUSIC_CACHE["music_files"], MUSIC_CACHE["music_file_names"] = get_music_files(
-            MUSIC_CACHE["music_dir"], MUSIC_CACHE["music_ext"]
+            index_file = "data/music_index.json"
+        # 建立（或从索引文件加载）音乐库
+        MUSIC_CACHE["library"] = MusicLibrary(
+            MUSIC_CACHE["music_dir"],
+            MUSIC_CACHE["music_ext"],
+            MUSIC_CACHE["refresh_time"],
+            index_file,
         )
-        MUSIC_CACHE["scan_time"] = time.time()
+    _sync_music_cache()
     return MUSIC_CACHE
 
 
+def _sync_music_cache():
+    """同步音乐库当前的文件列表与版本号"""
+    library = MUSIC_CACHE["library"]
+    MUSIC_CACHE["music_files"] = library.files
+    MUSIC_CACHE["music_file_names"] = library.names
+    MUSIC_CACHE["version"] = library.version
+
+
 async def handle_music_command(conn, text):
     initialize_music_handler(conn)
     global MUSIC_CACHE
@@ -151,16 +131,14 @@ async def handle_music_command(conn, text):
 
     # 尝试匹配具体歌名
     if os.path.exists(MUSIC_CACHE["music_dir"]):
-        if time.time() - MUSIC_CACHE["scan_time"] > MUSIC_CACHE["refresh_time"]:
-            # 刷新音乐文件列表
-            MUSIC_CACHE["music_files"], MUSIC_CACHE["music_file_names"] = (
-                get_music_files(MUSIC_CACHE["music_dir"], MUSIC_CACHE["music_ext"])
-            )
-            MUSIC_CACHE["scan_time"] = time.time()
+        library = MUSIC_CACHE["library"]
+        # 增量同步音乐目录（距上次同步不足refresh_time时直接返回），文件操作交给线程池
+        if await conn.executor.run("tools", library.refresh):
+            _sync_music_cache()
 
         potential_song = _extract_song_name(clean_text)
         if potential_song:
-            best_match = _find_best_match(potential_song, MUSIC_CACHE["music_files"])
+            best_match = library.search(potential_song)
             if best_match:
                 conn.logger.bind(tag=TAG).info(f"找到最匹配的歌曲: {best_match}")
                 await play_local_music(conn, specific_file=best_match)
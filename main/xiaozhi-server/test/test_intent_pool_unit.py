@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+意图识别线程池单元测试 - llm线程池被进行中的对话占满时，意图识别仍能完成
+"""
+
+import os
+import sys
+import asyncio
+import threading
+import unittest
+from types import SimpleNamespace
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.utils.scheduler import TaskScheduler
+from core.providers.intent.intent_llm.intent_llm import IntentProvider
+
+
+class FakeIntentLLM:
+    model_name = "fake-intent"
+
+    def response_no_stream(self, system_prompt, user_prompt, **kwargs):
+        return '{"function_call": {"name": "get_weather"}}'
+
+
+class FakeFuncHandler:
+    def get_functions(self):
+        return [{"function": {"name": "get_weather", "description": "查询天气"}}]
+
+
+class TestIntentWithSaturatedLLMPool(unittest.TestCase):
+    POOL_SIZE = 4
+
+    def setUp(self):
+        self.scheduler = TaskScheduler({"pools": {"llm": self.POOL_SIZE}})
+        # 模拟正在流式输出的对话，占满llm线程池直到测试结束
+        self.chats_done = threading.Event()
+        for i in range(self.POOL_SIZE):
+            self.scheduler.submit("llm", f"chat-{i}", self.chats_done.wait, 30)
+
+    def tearDown(self):
+        self.chats_done.set()
+
+    def test_intent_not_queued_behind_chats(self):
+        intent = IntentProvider({})
+        intent.set_llm(FakeIntentLLM())
+        intent._compile_prompt = lambda conn: ("system prompt", "signature")
+        conn = SimpleNamespace(
+            func_handler=FakeFuncHandler(),
+            server=SimpleNamespace(intent_cache=None),
+            executor=self.scheduler.executor_for("device-1"),
+        )
+
+        async def detect():
+            return await asyncio.wait_for(
+                intent.detect_intent(conn, [], "明天天气怎么样"), timeout=5
+            )
+
+        result = asyncio.run(detect())
+        self.assertEqual(result, '{"function_call": {"name": "get_weather"}}')
+        self.assertEqual(
+            self.scheduler.get_stats()["pools"]["llm"]["active"], self.POOL_SIZE
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
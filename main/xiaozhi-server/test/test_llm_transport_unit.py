@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+LLM传输层单元测试 - 无异步接口的LLM服务在线程池满载时不能死锁
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import unittest
+import concurrent.futures
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.utils.scheduler import TaskScheduler
+from core.providers.llm.base import LLMProviderBase
+
+
+class SyncOnlyLLM(LLMProviderBase):
+    """只有同步response的服务，走默认的response_async（线程池中逐块读取）"""
+
+    def response(self, session_id, dialogue, **kwargs):
+        for token in ("你", "好", "呀"):
+            time.sleep(0.01)
+            yield token
+
+
+class TestSyncProviderPoolSaturation(unittest.TestCase):
+    POOL_SIZE = 4
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+        self.scheduler = TaskScheduler({"pools": {"llm": self.POOL_SIZE}})
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join(timeout=2)
+
+    def test_more_chats_than_llm_threads(self):
+        """同时进行的对话数超过llm线程池大小时，所有对话都能完成"""
+        llm = SyncOnlyLLM()
+        # 所有对话都进入线程后再开始读取，确保llm线程池被占满
+        barrier = threading.Barrier(self.POOL_SIZE)
+
+        def chat(executor):
+            try:
+                barrier.wait(timeout=1)
+            except threading.BrokenBarrierError:
+                pass
+            stream = llm.open_stream(executor.key, [], executor=executor)
+            return "".join(stream.iterate_sync(self.loop))
+
+        futures = []
+        for i in range(self.POOL_SIZE + 1):
+            executor = self.scheduler.executor_for(f"session-{i}")
+            futures.append(executor.submit_to("llm", chat, executor))
+
+        done, not_done = concurrent.futures.wait(futures, timeout=10)
+        self.assertFalse(not_done, "对话线程互相等待，发生死锁")
+        self.assertEqual([f.result() for f in futures], ["你好呀"] * len(futures))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+本地音乐库单元测试 - 模糊查找歌名
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.utils.music_library import MusicLibrary
+
+
+class TestMusicLibrarySearch(unittest.TestCase):
+    FILES = [
+        "周杰伦-稻香.mp3",
+        "周杰伦-晴天.mp3",
+        os.path.join("林俊杰", "林俊杰 - 江南.mp3"),
+        "小星星.mp3",
+    ]
+
+    def setUp(self):
+        self.music_dir = tempfile.mkdtemp()
+        for file in self.FILES:
+            path = os.path.join(self.music_dir, file)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"\x00")
+        self.library = MusicLibrary(self.music_dir, [".mp3"])
+
+    def tearDown(self):
+        shutil.rmtree(self.music_dir, ignore_errors=True)
+
+    def test_short_title_with_artist_prefix(self):
+        """两个字的歌名也能匹配"歌手-歌名"格式的文件"""
+        self.assertEqual(self.library.search("稻香"), "周杰伦-稻香.mp3")
+        self.assertEqual(self.library.search("晴天"), "周杰伦-晴天.mp3")
+        self.assertEqual(
+            self.library.search("江南"), os.path.join("林俊杰", "林俊杰 - 江南.mp3")
+        )
+
+    def test_exact_title(self):
+        self.assertEqual(self.library.search("小星星"), "小星星.mp3")
+
+    def test_no_match(self):
+        self.assertIsNone(self.library.search("告白气球"))
+
+
+if __name__ == "__main__":
+    unittest.main()